@@ -0,0 +1,123 @@
+import lzma
+import re
+import zlib
+from collections import Counter
+
+import const
+
+# Compresses text bodies for storage. Each stored body is kept with a flag,
+# its codec's position in const.CODECS, so a database can hold plain and
+# compressed bodies side by side and be recompressed a batch at a time.
+# zlib streams made with a shared dictionary carry the dictionary's checksum,
+# so they can be read back whichever dictionary was current when they were made
+
+NONE = 0
+ZLIB = 1
+LZMA = 2
+
+def codecFlag(codec):
+    ''' Finds the flag stored with bodies compressed by a codec
+        args:
+            codec (str): the codec's name, one of const.CODECS in any case
+        returns:
+            int: the flag, 0 for none, or None if the codec is not known
+    '''
+    if not codec:
+        return NONE
+    if str(codec).lower() not in const.CODECS:
+        print(f"Error: {codec} is not one of {', '.join(const.CODECS)}")
+        return None
+    return const.CODECS.index(str(codec).lower())
+
+def compress(text, flag, dictionary=None, level=None):
+    ''' Compresses a text body. Bodies too short to be worth compressing, or
+        that do not get smaller, are left as they are
+        args:
+            text (str): the text body
+            flag (int): the codec to compress with
+            dictionary (bytes): a shared zlib dictionary, of text common to many bodies
+            level (int): the compression level, or preset for lzma, None for the default
+        returns:
+            tuple of (str/bytes, int): the value to store and its flag, which is
+                0 if the text was left as it is
+    '''
+    if not flag or text is None or len(text) < const.MINCOMPRESSLENGTH:
+        return text, NONE
+    raw = text.encode('utf-8')
+    if flag == ZLIB:
+        options = {'zdict': dictionary} if dictionary else {}
+        compressor = zlib.compressobj(-1 if level is None else level, **options)
+        data = compressor.compress(raw) + compressor.flush()
+    elif flag == LZMA:
+        # the text is small, so the container's integrity check is left out
+        data = lzma.compress(raw, check=lzma.CHECK_NONE, preset=level)
+    else:
+        raise ValueError(f"Unknown compression flag {flag}")
+    if len(data) >= len(raw):
+        return text, NONE
+    return data, flag
+
+def decompress(data, flag, dictionary=None):
+    ''' Reads back a text body stored by compress
+        args:
+            data (str/bytes): the stored value
+            flag (int): the flag stored with it
+            dictionary (bytes): the zlib dictionary it was compressed with, see
+                dictionaryChecksum
+        returns:
+            str: the text body
+    '''
+    if not flag or data is None:
+        return data
+    data = bytes(data)
+    if flag == ZLIB:
+        options = {'zdict': dictionary} if dictionary else {}
+        decompressor = zlib.decompressobj(**options)
+        raw = decompressor.decompress(data) + decompressor.flush()
+    elif flag == LZMA:
+        raw = lzma.decompress(data)
+    else:
+        raise ValueError(f"Unknown compression flag {flag}")
+    return raw.decode('utf-8')
+
+def dictionaryChecksum(data):
+    ''' Finds the dictionary a zlib stream was compressed with
+        args:
+            data (bytes): the zlib stream
+        returns:
+            int: the dictionary's Adler-32 checksum, or None if it used no dictionary
+    '''
+    data = bytes(data[:6])
+    # the header's FDICT bit is followed by the dictionary's checksum
+    if len(data) < 6 or not data[1] & 0x20:
+        return None
+    return int.from_bytes(data[2:6], 'big')
+
+def trainDictionary(samples, size=const.DICTIONARYSIZE):
+    ''' Builds a shared zlib dictionary from sample text bodies, out of the
+        runs of one to three words that would save the most by being found
+        in it. zlib reaches text near the end of a dictionary most cheaply,
+        so the most useful runs go last
+        args:
+            samples (iterable of str): text bodies typical of the corpus
+            size (int): the most bytes the dictionary may hold, at most 32 KiB
+        returns:
+            bytes: the dictionary, empty if the samples share too little to be worth one
+    '''
+    counts = Counter()
+    for text in samples:
+        tokens = re.findall(r'\w+\W*', text or '')
+        for length in (1, 2, 3):
+            counts.update(''.join(tokens[i:i + length]) for i in range(len(tokens) - length + 1))
+    # a run found once is not shared between bodies
+    scored = sorted(((count * len(run.encode('utf-8')), run) for run, count in counts.items()
+                     if count > 1 and len(run) > 3), reverse=True)
+    chosen = []
+    used = 0
+    for score, run in scored:
+        length = len(run.encode('utf-8'))
+        if used + length > size:
+            continue
+        chosen.append(run)
+        used += length
+    return ''.join(reversed(chosen)).encode('utf-8')
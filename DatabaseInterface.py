@@ -1,8 +1,49 @@
+import json
+import re
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+from PyQt5.QtCore import QByteArray
 from PyQt5.QtSql import QSqlDatabase, QSqlQuery
 
+import Compression
+import Instrumentation
 import Utils
 import const
 
+# thread ID: the name of the connection the thread uses, if not the default.
+# Keyed by ID rather than threading.local, which Qt's threads do not keep
+_connections = {}
+
+# database file: {category: ({tag name: tag ID}, {tag ID: tag name})}
+_tagDictionaries = {}
+# (connection name, database file): the data version the connection last saw,
+# which only means something to the connection that read it
+_tagDataVersions = {}
+# guards _tagDictionaries and _tagDataVersions, which every thread's connection uses
+_tagLock = threading.Lock()
+# database file: whether it has a full text index
+_fullTextSearch = {}
+# database file: whether its full text index is contentless, so bodies can be compressed
+_contentlessIndexes = {}
+# database file: the names of its entry table's columns
+_entryColumns = {}
+# (database file, checksum): compression dictionary
+_compressionDictionaries = {}
+# database file: the dictionary new bodies are compressed with, or None
+_currentDictionaries = {}
+# connection name: {SQL: prepared query}, in least to most recently used order
+_statementPools = {}
+# database file: whether it has a result generation, without which results are not cached
+_resultGenerations = {}
+# (database file, result key): (generation, entry count or (IDs, keys)), in
+# least to most recently used order. Shared by every thread's connection
+_results = OrderedDict()
+_resultLock = threading.Lock()
 
 def addTags(docID, tagDict):
     ''' Adds the dictionary of given tags to the specified entry ID
@@ -13,20 +54,27 @@ def addTags(docID, tagDict):
     if docID is None:
         Utils.ErrorMessage("No ID found to insert tags")
         return None
+    database = _database()
+    database.transaction()
+    newTags = {}
     for category, tagList in tagDict.items():
         for tag in tagList:
-            tagID = getTagID(category, tag)
+            tagID, error = _resolveTagID(category, tag, newTags)
             if tagID is None:
-                query = QSqlQuery()
-                query.prepare(f"INSERT INTO {category + const.INDEXSUFFIX} (Name) VALUES (?)")
-                query.addBindValue(tag)
-                query.exec()
-                tagID = query.lastInsertId()
-            query = QSqlQuery()
-            query.prepare(f"INSERT INTO {category + const.MAPSUFFIX} ({const.DOCID}, {const.TAGID}) VALUES (?, ?)")
-            query.addBindValue(docID)
-            query.addBindValue(tagID)
-            query.exec()
+                Utils.ErrorMessage(f"Error adding tag {tag}: {error}")
+                database.rollback()
+                return None
+            query = _prepared(f"INSERT INTO {category + const.MAPSUFFIX} ({const.DOCID}, {const.TAGID}) VALUES (?, ?)")
+            _bind(query, docID, tagID)
+            if not query.exec():
+                Utils.ErrorMessage("Error adding tags: " + query.lastError().text())
+                database.rollback()
+                return None
+    if not _bumpGeneration():
+        database.rollback()
+        return None
+    if database.commit():
+        _addToTagDictionaries(newTags)
 
 def getTagID(category, tag):
     ''' Get a tag's ID from a category and tag name
@@ -36,10 +84,144 @@ def getTagID(category, tag):
         returns:
             int: the tag's ID
     '''
-    query = QSqlQuery(f"SELECT TagID FROM {category + const.INDEXSUFFIX} WHERE TagName='{tag}'")
-    if query.next():
-        return query.value(0)
-    return None
+    return _getTagDictionary(category)[0].get(tag)
+
+def getTagName(category, tagID):
+    ''' Get a tag's name from a category and tag ID
+        args:
+            category (str): category name
+            tagID (int): tag ID
+        returns:
+            str: the tag's name
+    '''
+    return _getTagDictionary(category)[1].get(tagID)
+
+def getTagCategories(tag, categories):
+    ''' Finds which of some categories have a tag in the open database, for
+        tags that were added with an entry rather than listed in the meta file
+        args:
+            tag (str): tag name
+            categories (list of str): the category names to look in
+        returns:
+            list of str: the categories having the tag
+    '''
+    return [category for category in categories if getTagID(category, tag) is not None]
+
+def getTagNames(category):
+    ''' Get the names of every tag in a category
+        args:
+            category (str): category name
+        returns:
+            list of str: the tag names
+    '''
+    idsByName = _getTagDictionary(category)[0]
+    with _tagLock:
+        return list(idsByName)
+
+def _getTagDictionary(category):
+    ''' Gets the tag name to ID and ID to name dictionaries for a category,
+        which are read from the open database once and then kept in memory
+        args:
+            category (str): category name
+        returns:
+            tuple of (dict of {str: int}, dict of {int: str}): the dictionaries
+    '''
+    key = _databaseKey()
+    connectionKey = _connectionKey()
+    if connectionKey not in _tagDataVersions:
+        version = getDataVersion()
+        with _tagLock:
+            _tagDataVersions.setdefault(connectionKey, version)
+    with _tagLock:
+        dictionaries = _tagDictionaries.setdefault(key, {})
+        cached = dictionaries.get(category)
+    Instrumentation.countCacheLookup('tag', cached is not None)
+    if cached is not None:
+        return cached
+    idsByName = {}
+    namesByID = {}
+    query = _query(f"SELECT {const.TAGNAME}, {const.TAGID} FROM {category + const.INDEXSUFFIX}")
+    while query.next():
+        idsByName[query.value(0)] = query.value(1)
+        namesByID[query.value(1)] = query.value(0)
+    # another thread may have read the category meanwhile, and its dictionaries are kept
+    with _tagLock:
+        return _tagDictionaries.setdefault(key, {}).setdefault(category, (idsByName, namesByID))
+
+def _resolveTagID(category, tag, newTags):
+    ''' Gets a tag's ID, adding the tag to its category if it is new. New
+        tags are collected rather than added to the tag dictionaries, so that
+        they are only kept once the transaction adding them commits
+        args:
+            category (str): category name
+            tag (str): tag name
+            newTags (dict of {str: dict of {str: int}}): category to new tag IDs
+                dictionary for the current transaction
+        returns:
+            tuple of (int, str): the tag's ID, or None if it could not be
+                added, and the error adding it
+    '''
+    tagID = getTagID(category, tag)
+    if tagID is None:
+        tagID = newTags.get(category, {}).get(tag)
+    if tagID is not None:
+        return tagID, ''
+    tagID, error = _insertTag(category, tag)
+    if tagID is not None:
+        newTags.setdefault(category, {})[tag] = tagID
+    return tagID, error
+
+def _addToTagDictionaries(newTags):
+    ''' Adds committed new tags to the tag dictionaries
+        args:
+            newTags (dict of {str: dict of {str: int}}): category to new tag IDs
+                dictionary
+    '''
+    for category, tagIDs in newTags.items():
+        idsByName, namesByID = _getTagDictionary(category)
+        with _tagLock:
+            for tag, tagID in tagIDs.items():
+                idsByName[tag] = tagID
+                namesByID[tagID] = tag
+
+def invalidateTagDictionaries():
+    ''' Forgets the tag dictionaries for the open database '''
+    with _tagLock:
+        _tagDictionaries.pop(_databaseKey(), None)
+        _tagDataVersions.pop(_connectionKey(), None)
+
+def checkTagDictionaries():
+    ''' Forgets the tag dictionaries for the open database if another
+        connection has written to it since the current connection last looked.
+        Each connection's data version is kept apart, as SQLite's numbers are
+        only comparable on the connection that read them '''
+    connectionKey = _connectionKey()
+    version = getDataVersion()
+    with _tagLock:
+        if _tagDataVersions.get(connectionKey, version) != version:
+            _tagDictionaries.pop(_databaseKey(), None)
+        _tagDataVersions[connectionKey] = version
+
+def getDataVersion():
+    ''' returns SQLite's data version for the open database, which changes
+        when another connection commits to it '''
+    query = _prepared("PRAGMA data_version")
+    version = None
+    if query.exec() and query.next():
+        version = query.value(0)
+    query.finish()
+    return version
+
+def _databaseKey():
+    ''' returns the file of the open database, which the tag dictionaries are
+        kept for '''
+    return _database().databaseName()
+
+def _connectionKey():
+    ''' returns the name and file of the current thread's connection, which
+        the data versions the tag dictionaries are checked by are kept for '''
+    database = _database()
+    return database.connectionName(), database.databaseName()
 
 def getEntryIDsWithTag(category, tag):
     ''' Get a list of entry IDs that are associated with a given tag
@@ -54,12 +236,604 @@ def getEntryIDsWithTag(category, tag):
         tag = getTagID(category, tag)
         if tag is None:
             return []
-    query = QSqlQuery(f"SELECT {const.DOCID} FROM {category + const.MAPSUFFIX} WHERE {const.TAGID} = '{tag}'")
+    query = _prepared(f"SELECT {const.DOCID} FROM {category + const.MAPSUFFIX} WHERE {const.TAGID} = ?")
+    _bind(query, tag)
     indexes = []
-    while query.next():
-        indexes.append(query.value(0))
+    if query.exec():
+        while query.next():
+            indexes.append(query.value(0))
+    query.finish()
     return indexes
 
+class Filter:
+    ''' A search of the entries by title, text body and tags, which compiles
+        to a condition with placeholders. The search values are bound rather
+        than written into the SQL, so the statement stays the same from one
+        search to the next and its plan can be reused '''
+    def __init__(self, titleText='', bodyText='', included=None, excluded=None,
+                 matchAll=False, fullText=False, scan=None):
+        '''
+        titleText (str): text to find in the titles
+        bodyText (str): text to find in the text bodies
+        included (dict of {str: list of str}): tag to categories dictionary for
+            the tags to filter by
+        excluded (dict of {str: list of str}): tag to categories dictionary for
+            the tags that entries must not have
+        matchAll (bool): whether entries need all the included tags, rather
+            than any of them
+        fullText (bool): whether to search the text through the full text index,
+            rather than with LIKE
+        scan (str): one of const.SCANMODES to match the text as a regular
+            expression or exact, case sensitive text instead, which no index
+            can serve, so ParallelSearch scans the entries for it. None to
+            search it in SQL
+        '''
+        self.titleText = titleText
+        self.bodyText = bodyText
+        self.included = included or {}
+        self.excluded = excluded or {}
+        self.matchAll = matchAll
+        self.fullText = fullText and not scan
+        self.scan = scan
+
+    def _key(self):
+        ''' returns the filter's values, for comparing and hashing filters '''
+        def tagKey(tags):
+            return tuple(sorted((tag, tuple(categories)) for tag, categories in tags.items()))
+        return (self.titleText, self.bodyText, tagKey(self.included), tagKey(self.excluded),
+                self.matchAll, self.fullText, self.scan)
+
+    def __eq__(self, other):
+        return isinstance(other, Filter) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def cacheKey(self):
+        ''' Makes the key the filter's results are cached under, which is the
+            same for filters that match the same entries however they were
+            written: LIKE ignores the case of ASCII letters, and a full text
+            search is keyed by the query it makes
+            returns:
+                str: the normalised filter
+        '''
+        def tagKey(tags):
+            return sorted([tag, sorted(categories)] for tag, categories in tags.items())
+        if self.fullText:
+            text = [self.rankQuery()]
+        elif self.needsScan():
+            text = [self.scan, self.titleText, self.bodyText]
+        else:
+            text = [_foldCase(self.titleText), _foldCase(self.bodyText)]
+        return json.dumps([self.fullText, text, tagKey(self.included), tagKey(self.excluded),
+                           self.matchAll and len(self.included) > 1])
+
+    def narrows(self, other):
+        ''' Checks whether every entry this filter matches is matched by another,
+            as when more is typed at the end of the search text
+            args:
+                other (Filter): the other filter
+            returns:
+                bool: whether this filter's matches are a subset of the other's
+        '''
+        # a scan is never checked against the entries found, nor they against one
+        if not isinstance(other, Filter) or self.needsScan() or other.needsScan():
+            return False
+        if other.isEmpty():
+            return True
+        if self.fullText != other.fullText:
+            return False
+        if (self.included != other.included or self.matchAll != other.matchAll
+                or any(tag not in self.excluded for tag in other.excluded)):
+            return False
+        return (_textNarrows(self.titleText, other.titleText, self.fullText)
+                and _textNarrows(self.bodyText, other.bodyText, self.fullText))
+
+    def isEmpty(self):
+        ''' returns whether the filter matches every entry '''
+        return not (self.titleText or self.bodyText or self.included or self.excluded)
+
+    def needsScan(self):
+        ''' returns whether the filter has text to be matched by scanning the
+            entries, rather than by its condition '''
+        return bool(self.scan and (self.titleText or self.bodyText))
+
+    def rankQuery(self):
+        ''' returns the full text query to rank the matching entries by, or
+            None if the text is not searched through the full text index '''
+        if not self.fullText:
+            return None
+        matches = [makeMatchQuery(self.titleText, const.TITLE),
+                   makeMatchQuery(self.bodyText, const.TEXT)]
+        return ' AND '.join(match for match in matches if match) or None
+
+    def compile(self, table=const.TABLE):
+        ''' Makes the filter's condition. The text of a filter that needs a
+            scan is left out, so the condition finds the entries to scan
+            args:
+                table (str): the table being filtered
+            returns:
+                tuple of (str, list): the condition, or an empty string if the
+                    filter matches every entry, and the values for its placeholders
+        '''
+        conditions = []
+        values = []
+        if self.fullText:
+            match = self.rankQuery()
+            if match:
+                conditions.append(matchCondition(match, table))
+        elif not self.scan:
+            if self.titleText:
+                conditions.append(likeCondition(const.TITLE, self.titleText))
+            if self.bodyText:
+                conditions.append(likeCondition(const.TEXT, self.bodyText))
+        conditions.append(tagCondition(self.included, self.excluded, self.matchAll, table))
+
+        sql = []
+        for condition, conditionValues in conditions:
+            if condition:
+                sql.append(condition)
+                values.extend(conditionValues)
+        return ' AND '.join(sql), values
+
+def _textNarrows(text, previous, fullText):
+    ''' Checks whether a search text matches a subset of what a previous one
+        did. With LIKE that holds when it contains the previous text. In a full
+        text query each word is a prefix term, so it holds when more is typed
+        at the end, unless quotes change which words are phrases
+        args:
+            text (str): the search text
+            previous (str): the previous search text
+            fullText (bool): whether the text is searched through the full text index
+        returns:
+            bool: whether the text narrows the previous search
+    '''
+    if not previous:
+        return True
+    if fullText:
+        return text.startswith(previous) and '"' not in text
+    return previous in text
+
+def _foldCase(text):
+    ''' returns text with its ASCII letters, the only ones LIKE ignores the case of, in lower case '''
+    return ''.join(character.lower() if character.isascii() else character for character in text or '')
+
+def tagCondition(included, excluded=None, matchAll=False, table=const.TABLE):
+    ''' Makes a filter condition for entries by their tags, as subqueries on
+        the tag tables that SQLite evaluates once rather than lists of IDs
+        args:
+            included (dict of {str: list of str}): tag to categories dictionary
+                for the tags to filter by
+            excluded (dict of {str: list of str}): tag to categories dictionary
+                for the tags that entries must not have
+            matchAll (bool): whether entries need all the included tags, rather
+                than any of them
+            table (str): the table being filtered
+        returns:
+            tuple of (str, list of str): the condition, or an empty string if
+                there are no tags, and the tag names for its placeholders
+    '''
+    conditions = []
+    if matchAll:
+        for tag, categories in included.items():
+            conditions.append(_anyTagCondition({category: [tag] for category in categories}, table))
+    elif included:
+        conditions.append(_anyTagCondition(_tagsByCategory(included), table))
+    if excluded:
+        condition, names = _anyTagCondition(_tagsByCategory(excluded), table)
+        if condition:
+            conditions.append(("NOT " + condition, names))
+    values = []
+    for condition, names in conditions:
+        if condition:
+            values.extend(names)
+    return ' AND '.join(condition for condition, names in conditions if condition), values
+
+def _tagsByCategory(tagCategories):
+    ''' Inverts a tag to categories dictionary
+        args:
+            tagCategories (dict of {str: list of str}): tag to categories dictionary
+        returns:
+            dict of {str: list of str}: category to tags dictionary
+    '''
+    categoryTags = {}
+    for tag, categories in tagCategories.items():
+        for category in categories:
+            categoryTags.setdefault(category, []).append(tag)
+    return categoryTags
+
+def _anyTagCondition(categoryTags, table=const.TABLE):
+    ''' Makes a condition for entries having any of the given tags
+        args:
+            categoryTags (dict of {str: list of str}): category to tags dictionary
+            table (str): the table being filtered
+        returns:
+            tuple of (str, list of str): the condition, or an empty string if
+                there are no tags, and the tag names for its placeholders
+    '''
+    subqueries = []
+    names = []
+    for category, tags in categoryTags.items():
+        if not tags:
+            continue
+        tagMap = category + const.MAPSUFFIX
+        tagIndex = category + const.INDEXSUFFIX
+        placeholders = ', '.join('?' * len(tags))
+        subqueries.append(
+            f"{table}.{const.ID} IN (SELECT {tagMap}.{const.DOCID} FROM {tagMap}"
+            f" JOIN {tagIndex} ON {tagIndex}.{const.TAGID} = {tagMap}.{const.TAGID}"
+            f" WHERE {tagIndex}.{const.TAGNAME} IN ({placeholders}))")
+        names.extend(tags)
+    if not subqueries:
+        return '', []
+    return '(' + ' OR '.join(subqueries) + ')', names
+
+def createTagIndexes(categories):
+    ''' Creates the indexes used to filter by tags if they do not exist. The
+        map table is covered in both directions, tag to entries for filtering
+        and entry to tags for reading an entry's tags
+        args:
+            categories (list of str): the tag categories
+        returns:
+            bool: whether all the indexes exist
+    '''
+    success = True
+    for category in categories:
+        tagMap = category + const.MAPSUFFIX
+        tagIndex = category + const.INDEXSUFFIX
+        statements = [
+            f"CREATE INDEX IF NOT EXISTS {tagMap}TagDoc ON {tagMap} ({const.TAGID}, {const.DOCID})",
+            f"CREATE INDEX IF NOT EXISTS {tagMap}DocTag ON {tagMap} ({const.DOCID}, {const.TAGID})",
+            f"CREATE INDEX IF NOT EXISTS {tagIndex}Name ON {tagIndex} ({const.TAGNAME})",
+            ]
+        for statement in statements:
+            query = _query()
+            if not query.exec(statement):
+                print("Error creating tag index:", query.lastError().text())
+                success = False
+    return success
+
+def createTables(categories, table=const.TABLE):
+    ''' Creates the entry table, and the tag tables and their indexes for
+        each category, if they do not exist
+        args:
+            categories (list of str): the tag categories
+            table (str): the entry table
+        returns:
+            bool: whether all the tables exist
+    '''
+    statements = [f"CREATE TABLE IF NOT EXISTS {table} ({const.ID} INTEGER PRIMARY KEY, "
+                  f"{const.TITLE} TEXT, {const.TEXT} TEXT)"]
+    for category in categories:
+        statements.append(f"CREATE TABLE IF NOT EXISTS {category + const.INDEXSUFFIX} "
+                          f"({const.TAGID} INTEGER PRIMARY KEY, {const.TAGNAME} TEXT)")
+        statements.append(f"CREATE TABLE IF NOT EXISTS {category + const.MAPSUFFIX} "
+                          f"({const.DOCID} INTEGER, {const.TAGID} INTEGER)")
+    success = True
+    for statement in statements:
+        query = _query()
+        if not query.exec(statement):
+            print("Error creating table:", query.lastError().text())
+            success = False
+    return (createTagIndexes(categories) and createTagCounts(categories)
+            and createEntryTagCounts(categories) and success)
+
+def createTagCounts(categories):
+    ''' Creates the table counting each tag's entries for any category without
+        one, with triggers keeping it in step with the category's tag map, and
+        fills it from the tags already added
+        args:
+            categories (list of str): the tag categories
+        returns:
+            bool: whether every category has a count table
+    '''
+    success = True
+    for category in categories:
+        tagMap = category + const.MAPSUFFIX
+        tagCount = category + const.COUNTSUFFIX
+        if checkTableExists(tagCount):
+            continue
+        increment = (f"INSERT INTO {tagCount} ({const.TAGID}, {const.DOCCOUNT}) VALUES (new.{const.TAGID}, 1) "
+                     f"ON CONFLICT ({const.TAGID}) DO UPDATE SET {const.DOCCOUNT} = {const.DOCCOUNT} + 1;")
+        decrement = (f"UPDATE {tagCount} SET {const.DOCCOUNT} = {const.DOCCOUNT} - 1 "
+                     f"WHERE {const.TAGID} = old.{const.TAGID};")
+        # triggers left by a count table that was dropped would fail every insert
+        statements = [f"DROP TRIGGER IF EXISTS {tagCount}{event}" for event in ('Insert', 'Delete', 'Update')]
+        statements += [
+            f"CREATE TABLE {tagCount} ({const.TAGID} INTEGER PRIMARY KEY, {const.DOCCOUNT} INTEGER NOT NULL)",
+            f"CREATE TRIGGER {tagCount}Insert AFTER INSERT ON {tagMap} BEGIN {increment} END",
+            f"CREATE TRIGGER {tagCount}Delete AFTER DELETE ON {tagMap} BEGIN {decrement} END",
+            f"CREATE TRIGGER {tagCount}Update AFTER UPDATE OF {const.TAGID} ON {tagMap} "
+            f"BEGIN {decrement} {increment} END",
+            f"INSERT INTO {tagCount} ({const.TAGID}, {const.DOCCOUNT}) "
+            f"SELECT {const.TAGID}, COUNT(*) FROM {tagMap} GROUP BY {const.TAGID}",
+            ]
+        database = _database()
+        database.transaction()
+        for statement in statements:
+            query = _query()
+            if not query.exec(statement):
+                print("Error creating tag counts:", query.lastError().text())
+                database.rollback()
+                success = False
+                break
+        else:
+            success = database.commit() and success
+    return success
+
+def createEntryTagCounts(categories):
+    ''' Keeps each entry's number of tags, which entries can be sorted by, in
+        step with the tag maps of any categories not already counted, and adds
+        the tags those categories already have. Does nothing for a database
+        made before entries had a tag count, which migrateDatabase brings up to date
+        args:
+            categories (list of str): the tag categories
+        returns:
+            bool: whether every category is counted
+    '''
+    if not _hasEntryColumn(const.TAGCOUNT):
+        return True
+    success = True
+    for category in categories:
+        tagMap = category + const.MAPSUFFIX
+        trigger = tagMap + const.TAGCOUNT
+        if _triggerExists(trigger + 'Insert'):
+            continue
+        increment = (f"UPDATE {const.TABLE} SET {const.TAGCOUNT} = {const.TAGCOUNT} + 1 "
+                     f"WHERE {const.ID} = new.{const.DOCID};")
+        decrement = (f"UPDATE {const.TABLE} SET {const.TAGCOUNT} = {const.TAGCOUNT} - 1 "
+                     f"WHERE {const.ID} = old.{const.DOCID};")
+        statements = [f"DROP TRIGGER IF EXISTS {trigger}{event}" for event in ('Delete', 'Update')]
+        statements += [
+            f"CREATE TRIGGER {trigger}Insert AFTER INSERT ON {tagMap} BEGIN {increment} END",
+            f"CREATE TRIGGER {trigger}Delete AFTER DELETE ON {tagMap} BEGIN {decrement} END",
+            f"CREATE TRIGGER {trigger}Update AFTER UPDATE OF {const.DOCID} ON {tagMap} "
+            f"BEGIN {decrement} {increment} END",
+            f"UPDATE {const.TABLE} SET {const.TAGCOUNT} = {const.TAGCOUNT} + "
+            f"(SELECT COUNT(*) FROM {tagMap} WHERE {tagMap}.{const.DOCID} = {const.TABLE}.{const.ID}) "
+            f"WHERE {const.ID} IN (SELECT {const.DOCID} FROM {tagMap})",
+            ]
+        database = _database()
+        database.transaction()
+        for statement in statements:
+            query = _query()
+            if not query.exec(statement):
+                print("Error counting entry tags:", query.lastError().text())
+                database.rollback()
+                success = False
+                break
+        else:
+            success = database.commit() and success
+    return success
+
+def _triggerExists(name):
+    ''' returns whether the open database has a trigger '''
+    query = _prepared("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?")
+    _bind(query, name)
+    exists = query.exec() and query.next()
+    query.finish()
+    return exists
+
+def getTagCounts(categories, filter=None, table=const.TABLE):
+    ''' Counts the entries having each tag, across the categories in one
+        query. Without a filter the totals are read from the tag count
+        tables, otherwise the entries matching the filter are found once and
+        their tags counted
+        args:
+            categories (list of str): the tag categories
+            filter (Filter/str): the search filter, None for every entry
+            table (str): the entry table
+        returns:
+            dict of {str: dict of {str: int}}: category to tag name to number
+                of entries dictionary, leaving out tags no entry has
+    '''
+    counts = {category: {} for category in categories}
+    if not categories:
+        return counts
+    where, values = _whereClause(filter, table=table)
+    parts = []
+    for category in categories:
+        tagMap = category + const.MAPSUFFIX
+        tagIndex = category + const.INDEXSUFFIX
+        tagCount = category + const.COUNTSUFFIX
+        if not where and checkTableExists(tagCount):
+            parts.append(f"SELECT ?, {tagIndex}.{const.TAGNAME}, {tagCount}.{const.DOCCOUNT} FROM {tagCount}"
+                         f" JOIN {tagIndex} ON {tagIndex}.{const.TAGID} = {tagCount}.{const.TAGID}"
+                         f" WHERE {tagCount}.{const.DOCCOUNT} > 0")
+            continue
+        # a database that cannot be migrated may not have the count tables
+        matching = f" WHERE {tagMap}.{const.DOCID} IN Matches" if where else ''
+        parts.append(f"SELECT ?, {tagIndex}.{const.TAGNAME}, COUNT(*) FROM {tagMap}"
+                     f" JOIN {tagIndex} ON {tagIndex}.{const.TAGID} = {tagMap}.{const.TAGID}"
+                     f"{matching} GROUP BY {tagMap}.{const.TAGID}")
+    sql = ' UNION ALL '.join(parts)
+    if where:
+        sql = f"WITH Matches AS (SELECT {table}.{const.ID} FROM {table}{where}) " + sql
+    query = _prepared(sql)
+    _bind(query, *values, *categories)
+    if not query.exec():
+        print("Error counting tags:", query.lastError().text())
+        query.finish()
+        return counts
+    while query.next():
+        counts[query.value(0)][query.value(1)] = query.value(2)
+    query.finish()
+    return counts
+
+def _createTitleIndex(categories):
+    ''' Indexes the entry titles, which are looked up by exact title '''
+    query = _query()
+    if not query.exec(f"CREATE INDEX IF NOT EXISTS {const.TABLE}Title ON {const.TABLE} ({const.TITLE})"):
+        print("Error creating title index:", query.lastError().text())
+        return False
+    return True
+
+def _createFullTextIndex(categories):
+    ''' Creates the full text index, if SQLite has FTS5. Without it there is
+        nothing to do, as searches fall back to LIKE, and the index is made
+        by migrateDatabase once SQLite has it '''
+    return createFullTextIndex() or not _hasFTS5()
+
+def _addCompressionColumn(categories):
+    ''' Adds the flag saying how each text body is compressed, and the table
+        of shared compression dictionaries '''
+    statements = [f"CREATE TABLE IF NOT EXISTS {const.DICTIONARYTABLE} ({const.ID} INTEGER PRIMARY KEY, "
+                  "Checksum INTEGER, Data BLOB)"]
+    if const.COMPRESSION not in _columnNames(const.TABLE):
+        # existing rows take the default without the table being rewritten
+        statements.insert(0, f"ALTER TABLE {const.TABLE} ADD COLUMN {const.COMPRESSION} "
+                             "INTEGER NOT NULL DEFAULT 0")
+    for statement in statements:
+        query = _query()
+        if not query.exec(statement):
+            print("Error adding compression column:", query.lastError().text())
+            return False
+    _entryColumns.pop(_databaseKey(), None)
+    return True
+
+def _addSortKeys(categories):
+    ''' Adds the time each entry was added and its number of tags, and indexes
+        every column entries can be sorted by. Titles are indexed as
+        ifnull(Title, ''), the key they are sorted by, so that paging by the
+        last key never compares against a missing title '''
+    columns = _columnNames(const.TABLE)
+    statements = []
+    for column in (const.ADDED, const.TAGCOUNT):
+        if column not in columns:
+            # existing rows take the default without the table being rewritten
+            statements.append(f"ALTER TABLE {const.TABLE} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+    statements += [
+        f"CREATE INDEX IF NOT EXISTS {const.TABLE}TitleKey ON {const.TABLE} (ifnull({const.TITLE}, ''))",
+        # exact title lookups use the sort key index too, see getTextBodyFromTitle
+        f"DROP INDEX IF EXISTS {const.TABLE}Title",
+        f"CREATE INDEX IF NOT EXISTS {const.TABLE}{const.ADDED} ON {const.TABLE} ({const.ADDED})",
+        f"CREATE INDEX IF NOT EXISTS {const.TABLE}{const.TAGCOUNT} ON {const.TABLE} ({const.TAGCOUNT})",
+        ]
+    if hasFullTextSearch() and not hasContentlessIndex():
+        # counting tags updates the entry table, which should not index the entry again
+        statements += [f"DROP TRIGGER IF EXISTS {const.FTSTABLE}Update", _fullTextUpdateTrigger()]
+    for statement in statements:
+        query = _query()
+        if not query.exec(statement):
+            print("Error adding sort keys:", query.lastError().text())
+            return False
+    _entryColumns.pop(_databaseKey(), None)
+    return createEntryTagCounts(categories)
+
+def _addResultCache(categories):
+    ''' Adds the result generation, which writes increase so that cached
+        search results can be known to be stale, and the table results are
+        kept in between sessions '''
+    statements = [
+        f"CREATE TABLE IF NOT EXISTS {const.GENERATIONTABLE} (Generation INTEGER NOT NULL)",
+        f"INSERT INTO {const.GENERATIONTABLE} (Generation) SELECT 0 "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {const.GENERATIONTABLE})",
+        f"CREATE TABLE IF NOT EXISTS {const.RESULTTABLE} (Query TEXT PRIMARY KEY, "
+        "Generation INTEGER NOT NULL, EntryCount INTEGER, IDs BLOB, Keys TEXT)",
+        ]
+    for statement in statements:
+        query = _query()
+        if not query.exec(statement):
+            print("Error adding result cache:", query.lastError().text())
+            return False
+    _resultGenerations.pop(_databaseKey(), None)
+    return True
+
+# (schema version, step to reach it from the version before), in order. Each
+# step is given the tag categories and returns whether it succeeded, and must
+# be safe to run again on a database it has already been run on
+_migrations = [
+    (1, _createTitleIndex),
+    (2, _createFullTextIndex),
+    (3, _addCompressionColumn),
+    (4, _addSortKeys),
+    (5, _addResultCache),
+    ]
+
+def getSchemaVersion():
+    ''' returns the schema version of the open database, 0 for a database
+        that has never been migrated '''
+    query = _query("PRAGMA user_version")
+    version = 0
+    if query.next():
+        version = query.value(0)
+    query.finish()
+    return version
+
+def _setSchemaVersion(version):
+    ''' Records the schema version of the open database '''
+    # PRAGMA does not take placeholders
+    query = _query(f"PRAGMA user_version = {int(version)}")
+    return query.isActive()
+
+def migrateDatabase(categories):
+    ''' Brings a database up to the current schema. Missing tables and tag
+        indexes are created for every category, then the migrations newer than
+        the database's schema version are run in order, and the planner's
+        statistics are gathered again if anything changed
+        args:
+            categories (list of str): the tag categories
+        returns:
+            bool: whether the full text index is available
+    '''
+    version = getSchemaVersion()
+    latest = _migrations[-1][0]
+    if version > latest:
+        print(f"Warning: database schema version {version} is newer than {latest}")
+    objectCount = _schemaObjectCount()
+    createTables(categories)
+
+    migrated = False
+    for target, step in _migrations:
+        if version >= target:
+            continue
+        if not step(categories):
+            # later steps may depend on this one, so try again next time
+            print(f"Error migrating database to schema version {target}")
+            break
+        _setSchemaVersion(target)
+        version = target
+        migrated = True
+    # a database brought up to date without FTS5 is indexed once SQLite has it
+    if version >= latest and not hasFullTextSearch() and _hasFTS5():
+        migrated = createFullTextIndex() or migrated
+
+    if migrated or _schemaObjectCount() != objectCount:
+        # new tag categories and sort keys can change what searches find
+        _bumpGeneration()
+        analyzeDatabase()
+    return hasFullTextSearch()
+
+def _columnNames(table):
+    ''' returns the names of a table's columns, in order '''
+    query = _query(f"PRAGMA table_info({table})")
+    names = []
+    while query.next():
+        names.append(query.value(1))
+    query.finish()
+    return names
+
+def _schemaObjectCount():
+    ''' returns the number of tables, indexes and triggers in the open database '''
+    query = _query("SELECT COUNT(*) FROM sqlite_master")
+    count = 0
+    if query.next():
+        count = query.value(0)
+    query.finish()
+    return count
+
+def analyzeDatabase():
+    ''' Gathers the statistics SQLite's query planner uses to choose indexes,
+        which should be done after the schema or a large share of the data changes
+        returns:
+            bool: whether the statistics were gathered
+    '''
+    query = _query("ANALYZE")
+    if not query.isActive():
+        print("Error analysing database:", query.lastError().text())
+        return False
+    return True
+
 def addEntry(title=None, textBody=None):
     ''' Create a new database entry from a given title and text body
         args:
@@ -68,16 +842,590 @@ def addEntry(title=None, textBody=None):
         returns:
             int: the ID of the new entry
     '''
-    query = QSqlQuery()
-    query.prepare("INSERT INTO Docs ({}, {}) VALUES (?, ?)".format(const.TITLE, const.TEXT))
-    query.addBindValue(title)
-    query.addBindValue(textBody)
-
+    storedBody, flag = _storedBody(textBody)
+    values = {const.TITLE: title, const.TEXT: storedBody}
+    if flag:
+        values[const.COMPRESSION] = flag
+    if _hasEntryColumn(const.ADDED):
+        values[const.ADDED] = int(time.time())
+    query = _prepared("INSERT INTO {} ({}) VALUES ({})".format(
+        const.TABLE, ', '.join(values), ', '.join('?' * len(values))))
+    _bind(query, *values.values())
+    # the entry is added in the same transaction as the result generation is
+    # increased, so no cached result outlives it
+    database = _database()
+    database.transaction()
     if not query.exec():
         Utils.ErrorMessage("Error executing query:" + query.lastError().text())
+        database.rollback()
+        return None
+    entryID = query.lastInsertId()
+    # a compressed body is indexed here, as the index's triggers cannot read it
+    if flag and not _indexBodies([entryID], [title], [textBody]):
+        database.rollback()
+        return None
+    if not _bumpGeneration() or not database.commit():
+        database.rollback()
+        return None
+    return entryID
+
+
+def bulkAddEntries(entries, batchSize=const.BATCHSIZE, progress=None):
+    ''' Adds many entries and their tags, a batch at a time. Each batch is one
+        transaction, rows are inserted with batched prepared statements, and
+        tag IDs are looked up in the tag dictionaries rather than queried per tag
+        args:
+            entries (iterable of dict): entries with "title" and "textBody" strings,
+                and optionally "tags", a category to tag list dictionary
+            batchSize (int): the number of entries to insert per transaction
+            progress (callable): called with the number of entries added so far
+                after each batch
+        returns:
+            int: the number of entries added
+    '''
+    database = _database()
+    added = 0
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batchSize:
+            if not _addBatch(database, batch):
+                return added
+            added += len(batch)
+            batch = []
+            if progress:
+                progress(added)
+    if batch and _addBatch(database, batch):
+        added += len(batch)
+        if progress:
+            progress(added)
+    return added
+
+def _addBatch(database, batch):
+    ''' Adds a batch of entries in one transaction
+        args:
+            database (PyQt5.QtSql.QSqlDatabase): the database
+            batch (list of dict): the entries, as for bulkAddEntries
+        returns:
+            bool: whether the batch was added
+    '''
+    database.transaction()
+    # IDs are given explicitly so the tags can be mapped without reading them back
+    firstID = (getIDRange()[1] or 0) + 1
+    entryIDs = list(range(firstID, firstID + len(batch)))
+    titles = [entry.get('title') for entry in batch]
+    textBodies = [entry.get('textBody') for entry in batch]
+    # category: ([entry IDs], [tag IDs])
+    mappings = {}
+    newTags = {}
+    tagCounts = [0] * len(batch)
+    for number, (entryID, entry) in enumerate(zip(entryIDs, batch)):
+        for category, tagList in (entry.get('tags') or {}).items():
+            docIDs, mappedTagIDs = mappings.setdefault(category, ([], []))
+            for tag in tagList:
+                tagID, error = _resolveTagID(category, tag, newTags)
+                if tagID is None:
+                    print("Error adding tag:", error)
+                    database.rollback()
+                    return False
+                docIDs.append(entryID)
+                mappedTagIDs.append(tagID)
+                tagCounts[number] += 1
+
+    # the tags are mapped before the entries are added, so each entry is added
+    # with its tag count rather than having it updated a tag at a time
+    for category, (docIDs, mappedTagIDs) in mappings.items():
+        if not docIDs:
+            continue
+        query = _prepared(f"INSERT INTO {category + const.MAPSUFFIX} ({const.DOCID}, {const.TAGID}) VALUES (?, ?)")
+        _bind(query, docIDs, mappedTagIDs)
+        if not query.execBatch():
+            print("Error adding tags:", query.lastError().text())
+            database.rollback()
+            return False
+
+    storedBodies, flags = zip(*(_storedBody(textBody) for textBody in textBodies))
+    values = {const.ID: entryIDs, const.TITLE: titles, const.TEXT: list(storedBodies)}
+    if any(flags):
+        values[const.COMPRESSION] = list(flags)
+    if _hasEntryColumn(const.ADDED):
+        values[const.ADDED] = [int(time.time())] * len(batch)
+    if _hasEntryColumn(const.TAGCOUNT):
+        values[const.TAGCOUNT] = tagCounts
+    query = _prepared("INSERT INTO {} ({}) VALUES ({})".format(
+        const.TABLE, ', '.join(values), ', '.join('?' * len(values))))
+    _bind(query, *values.values())
+    if not query.execBatch():
+        print("Error adding entries:", query.lastError().text())
+        database.rollback()
+        return False
+    compressed = [i for i, flag in enumerate(flags) if flag]
+    if compressed and not _indexBodies([entryIDs[i] for i in compressed], [titles[i] for i in compressed],
+                                       [textBodies[i] for i in compressed]):
+        database.rollback()
+        return False
+    if not _bumpGeneration():
+        database.rollback()
+        return False
+    if not database.commit():
+        return False
+    _addToTagDictionaries(newTags)
+    return True
+
+def _insertTag(category, tag):
+    ''' Adds a new tag to a category
+        args:
+            category (str): category name
+            tag (str): tag name
+        returns:
+            tuple of (int, str): the new tag's ID, or None if it could not be
+                added, and the error adding it
+    '''
+    query = _prepared(f"INSERT INTO {category + const.INDEXSUFFIX} ({const.TAGNAME}) VALUES (?)")
+    _bind(query, tag)
+    if not query.exec():
+        return None, query.lastError().text()
+    return query.lastInsertId(), ''
+
+def hasFullTextSearch():
+    ''' Checks whether the full text index exists in the open database. The
+        answer is kept for each database file, so searches need not ask again
+        returns:
+            bool: whether searches can use the full text index
+    '''
+    key = _databaseKey()
+    if key not in _fullTextSearch:
+        query = _prepared("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?")
+        _bind(query, const.FTSTABLE)
+        _fullTextSearch[key] = query.exec() and query.next()
+        query.finish()
+    return _fullTextSearch[key]
+
+def createFullTextIndex(table=const.TABLE):
+    ''' Creates the FTS5 index over titles and text bodies if the database does
+        not have it yet, with triggers to keep it in step with the table, and
+        fills it from the existing entries
+        args:
+            table (str): the table to index
+        returns:
+            bool: whether the full text index is available
+    '''
+    if hasFullTextSearch():
+        return True
+    if not _hasFTS5():
+        return False
+
+    fts = const.FTSTABLE
+    columns = f"{const.TITLE}, {const.TEXT}"
+    newValues = f"new.{const.ID}, new.{const.TITLE}, new.{const.TEXT}"
+    oldValues = f"old.{const.ID}, old.{const.TITLE}, old.{const.TEXT}"
+    statements = [
+        # external content table, so the text is not stored twice
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='{table}', content_rowid='{const.ID}')",
+        f"CREATE TRIGGER {fts}Insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts} (rowid, {columns}) VALUES ({newValues}); END",
+        f"CREATE TRIGGER {fts}Delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES ('delete', {oldValues}); END",
+        _fullTextUpdateTrigger(table),
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+        ]
+    database = _database()
+    database.transaction()
+    for statement in statements:
+        query = _query()
+        if not query.exec(statement):
+            print("Error creating full text index:", query.lastError().text())
+            database.rollback()
+            return False
+    if not database.commit():
+        return False
+    _fullTextSearch[_databaseKey()] = True
+    return True
+
+def _fullTextUpdateTrigger(table=const.TABLE):
+    ''' returns the SQL creating the trigger that indexes an entry again when
+        its title or text body changes, for the full text index made by
+        createFullTextIndex. Other columns change without touching the index '''
+    fts = const.FTSTABLE
+    columns = f"{const.TITLE}, {const.TEXT}"
+    return (f"CREATE TRIGGER {fts}Update AFTER UPDATE OF {columns} ON {table} BEGIN "
+            f"INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES "
+            f"('delete', old.{const.ID}, old.{const.TITLE}, old.{const.TEXT}); "
+            f"INSERT INTO {fts} (rowid, {columns}) VALUES "
+            f"(new.{const.ID}, new.{const.TITLE}, new.{const.TEXT}); END")
+
+def _hasFTS5():
+    ''' returns whether SQLite was built with the FTS5 full text search extension '''
+    query = _query("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    available = bool(query.next() and query.value(0))
+    query.finish()
+    return available
+
+def hasContentlessIndex():
+    ''' Checks whether the full text index of the open database is contentless,
+        keeping only the index and reading no text from the entry table, which
+        lets the text bodies be compressed. The answer is kept for each database file
+        returns:
+            bool: whether bodies can be compressed
+    '''
+    key = _databaseKey()
+    if key not in _contentlessIndexes:
+        query = _prepared("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?")
+        _bind(query, const.FTSTABLE)
+        sql = query.value(0) if query.exec() and query.next() else ''
+        query.finish()
+        _contentlessIndexes[key] = "content=''" in (sql or '').replace(' ', '')
+    return _contentlessIndexes[key]
+
+def enableCompression(table=const.TABLE, batchSize=const.BATCHSIZE):
+    ''' Prepares the open database for compressed text bodies. SQLite cannot
+        read compressed bodies, so the full text index is rebuilt as a
+        contentless index that is given the plain text by this module, and
+        searches go through it as before
+        args:
+            table (str): the entry table
+            batchSize (int): the number of compressed bodies to index at a time
+        returns:
+            bool: whether bodies can be compressed
+    '''
+    if not hasCompression() and not _addCompressionColumn(None):
+        return False
+    if hasContentlessIndex():
+        return True
+    if not _hasFTS5():
+        print("Error: compressed text bodies need the FTS5 full text index to be searched")
+        return False
+
+    fts = const.FTSTABLE
+    columns = f"{const.TITLE}, {const.TEXT}"
+    newValues = f"new.{const.ID}, new.{const.TITLE}, new.{const.TEXT}"
+    plain = f"new.{const.COMPRESSION} = 0"
+    statements = [
+        f"DROP TRIGGER IF EXISTS {fts}Insert",
+        f"DROP TRIGGER IF EXISTS {fts}Delete",
+        f"DROP TRIGGER IF EXISTS {fts}Update",
+        f"DROP TABLE IF EXISTS {fts}",
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='', contentless_delete=1)",
+        # compressed bodies are indexed by whoever writes them, see _indexBodies
+        f"CREATE TRIGGER {fts}Insert AFTER INSERT ON {table} WHEN {plain} BEGIN "
+        f"INSERT INTO {fts} (rowid, {columns}) VALUES ({newValues}); END",
+        f"CREATE TRIGGER {fts}Delete AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {fts} WHERE rowid = old.{const.ID}; END",
+        # recompressing a body keeps its text, so only plain bodies are indexed again
+        f"CREATE TRIGGER {fts}Update AFTER UPDATE OF {columns} ON {table} WHEN {plain} BEGIN "
+        f"DELETE FROM {fts} WHERE rowid = old.{const.ID}; "
+        f"INSERT INTO {fts} (rowid, {columns}) VALUES ({newValues}); END",
+        f"INSERT INTO {fts} (rowid, {columns}) SELECT {const.ID}, {columns} FROM {table} "
+        f"WHERE {const.COMPRESSION} = 0",
+        ]
+    database = _database()
+    database.transaction()
+    for statement in statements:
+        query = _query()
+        if not query.exec(statement):
+            print("Error creating contentless full text index:", query.lastError().text())
+            database.rollback()
+            return False
+    # the bodies that are already compressed
+    after = None
+    while True:
+        rows = getRowBlock([const.ID, const.TITLE, const.TEXT], after, batchSize, table,
+                           f"WHERE {const.COMPRESSION} != 0")
+        if not rows:
+            break
+        if not _indexBodies(*zip(*rows)):
+            database.rollback()
+            return False
+        after = rows[-1][0]
+    if not database.commit():
+        return False
+    key = _databaseKey()
+    _fullTextSearch[key] = True
+    _contentlessIndexes[key] = True
+    return True
+
+def hasCompression():
+    ''' returns whether the entry table of the open database has the flag
+        saying how each text body is compressed '''
+    return _hasEntryColumn(const.COMPRESSION)
+
+def _hasEntryColumn(column):
+    ''' Checks whether the entry table of the open database has a column that
+        a migration adds. The table's columns are kept for each database file
+        args:
+            column (str): the column name
+        returns:
+            bool: whether the column exists
+    '''
+    key = _databaseKey()
+    if key not in _entryColumns:
+        _entryColumns[key] = _columnNames(const.TABLE)
+    return column in _entryColumns[key]
+
+def _compressionFlag(table=const.TABLE):
+    ''' returns the column holding each body's compression flag, or 0 for a
+        database made before bodies could be compressed '''
+    if hasCompression():
+        return f"{table}.{const.COMPRESSION}"
+    return '0'
+
+def _indexBodies(ids, titles, textBodies):
+    ''' Adds entries to the contentless full text index, for the compressed
+        bodies its triggers cannot read
+        args:
+            ids (list of int): the entry IDs
+            titles (list of str): the entry titles
+            textBodies (list of str): the plain text bodies
+        returns:
+            bool: whether the entries were indexed
+    '''
+    query = _prepared(f"INSERT INTO {const.FTSTABLE} (rowid, {const.TITLE}, {const.TEXT}) VALUES (?, ?, ?)")
+    _bind(query, list(ids), list(titles), list(textBodies))
+    if not query.execBatch():
+        print("Error indexing entries:", query.lastError().text())
+        return False
+    return True
+
+def _storedBody(textBody, codec=None, level=None):
+    ''' Compresses a text body for storing, if the open database can hold
+        compressed bodies. Bodies longer than Utils.Config().LARGE_TEXT_LENGTH
+        stay plain, as they are read a slice at a time
+        args:
+            textBody (str): the text body
+            codec (str): one of const.CODECS, defaults to Utils.Config().COMPRESSION
+            level (int): the compression level, None for the codec's default
+        returns:
+            tuple of (str/QByteArray, int): the value to store and its compression flag
+    '''
+    flag = Compression.codecFlag(Utils.Config().COMPRESSION if codec is None else codec)
+    if not flag or not hasContentlessIndex() or len(textBody or '') > Utils.Config().LARGE_TEXT_LENGTH:
+        return textBody, Compression.NONE
+    dictionary = _currentDictionary() if flag == Compression.ZLIB else None
+    data, flag = Compression.compress(textBody, flag, dictionary, level)
+    if not flag:
+        return textBody, flag
+    # Qt binds bytes as text, so they go in as a blob through a QByteArray
+    return QByteArray(data), flag
+
+def _decompressBody(value, flag):
+    ''' Reads back a text body stored by _storedBody
+        args:
+            value (str/QByteArray): the stored value
+            flag (int): its compression flag
+        returns:
+            str: the text body
+    '''
+    if not flag or value is None:
+        return value
+    dictionary = None
+    if flag == Compression.ZLIB:
+        checksum = Compression.dictionaryChecksum(value)
+        if checksum is not None:
+            dictionary = _getDictionary(checksum)
+    return Compression.decompress(value, flag, dictionary)
+
+def _currentDictionary():
+    ''' returns the shared dictionary new bodies in the open database are
+        compressed with, the one added last, or None if it has none '''
+    key = _databaseKey()
+    if key not in _currentDictionaries:
+        dictionary = None
+        if hasCompression():
+            query = _prepared(f"SELECT Data FROM {const.DICTIONARYTABLE} ORDER BY {const.ID} DESC LIMIT 1")
+            if query.exec() and query.next():
+                dictionary = bytes(query.value(0))
+            query.finish()
+        _currentDictionaries[key] = dictionary
+    return _currentDictionaries[key]
+
+def _getDictionary(checksum):
+    ''' Reads a shared compression dictionary by its checksum. Dictionaries
+        are never changed once added, so each is read once per database file
+        args:
+            checksum (int): the dictionary's Adler-32 checksum
+        returns:
+            bytes: the dictionary, or None if the database does not have it
+    '''
+    key = (_databaseKey(), checksum)
+    if key not in _compressionDictionaries:
+        query = _prepared(f"SELECT Data FROM {const.DICTIONARYTABLE} WHERE Checksum = ?")
+        _bind(query, checksum)
+        if not (query.exec() and query.next()):
+            query.finish()
+            print("Error: missing compression dictionary", checksum)
+            return None
+        _compressionDictionaries[key] = bytes(query.value(0))
+        query.finish()
+    return _compressionDictionaries[key]
+
+def addCompressionDictionary(dictionary):
+    ''' Adds a shared dictionary to the open database, which new zlib
+        compressed bodies are compressed with from then on. Bodies compressed
+        with earlier dictionaries can still be read
+        args:
+            dictionary (bytes): the dictionary, see Compression.trainDictionary
+        returns:
+            int: the dictionary's checksum, or None if it could not be added
+    '''
+    checksum = zlib.adler32(dictionary)
+    query = _prepared(f"INSERT INTO {const.DICTIONARYTABLE} (Checksum, Data) VALUES (?, ?)")
+    _bind(query, checksum, QByteArray(dictionary))
+    if not query.exec():
+        print("Error adding compression dictionary:", query.lastError().text())
         return None
-    return query.lastInsertId()
+    key = _databaseKey()
+    _compressionDictionaries[(key, checksum)] = dictionary
+    _currentDictionaries[key] = dictionary
+    return checksum
+
+def trainCompressionDictionary(sampleSize=const.DICTIONARYSAMPLES, size=const.DICTIONARYSIZE,
+                               table=const.TABLE):
+    ''' Builds a shared compression dictionary from a random sample of the
+        text bodies and adds it to the open database
+        args:
+            sampleSize (int): the number of bodies to sample
+            size (int): the most bytes the dictionary may hold
+            table (str): the entry table
+        returns:
+            int: the dictionary's checksum, or None if none was added
+    '''
+    flag = _compressionFlag(table)
+    query = _prepared(f"SELECT {const.TEXT}, {flag} FROM {table} ORDER BY random() LIMIT ?")
+    _bind(query, sampleSize)
+    samples = []
+    if query.exec():
+        while query.next():
+            samples.append(_decompressBody(query.value(0), query.value(1)))
+    query.finish()
+    dictionary = Compression.trainDictionary(samples, size)
+    if not dictionary:
+        return None
+    return addCompressionDictionary(dictionary)
+
+def recompressEntries(codec, level=None, batchSize=const.BATCHSIZE, progress=None,
+                      table=const.TABLE):
+    ''' Stores every text body again with a codec, a batch at a time, each
+        batch in one transaction. zlib bodies use the dictionary added last.
+        Bodies stay in the full text index, as their text does not change
+        args:
+            codec (str): one of const.CODECS, 'none' to store every body plain
+            level (int): the compression level, None for the codec's default
+            batchSize (int): the number of entries to rewrite per transaction
+            progress (callable): called with the number of entries read so far
+                after each batch
+            table (str): the entry table
+        returns:
+            int: the number of bodies rewritten, or None if it failed
+    '''
+    if Compression.codecFlag(codec) is None:
+        return None
+    if codec.lower() != 'none' and not enableCompression(table):
+        return None
+    if not hasCompression():
+        return 0
+    database = _database()
+    flag = _compressionFlag(table)
+    rewritten = 0
+    read = 0
+    after = 0
+    while True:
+        query = _prepared(f"SELECT {const.ID}, {const.TEXT}, {flag} FROM {table} "
+                          f"WHERE {const.ID} > ? ORDER BY {const.ID} LIMIT ?")
+        _bind(query, after, batchSize)
+        if not query.exec():
+            print("Error reading entries:", query.lastError().text())
+            return None
+        rows = []
+        while query.next():
+            rows.append((query.value(0), query.value(1), query.value(2)))
+        query.finish()
+        if not rows:
+            break
+        after = rows[-1][0]
+        read += len(rows)
+
+        ids, storedBodies, flags = [], [], []
+        for entryID, value, oldFlag in rows:
+            storedBody, newFlag = _storedBody(_decompressBody(value, oldFlag), codec, level)
+            if oldFlag or newFlag:
+                ids.append(entryID)
+                storedBodies.append(storedBody)
+                flags.append(newFlag)
+        if ids:
+            database.transaction()
+            query = _prepared(f"UPDATE {table} SET {const.TEXT} = ?, {const.COMPRESSION} = ? "
+                              f"WHERE {const.ID} = ?")
+            _bind(query, storedBodies, flags, ids)
+            if not query.execBatch() or not database.commit():
+                print("Error recompressing entries:", query.lastError().text())
+                database.rollback()
+                return None
+            rewritten += len(ids)
+        if progress:
+            progress(read)
+    return rewritten
+
+def vacuumDatabase():
+    ''' Rebuilds the open database file without its free pages, so that the
+        file shrinks after much of its data is removed or compressed
+        returns:
+            bool: whether the file was rebuilt
+    '''
+    query = _query("VACUUM")
+    if not query.isActive():
+        print("Error vacuuming database:", query.lastError().text())
+        return False
+    # in WAL mode the rebuilt pages are only written back at a checkpoint
+    _query("PRAGMA wal_checkpoint(TRUNCATE)").finish()
+    return True
+
+def makeMatchQuery(text, column=None):
+    ''' Makes an FTS5 query from search text. Text in double quotes matches
+        as a phrase, and other words match as prefixes
+        args:
+            text (str): the search text
+            column (str): the column to restrict the search to
+        returns:
+            str: the FTS5 query, or an empty string if there is nothing to search
+    '''
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"?|(\S+)', text):
+        if phrase.strip():
+            terms.append('"{}"'.format(phrase.replace('"', '""')))
+        elif word:
+            terms.append('"{}"*'.format(word.replace('"', '""')))
+    if not terms:
+        return ''
+    match = ' '.join(terms)
+    if column:
+        match = f"{column} : ({match})"
+    return match
+
+def matchCondition(match, table=const.TABLE):
+    ''' Makes a filter condition for the entries matching an FTS5 query
+        args:
+            match (str): the FTS5 query
+            table (str): the table being filtered
+        returns:
+            tuple of (str, list of str): the condition, and the query for its
+                placeholder
+    '''
+    return "{}.{} IN (SELECT rowid FROM {} WHERE {} MATCH ?)".format(
+        table, const.ID, const.FTSTABLE, const.FTSTABLE), [match]
 
+def likeCondition(column, text):
+    ''' Makes a filter condition for a column containing some text. The
+        text's % and _ are escaped, so they are found as they are rather than
+        matching any text or character
+        args:
+            column (str): the column to search
+            text (str): the text to find
+        returns:
+            tuple of (str, list of str): the condition, and the pattern for its
+                placeholder
+    '''
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"{column} LIKE ? ESCAPE '\\'", [f"%{escaped}%"]
 
 def initDatabase(file):
     ''' Initialise a database from a given file
@@ -86,15 +1434,451 @@ def initDatabase(file):
         returns:
             PyQt5.QtSql.QSqlDatabase: the initialised database
     '''
-    database = QSqlDatabase.addDatabase('QSQLITE')
+    database = openDatabase(file, Utils.Config().READ_ONLY)
+    if not database.isOpen():
+        Utils.ErrorMessage("Error: Could not open database.", critical=True)
+
+    return database
+
+def useConnection(connectionName):
+    ''' Sets the connection used by this module's functions on the current
+        thread, so that worker threads can query through their own connections
+        args:
+            connectionName (str): the connection name, or None for the default
+    '''
+    if connectionName is None:
+        _statementPools.pop(_connections.pop(threading.get_ident(), None), None)
+    else:
+        _connections[threading.get_ident()] = connectionName
+
+def _database():
+    ''' returns the database connection for the current thread '''
+    name = _connections.get(threading.get_ident())
+    if name is None:
+        return QSqlDatabase.database()
+    return QSqlDatabase.database(name)
+
+def _query(queryString=None, database=None):
+    ''' Makes a query on the current thread's connection, running it straight
+        away if a query string is given. The query reports each statement it
+        runs to Instrumentation, under the name of the function calling this
+        args:
+            queryString (str): the query to run
+            database (PyQt5.QtSql.QSqlDatabase): the connection to query, if
+                not the current thread's
+        returns:
+            PyQt5.QtSql.QSqlQuery: the query
+    '''
+    query = _TimedQuery(database or _database(), sys._getframe(1).f_code.co_name)
+    if queryString is not None:
+        query.exec(queryString)
+    return query
+
+def _prepared(sql):
+    ''' Gets a prepared query for a statement from the current connection's
+        pool, so that statements run again are not parsed and planned again.
+        The query must be finished once its rows are read, to return it to
+        the pool
+        args:
+            sql (str): the statement, with placeholders for its values
+        returns:
+            PyQt5.QtSql.QSqlQuery: the prepared query
+    '''
+    database = _database()
+    caller = sys._getframe(1).f_code.co_name
+    pool = _statementPools.setdefault(database.connectionName(), OrderedDict())
+    query = pool.get(sql)
+    # a select still being read is in use by a caller further up
+    if query is not None and not (query.isActive() and query.isSelect()):
+        pool.move_to_end(sql)
+        query._caller = caller
+        return query
+
+    query = _TimedQuery(database, caller)
+    if not query.prepare(sql):
+        print("Error preparing query:", query.lastError().text())
+        return query
+    if sql not in pool:
+        pool[sql] = query
+        while len(pool) > const.STATEMENTPOOLSIZE:
+            pool.popitem(last=False)
+    return query
+
+def _bind(query, *values):
+    ''' Binds values to a query's placeholders, in order
+        args:
+            query (PyQt5.QtSql.QSqlQuery): the prepared query
+            values: the values
+    '''
+    for value in values:
+        query.addBindValue(value)
+
+def _explain(database, sql, values):
+    ''' Reads a statement's query plan, for the slow query log
+        args:
+            database (PyQt5.QtSql.QSqlDatabase): the connection the statement ran on
+            sql (str): the statement
+            values (list): the values bound to its placeholders
+        returns:
+            list of str: the plan's steps
+    '''
+    query = QSqlQuery(database)
+    if not query.prepare("EXPLAIN QUERY PLAN " + sql):
+        return []
+    for value in values:
+        query.addBindValue(value)
+    plan = []
+    if query.exec():
+        while query.next():
+            plan.append(str(query.value(3)))
+    query.finish()
+    return plan
+
+class _TimedQuery(QSqlQuery):
+    ''' A query that times each statement it runs, from executing it until
+        its last row is read or it is finished, and counts the rows returned '''
+    def __init__(self, database, caller):
+        '''
+        database (PyQt5.QtSql.QSqlDatabase): the connection to query
+        caller (str): the name of the function making the query
+        '''
+        super(_TimedQuery, self).__init__(database)
+        self._connection = database
+        self._caller = caller
+        self._sql = None
+        self._values = []
+        self._seconds = 0.0
+        self._rows = 0
+        self._timing = False
+        # Qt starts binding from the first placeholder again after each run
+        self._rebind = False
+
+    def prepare(self, sql):
+        self._record()
+        self._sql = sql
+        self._values = []
+        return super(_TimedQuery, self).prepare(sql)
+
+    def addBindValue(self, value, *args):
+        if self._rebind:
+            self._values = []
+            self._rebind = False
+        self._values.append(value)
+        super(_TimedQuery, self).addBindValue(value, *args)
+
+    def exec(self, sql=None):
+        self._record()
+        if sql is not None:
+            self._sql = sql
+            self._values = []
+        start = time.perf_counter()
+        if sql is None:
+            result = super(_TimedQuery, self).exec()
+        else:
+            result = super(_TimedQuery, self).exec(sql)
+        self._start(time.perf_counter() - start, result)
+        return result
+
+    def execBatch(self, *args):
+        self._record()
+        start = time.perf_counter()
+        result = super(_TimedQuery, self).execBatch(*args)
+        self._start(time.perf_counter() - start, result)
+        return result
+
+    def next(self):
+        return self._step(super(_TimedQuery, self).next)
+
+    def first(self):
+        return self._step(super(_TimedQuery, self).first)
+
+    def seek(self, *args):
+        return self._step(super(_TimedQuery, self).seek, *args)
+
+    def finish(self):
+        self._record()
+        super(_TimedQuery, self).finish()
+
+    def __del__(self):
+        self._record()
+
+    def _start(self, seconds, succeeded):
+        ''' Begins timing a statement that has just been executed '''
+        self._seconds = seconds
+        self._rows = 0
+        self._rebind = True
+        self._timing = succeeded and self._sql is not None
+        if not self.isSelect():
+            self._record()
+
+    def _step(self, move, *args):
+        ''' Moves to a row, adding the time taken to the statement '''
+        start = time.perf_counter()
+        found = move(*args)
+        self._seconds += time.perf_counter() - start
+        if found:
+            self._rows += 1
+        else:
+            self._record()
+        return found
+
+    def _record(self):
+        ''' Reports the statement being timed, with its plan if it was slow '''
+        if not self._timing:
+            return
+        self._timing = False
+        plan = None
+        if Instrumentation.isSlow(self._seconds) and self._sql.lstrip().upper().startswith('SELECT'):
+            plan = _explain(self._connection, self._sql, self._values)
+        Instrumentation.recordQuery(self._sql, self._seconds, self._rows, self._caller, plan)
+
+def openDatabase(file, readOnly=False):
+    ''' Opens a database file as the default connection, without any UI
+        args:
+            file (str): filepath for the database
+            readOnly (bool): whether to open the file read only
+        returns:
+            PyQt5.QtSql.QSqlDatabase: the database, which is not open on failure
+    '''
     if not file.endswith('.sqlite'):
         file = file + '.sqlite'
+    database = openConnection(file, readOnly=readOnly)
+    invalidateTagDictionaries()
+    key = _databaseKey()
+    for cache in (_fullTextSearch, _contentlessIndexes, _entryColumns, _currentDictionaries,
+                  _resultGenerations):
+        cache.pop(key, None)
+    return database
+
+def openConnection(file, connectionName=None, readOnly=False):
+    ''' Opens a connection to a database file with the connection profile in
+        Utils.Config. Read only connections let the browser read while another
+        connection or process writes, as long as the file is in WAL mode
+        args:
+            file (str): filepath for the database
+            connectionName (str): the connection's name, None for the default
+            readOnly (bool): whether to open the file read only
+        returns:
+            PyQt5.QtSql.QSqlDatabase: the database, which is not open on failure
+    '''
+    if connectionName is None:
+        # the pooled queries of the connection being replaced go with it
+        _statementPools.pop(QSqlDatabase.database(open=False).connectionName(), None)
+        database = QSqlDatabase.addDatabase('QSQLITE')
+    else:
+        database = QSqlDatabase.addDatabase('QSQLITE', connectionName)
     database.setDatabaseName(file)
+    if readOnly:
+        database.setConnectOptions('QSQLITE_OPEN_READONLY')
+    if database.open():
+        configureConnection(database, readOnly)
+    return database
 
-    if not database.open():
-        Utils.ErrorMessage("Error: Could not open database.", critical=True)
+def configureConnection(database, readOnly=False):
+    ''' Applies the connection profile in Utils.Config to an open connection:
+        the journal mode, which is kept in the file and so is only set by
+        connections that can write, and the per connection busy timeout, page
+        cache, memory map, temporary storage and sync level
+        args:
+            database (PyQt5.QtSql.QSqlDatabase): the open connection
+            readOnly (bool): whether the connection is read only
+        returns:
+            bool: whether every setting was applied
+    '''
+    config = Utils.Config()
+    settings = [('busy_timeout', int(config.BUSY_TIMEOUT_MS)),
+                ('cache_size', -int(config.CACHE_SIZE_KB)),
+                ('mmap_size', int(config.MMAP_SIZE)),
+                ('temp_store', _profileSetting(config.TEMP_STORE, const.TEMPSTORES)),
+                ('synchronous', _profileSetting(config.SYNCHRONOUS, const.SYNCHRONOUSLEVELS))]
+    if not readOnly:
+        settings.append(('journal_mode', _profileSetting(config.JOURNAL_MODE, const.JOURNALMODES)))
 
-    return database
+    success = True
+    for pragma, value in settings:
+        if value is None:
+            continue
+        # PRAGMA does not take placeholders, so values are checked or made ints
+        query = _query(f"PRAGMA {pragma} = {value}", database)
+        if not query.isActive():
+            print(f"Error setting {pragma}:", query.lastError().text())
+            success = False
+        query.finish()
+    return success
+
+def _profileSetting(value, allowed):
+    ''' returns a connection profile setting if it is one of the allowed
+        values, in any case, or None if it is not set or not allowed '''
+    if not value:
+        return None
+    if str(value).upper() not in allowed:
+        print(f"Error: {value} is not one of {', '.join(allowed)}")
+        return None
+    return str(value).upper()
+
+def getEntries(ids, maxLength=None, table=const.TABLE):
+    ''' Reads the titles and text bodies of entries by their IDs
+        args:
+            ids (list of int): the entry IDs
+            maxLength (int): the longest text body to read, longer bodies are
+                left for getTextSlice
+            table (str): the table to read
+        returns:
+            dict of {int: tuple of (str, str, int)}: ID to title, text body and
+                text body length dictionary. The text body is None if it is
+                longer than the maximum length
+    '''
+    ids = list(ids)
+    entries = {}
+    if not ids:
+        return entries
+    flag = _compressionFlag(table)
+    body = const.TEXT
+    if maxLength is not None:
+        # a compressed body's length is only known once it is decompressed
+        body = f"CASE WHEN {flag} != 0 OR length({const.TEXT}) <= ? THEN {const.TEXT} END"
+    query = _prepared("SELECT {}, {}, {}, length({}), {} FROM {} WHERE {} IN ({})".format(
+        const.ID, const.TITLE, body, const.TEXT, flag, table, const.ID, ', '.join('?' * len(ids))))
+    if maxLength is not None:
+        _bind(query, maxLength)
+    _bind(query, *ids)
+    if not query.exec():
+        print("Error executing query:", query.lastError().text())
+        query.finish()
+        return entries
+    while query.next():
+        textBody = query.value(2)
+        length = query.value(3) or 0
+        if query.value(4):
+            textBody = _decompressBody(textBody, query.value(4))
+            length = len(textBody)
+        elif query.isNull(2) and not query.isNull(3):
+            textBody = None
+        entries[query.value(0)] = (query.value(1), textBody, length)
+    query.finish()
+    return entries
+
+def getTextSlice(entryID, start, length, table=const.TABLE):
+    ''' Reads part of an entry's text body, so that very large bodies can be
+        shown a piece at a time
+        args:
+            entryID (int): the entry ID
+            start (int): the position of the first character, from 0
+            length (int): the number of characters to read
+            table (str): the table to read
+        returns:
+            str: the text, which is shorter than the length at the end of the body
+    '''
+    flag = _compressionFlag(table)
+    # a compressed body is read whole, and sliced once decompressed
+    query = _prepared("SELECT CASE WHEN {} = 0 THEN substr({}, ?, ?) ELSE {} END, {} FROM {} WHERE {} = ?".format(
+        flag, const.TEXT, const.TEXT, flag, table, const.ID))
+    _bind(query, start + 1, length, entryID)
+    text = ''
+    if query.exec() and query.next():
+        text = query.value(0)
+        if query.value(1):
+            text = _decompressBody(text, query.value(1))[start:start + length]
+    query.finish()
+    return text
+
+def findHit(entryID, filter, start=0, table=const.TABLE):
+    ''' Finds the next hit of a filter's body text in an entry's text body,
+        without reading the body back, so the viewer can show a large body
+        from its hits. The hits of a full text search are found by
+        _findWordHit, as instr cannot tell where words start
+        args:
+            entryID (int): the entry ID
+            filter (Filter): the search the entry was found by
+            start (int): the position to search from, from 0
+            table (str): the table to read
+        returns:
+            tuple of (int, int): the position and length of the hit, or None
+                if there is none, or the filter has no text to find by SQL
+    '''
+    pattern = _hitPattern(filter)
+    if pattern:
+        return _findWordHit(entryID, pattern, start, table)
+    terms, caseSensitive = _hitTerms(filter)
+    if not terms:
+        return None
+    flag = _compressionFlag(table)
+    rest = f"substr({const.TEXT}, ?)" if caseSensitive else f"lower(substr({const.TEXT}, ?))"
+    # a compressed body is read whole, and searched once decompressed
+    query = _prepared("SELECT CASE WHEN {0} = 0 THEN NULL ELSE {1} END, {0}, {2} FROM {3} WHERE {4} = ?".format(
+        flag, const.TEXT, ', '.join([f"instr({rest}, ?)"] * len(terms)), table, const.ID))
+    values = []
+    for term in terms:
+        values += [start + 1, term]
+    _bind(query, *values, entryID)
+    hit = None
+    if query.exec() and query.next():
+        if query.value(1):
+            hit = _firstHit(_decompressBody(query.value(0), query.value(1)) or '', terms, caseSensitive, start)
+        else:
+            hits = [(query.value(2 + i) - 1 + start, len(term)) for i, term in enumerate(terms)
+                    if query.value(2 + i)]
+            hit = min(hits) if hits else None
+    query.finish()
+    return hit
+
+def _findWordHit(entryID, pattern, start=0, table=const.TABLE):
+    ''' Finds the next hit of a full text search's _hitPattern in an entry's
+        text body, reading a plain body a chunk at a time from the position
+        args:
+            entryID (int): the entry ID
+            pattern (re.Pattern): the expression the hits are found by
+            start (int): the position to search from, from 0
+            table (str): the table to read
+        returns:
+            tuple of (int, int): the position and length of the hit, or None
+    '''
+    flag = _compressionFlag(table)
+    position = start
+    while True:
+        # each chunk starts a character early, so \b sees what is before it,
+        # and runs on past its end, for a hit that starts in it to end there
+        first = max(0, position - 1)
+        length = position - first + const.TEXTCHUNKLENGTH + const.HITOVERLAP
+        query = _prepared("SELECT CASE WHEN {0} = 0 THEN substr({1}, ?, ?) ELSE {1} END, {0} FROM {2} WHERE {3} = ?".format(
+            flag, const.TEXT, table, const.ID))
+        _bind(query, first + 1, length, entryID)
+        if not query.exec() or not query.next():
+            query.finish()
+            return None
+        text, textFlag = query.value(0) or '', query.value(1)
+        query.finish()
+        if textFlag:
+            return _firstHit(_decompressBody(text, textFlag), [], start=start, pattern=pattern)
+        hit = _firstHit(text, [], start=position - first, pattern=pattern)
+        if hit and (hit[0] < position - first + const.TEXTCHUNKLENGTH or len(text) < length):
+            return first + hit[0], hit[1]
+        if len(text) < length:
+            return None
+        position += const.TEXTCHUNKLENGTH
+
+def findTextHits(text, filter, limit=const.SCANSPANS):
+    ''' Finds the hits of a filter's body text in a text body already read,
+        as findHit does in the database
+        args:
+            text (str): the text body
+            filter (Filter): the search the entry was found by
+            limit (int): the most hits to find
+        returns:
+            list of tuple of (int, int): the position and length of each hit, in order
+    '''
+    terms, caseSensitive = _hitTerms(filter)
+    pattern = _hitPattern(filter)
+    if not (terms or pattern) or not text:
+        return []
+    if not caseSensitive and not pattern:
+        text = _foldCase(text)
+    hits = []
+    hit = _firstHit(text, terms, True, pattern=pattern)
+    while hit and len(hits) < limit:
+        hits.append(hit)
+        hit = _firstHit(text, terms, True, hit[0] + hit[1], pattern)
+    return hits
 
 def getTextBodyFromTitle(title):
     ''' Searches the database for a given title and returns the matching text
@@ -103,10 +1887,14 @@ def getTextBodyFromTitle(title):
         returns:
             str: the body text and title
     '''
-    query = QSqlQuery(f"SELECT {const.TITLE}, {const.TEXT} FROM {const.TABLE} WHERE {const.TITLE} = '{title}'")
-    if query.next():
+    query = _prepared(f"SELECT {const.TITLE}, {const.TEXT}, {_compressionFlag()} FROM {const.TABLE} "
+                      f"WHERE ifnull({const.TITLE}, '') = ? AND {const.TITLE} = ?")
+    # the first condition is the sort key index's, the second the older title index's
+    _bind(query, title, title)
+    text_body = None
+    if query.exec() and query.next():
         title = query.value(0)
-        text_body = query.value(1)
+        text_body = _decompressBody(query.value(1), query.value(2))
     query.finish()
     return f"Title: {title}\n\n{text_body}"
 
@@ -117,37 +1905,508 @@ def getHeaderNames(table=const.TABLE):
         returns:
             list of str: the table headings
     '''
-    headers = []
-    query = QSqlQuery()
-    query.exec("SELECT * FROM {}".format(table))
+    # the compression flag is only for reading bodies
+    return [name for name in _columnNames(table) if name != const.COMPRESSION]
 
-    # Get the number of columns in the query result
-    if query.next():
-        record = query.record()
-        num_columns = record.count()
+def tagColumn(category):
+    ''' returns the name getRowBlock reads a category's tags by, as one
+        comma separated string for each entry '''
+    return category + const.MAPSUFFIX
+
+def columnTitle(column):
+    ''' returns the heading to show for a column getRowBlock can read '''
+    if column == const.PREVIEW:
+        return 'Text'
+    if column == const.TAGCOUNT:
+        return 'Tags'
+    if column.endswith(const.MAPSUFFIX):
+        return column[:-len(const.MAPSUFFIX)]
+    return column
 
-        # Get each name
-        for i in range(num_columns):
-            column_name = record.fieldName(i)
-            headers.append(column_name)
+def _columnExpression(column, table=const.TABLE, filter=''):
+    ''' Makes the SQL reading a column for getRowBlock: a table column as it
+        is, a line of the text body for const.PREVIEW, or an entry's tags for
+        a tagColumn. The preview is the text around the first hit of a
+        filter's body text, made by the full text index's snippet function
+        if it has the text, or found with instr, and otherwise the start of
+        the body. Compressed bodies are read whole for the preview, and cut
+        short once decompressed, as are the first const.TEXTCHUNKLENGTH
+        characters of plain bodies for a full text search without snippets
+        args:
+            column (str): the column
+            table (str): the entry table
+            filter (Filter/str): the search filter the rows are read for
+        returns:
+            tuple of (str, list): the expression, and the values for its placeholders
+    '''
+    if column == const.PREVIEW:
+        flag = _compressionFlag(table)
+        body = f"{table}.{const.TEXT}"
+        terms, caseSensitive = _hitTerms(filter)
+        if _hitPattern(filter) and hasFullTextSearch() and not hasContentlessIndex():
+            return (f"replace(coalesce((SELECT snippet({const.FTSTABLE}, 1, '', '', '…', {const.SNIPPETTOKENS}) "
+                    f"FROM {const.FTSTABLE} WHERE {const.FTSTABLE} MATCH ? AND rowid = {table}.{const.ID}), "
+                    f"substr({body}, 1, {const.PREVIEWLENGTH})), char(10), ' ')",
+                    [makeMatchQuery(filter.bodyText, const.TEXT)])
+        if _previewPattern(filter):
+            return (f"CASE WHEN {flag} = 0 THEN substr({body}, 1, {const.TEXTCHUNKLENGTH}) "
+                    f"ELSE {body} END", [])
+        start, values = '1', []
+        if terms:
+            hit = f"instr({body}, ?)" if caseSensitive else f"instr(lower({body}), ?)"
+            start, values = f"max(1, {hit} - {const.SNIPPETCONTEXT})", [terms[0]]
+        return (f"CASE WHEN {flag} = 0 THEN "
+                f"replace(substr({body}, {start}, {const.PREVIEWLENGTH}), char(10), ' ') "
+                f"ELSE {body} END", values)
+    if column.endswith(const.MAPSUFFIX):
+        tagIndex = column[:-len(const.MAPSUFFIX)] + const.INDEXSUFFIX
+        return (f"(SELECT group_concat({tagIndex}.{const.TAGNAME}, ', ') FROM {column}"
+                f" JOIN {tagIndex} ON {tagIndex}.{const.TAGID} = {column}.{const.TAGID}"
+                f" WHERE {column}.{const.DOCID} = {table}.{const.ID})", [])
+    return column, []
 
-    return headers
+def _hitTerms(filter):
+    ''' Finds the text a filter's hits in the text bodies are found by with
+        instr: the whole body text of a LIKE or exact search. A full text
+        search's hits start where words do, which instr cannot tell, so they
+        are found by _hitPattern, and a regular expression has none, as SQL
+        cannot find it
+        args:
+            filter (Filter/str): the filter
+        returns:
+            tuple of (list of str, bool): the terms, with the case of ASCII
+                letters folded unless the search is case sensitive, and whether it is
+    '''
+    if not isinstance(filter, Filter) or not filter.bodyText or filter.fullText or filter.scan == 'regex':
+        return [], False
+    if filter.scan == 'exact':
+        return [filter.bodyText], True
+    return [_foldCase(filter.bodyText)], False
+
+def _hitPattern(filter):
+    ''' Makes the regular expression a full text search's hits are found by,
+        matching as the full text index does: a word at the start of a word,
+        and a phrase as whole words in order, whatever is between them, in any case
+        args:
+            filter (Filter/str): the filter
+        returns:
+            re.Pattern: the expression, or None if the filter is not a full text search
+    '''
+    if not isinstance(filter, Filter) or not filter.fullText or not filter.bodyText:
+        return None
+    alternatives = []
+    for phrase, word in re.findall(r'"([^"]*)"?|(\S+)', filter.bodyText):
+        words = re.findall(r'\w+', phrase or word)
+        if words:
+            alternatives.append(r'\b' + r'\W+'.join(map(re.escape, words)) + (r'\b' if phrase.strip() else ''))
+    return re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+
+def _previewPattern(filter):
+    ''' returns the _hitPattern a full text search's preview is cut by once
+        read, or None if SQL makes it: with the snippet function of a full
+        text index that has the text, or with instr '''
+    if hasFullTextSearch() and not hasContentlessIndex():
+        return None
+    return _hitPattern(filter)
+
+def _firstHit(text, terms, caseSensitive=False, start=0, pattern=None):
+    ''' Finds the first of several terms in a text, as findHit does in SQL,
+        or the first match of a _hitPattern
+        returns:
+            tuple of (int, int): the position and length of the hit, or None
+    '''
+    if pattern:
+        match = pattern.search(text or '', start)
+        return (match.start(), match.end() - match.start()) if match else None
+    if not caseSensitive:
+        text = _foldCase(text)
+    hits = [(text.find(term, start), len(term)) for term in terms]
+    hits = [hit for hit in hits if hit[0] >= 0]
+    return min(hits) if hits else None
+
+def displayValue(column, value):
+    ''' Turns a value getRowBlock read into the one to show. Times are kept
+        as numbers so they are cheap to read and sort by, and only the values
+        shown are formatted
+        args:
+            column (str): the column the value was read from
+            value: the value
+        returns:
+            the value to show: the local date and time for const.ADDED, empty
+                for entries added before the time was recorded
+    '''
+    if column == const.ADDED:
+        return time.strftime('%Y-%m-%d %H:%M', time.localtime(value)) if value else ''
+    return value
+
+def _preview(text, terms=(), caseSensitive=False, pattern=None):
+    ''' returns the line of a text body const.PREVIEW reads: the start of the
+        body, or the text around the first of some terms, or of a _hitPattern,
+        found in it '''
+    if not text:
+        return text
+    hit = _firstHit(text, terms[:1], caseSensitive, pattern=pattern) if terms or pattern else None
+    start = max(0, hit[0] - const.SNIPPETCONTEXT) if hit else 0
+    return text[start:start + const.PREVIEWLENGTH].replace('\n', ' ')
+
+def getGeneration():
+    ''' Reads the open database's result generation, which every write of
+        entries or tags increases, from any connection or process, so that
+        results cached at an earlier generation are known to be stale
+        returns:
+            int: the generation, or None if the database has none, whose
+                results are not cached
+    '''
+    if not _hasResultGeneration():
+        return None
+    query = _prepared(f"SELECT Generation FROM {const.GENERATIONTABLE}")
+    generation = None
+    if query.exec() and query.next():
+        generation = query.value(0)
+    query.finish()
+    return generation
+
+def _hasResultGeneration():
+    ''' returns whether the open database has a result generation '''
+    key = _databaseKey()
+    if key not in _resultGenerations:
+        _resultGenerations[key] = checkTableExists(const.GENERATIONTABLE)
+    return _resultGenerations[key]
+
+def _bumpGeneration():
+    ''' Increases the result generation after entries or tags are written,
+        which makes every cached result stale. Done in the writer's
+        transaction, if it has one
+        returns:
+            bool: whether the generation was increased, or there is none
+    '''
+    if not _hasResultGeneration():
+        return True
+    query = _prepared(f"UPDATE {const.GENERATIONTABLE} SET Generation = Generation + 1")
+    if not query.exec():
+        print("Error updating result generation:", query.lastError().text())
+        return False
+    return True
+
+def _resultKey(table, filter, rankQuery=None, sort=None, ordered=False):
+    ''' Makes the key a search's results are cached under: its entry count,
+        or its IDs in the order they are read
+        args:
+            table (str): the table searched
+            filter (Filter/str): the search filter
+            rankQuery (str): full text query the IDs are ordered by
+            sort (tuple of (str, bool)): sort column the IDs are ordered by
+            ordered (bool): whether the key is for the IDs rather than the count
+        returns:
+            str: the key, or None for a filter string or a scan, whose results
+                are not cached
+    '''
+    if isinstance(filter, Filter) and filter.needsScan():
+        return None
+    if isinstance(filter, Filter):
+        filterKey = '' if filter.isEmpty() else filter.cacheKey()
+    elif not filter:
+        filterKey = ''
+    else:
+        return None
+    parts = [table, filterKey]
+    if ordered:
+        parts += [None if sort else rankQuery, list(sort) if sort else None]
+    return json.dumps(parts)
+
+def _cachedResult(key, generation):
+    ''' Looks up a result cached at the current generation, reading it from
+        the database's result table if results are kept between sessions
+        args:
+            key (str): the result key, from _resultKey
+            generation (int): the database's result generation
+        returns:
+            int/tuple: the entry count, or the (IDs, keys) of an ordered
+                result, None if not cached
+    '''
+    if key is None or generation is None or not Utils.Config().RESULT_CACHE:
+        return None
+    resultKey = (_databaseKey(), key)
+    with _resultLock:
+        cached = _results.get(resultKey)
+        if cached is not None and cached[0] != generation:
+            del _results[resultKey]
+            cached = None
+        if cached is not None:
+            _results.move_to_end(resultKey)
+    result = cached[1] if cached is not None else _loadResult(key, generation)
+    Instrumentation.countCacheLookup('result', result is not None)
+    if cached is None and result is not None:
+        _storeResult(key, generation, result)
+    return result
+
+def _storeResult(key, generation, result):
+    ''' Caches a result at a generation, dropping the least recently used '''
+    if key is None or generation is None or not Utils.Config().RESULT_CACHE:
+        return
+    resultKey = (_databaseKey(), key)
+    with _resultLock:
+        _results[resultKey] = (generation, result)
+        _results.move_to_end(resultKey)
+        while len(_results) > const.RESULTCACHESIZE:
+            _results.popitem(last=False)
+
+def _loadResult(key, generation):
+    ''' returns a result kept in the database's result table at a generation,
+        as _cachedResult, or None if results are not kept there '''
+    if not Utils.Config().PERSIST_RESULTS:
+        return None
+    query = _prepared(f"SELECT EntryCount, IDs, Keys FROM {const.RESULTTABLE} WHERE Query = ? AND Generation = ?")
+    _bind(query, key, generation)
+    result = None
+    if query.exec() and query.next():
+        if query.isNull(1):
+            result = query.value(0)
+        else:
+            ids = array('q', bytes(query.value(1)))
+            result = ids, None if query.isNull(2) else json.loads(query.value(2))
+    query.finish()
+    return result
+
+def saveResultCache():
+    ''' Keeps the results cached for the open database at its current
+        generation in its result table, to be read in later sessions, and
+        drops those kept there at earlier generations
+        returns:
+            int: the number of results kept, or None if they could not be
+    '''
+    generation = getGeneration()
+    if generation is None:
+        return None
+    databaseKey = _databaseKey()
+    with _resultLock:
+        results = [(key, result) for (resultDatabase, key), (resultGeneration, result) in _results.items()
+                   if resultDatabase == databaseKey and resultGeneration == generation]
+    database = _database()
+    database.transaction()
+    query = _prepared(f"DELETE FROM {const.RESULTTABLE} WHERE Generation != ?")
+    _bind(query, generation)
+    succeeded = query.exec()
+    for key, result in results if succeeded else ():
+        query = _prepared(f"INSERT OR REPLACE INTO {const.RESULTTABLE} "
+                          "(Query, Generation, EntryCount, IDs, Keys) VALUES (?, ?, ?, ?, ?)")
+        if isinstance(result, tuple):
+            ids, keys = result
+            _bind(query, key, generation, len(ids), QByteArray(ids.tobytes()),
+                  None if keys is None else json.dumps(keys))
+        else:
+            _bind(query, key, generation, result, None, None)
+        succeeded = query.exec()
+        if not succeeded:
+            break
+    if not succeeded:
+        print("Error saving result cache:", query.lastError().text())
+        database.rollback()
+        return None
+    if not database.commit():
+        return None
+    return len(results)
+
+def _orderedResult(table, filter, rankQuery=None, sort=None):
+    ''' Finds the IDs a search reads, in order, through the result cache. They
+        are found by one query the first time a search whose count is cached
+        is read, if it has no more than const.RESULTCACHEROWS entries, after
+        which any block of it is looked up by ID without the search running
+        again
+        args:
+            table (str): the table to search
+            filter (Filter/str): the search filter
+            rankQuery (str): full text query to order the rows by relevance
+            sort (tuple of (str, bool)): the sort column and whether descending
+        returns:
+            tuple of (array of int, list): the IDs, and the rank or sort key of
+                each if ordered by either, else None. None if not cached
+    '''
+    if not isinstance(filter, Filter) or filter.isEmpty() or not Utils.Config().RESULT_CACHE:
+        return None
+    generation = getGeneration()
+    key = _resultKey(table, filter, rankQuery, sort, ordered=True)
+    result = _cachedResult(key, generation)
+    if result is not None:
+        return result
+    count = _cachedResult(_resultKey(table, filter), generation)
+    if count is None or count > const.RESULTCACHEROWS:
+        return None
+
+    source, keyColumns, descending = _orderedSource(table, rankQuery, sort)
+    where, values = _whereClause(filter, table=table)
+    query = _prepared("SELECT {} FROM {}{} ORDER BY {} LIMIT ?".format(
+        ', '.join(reversed(keyColumns)), source, where, _orderBy(keyColumns, descending)))
+    if rankQuery and not sort:
+        _bind(query, rankQuery)
+    _bind(query, *values, const.RESULTCACHEROWS + 1)
+    ids = array('q')
+    keys = [] if len(keyColumns) > 1 else None
+    if not query.exec():
+        print("Error executing query:", query.lastError().text())
+        query.finish()
+        return None
+    while query.next():
+        ids.append(query.value(0))
+        if keys is not None:
+            keys.append(query.value(1))
+    query.finish()
+    if len(ids) > const.RESULTCACHEROWS:
+        return None
+    result = ids, keys
+    _storeResult(key, generation, result)
+    return result
+
+def _cachedRowBlock(columns, after, limit, table, filter, rankQuery, sort):
+    ''' Reads a block of rows, as getRowBlock, by the cached IDs of the search
+        returns:
+            list of tuple: the row values, or None if the search's IDs are not cached
+    '''
+    result = _orderedResult(table, filter, rankQuery, sort)
+    if result is None:
+        return None
+    ids, keys = result
+    start = 0
+    if after is not None:
+        try:
+            start = ids.index(after[1] if isinstance(after, tuple) else after) + 1
+        except ValueError:
+            return None
+    blockIDs = list(ids[start:start + limit])
+    rows = getRowsByID(columns, blockIDs, table, filter)
+    if len(rows) != len(blockIDs):
+        return None
+    if keys is None:
+        return rows
+    return [row + (key,) for row, key in zip(rows, keys[start:start + limit])]
+
+def getRowsByID(columns, ids, table=const.TABLE, filter=''):
+    ''' Reads the rows of the given entries, as getRowBlock does
+        args:
+            columns (list of str): the columns to return for each row, as
+                getRowBlock takes them
+            ids (list of int): the entry IDs
+            table (str): the table to read
+            filter (Filter/str): the search the entries were found by, which
+                the preview shows the first hit of
+        returns:
+            list of tuple: the row values, in the order of the IDs, leaving out
+                any entry that is not found
+    '''
+    ids = list(ids)
+    if not ids:
+        return []
+    idColumn = f"{table}.{const.ID}"
+    selected, selectedValues, bodyColumns = _selectedColumns(columns, table, [idColumn], filter)
+    query = _prepared("SELECT {} FROM {} WHERE {} IN ({})".format(
+        ', '.join(selected), table, idColumn, ', '.join('?' * len(ids))))
+    _bind(query, *selectedValues, *ids)
+    rows = {}
+    for row in _readRows(query, columns, len(selected), bodyColumns, filter):
+        rows[row[-1]] = row[:-1]
+    return [rows[entryID] for entryID in ids if entryID in rows]
 
 def getEntryCount(table=const.TABLE, filter=''):
     ''' Finds the number of entries, allowing for filtering
         args:
             table (str): the table to search
-            filter (str): additions to the query specifying seach str or filters
+            filter (Filter/str): the search filter, or additions to the query
+                specifying seach str or filters
         returns:
             int: the number of rows found
     '''
-    query = QSqlQuery()
-    query.exec("SELECT COUNT(*) FROM  {}{}".format(table, filter))
-
-    if(query.first()):
-        rows = query.value(0);
+    # the generation is read first, so a write while counting leaves the count stale
+    key = _resultKey(table, filter)
+    generation = getGeneration() if key is not None and Utils.Config().RESULT_CACHE else None
+    rows = _cachedResult(key, generation)
+    if rows is not None:
         return rows
-    return -1
+    where, values = _whereClause(filter, table=table)
+    query = _prepared("SELECT COUNT(*) FROM {}{}".format(table, where))
+    _bind(query, *values)
+
+    rows = -1
+    if query.exec() and query.first():
+        rows = query.value(0)
+        _storeResult(key, generation, rows)
+    query.finish()
+    return rows
+
+def countMatchingIDs(ids, table=const.TABLE, filter=''):
+    ''' Counts how many of the given entry IDs match a filter, so cached counts
+        can be updated after an insert without counting the whole table again
+        args:
+            ids (list of int): the entry IDs to check
+            table (str): the table to search
+            filter (Filter/str): the search filter, or additions to the query
+                specifying seach str or filters
+        returns:
+            int: the number of the given IDs that match the filter
+    '''
+    ids = list(ids)
+    if not ids:
+        return 0
+    placeholders = ', '.join('?' * len(ids))
+    where, values = _whereClause(filter, f"{const.ID} IN ({placeholders})", table=table)
+    query = _prepared("SELECT COUNT(*) FROM {}{}".format(table, where))
+    _bind(query, *values, *ids)
+    count = 0
+    if query.exec() and query.first():
+        count = query.value(0)
+    query.finish()
+    return count
+
+def getMatchingIDs(ids, table=const.TABLE, filter='', rankQuery=None):
+    ''' Finds which of the given entries match a filter, looking each up by
+        its ID, so that a search that narrows the last one is checked against
+        the entries it found rather than the whole table
+        args:
+            ids (list of int): the entry IDs to check
+            table (str): the table to search
+            filter (Filter/str): the search filter
+            rankQuery (str): full text query to rank the matching entries by
+        returns:
+            dict of {int: float}: the matching IDs, each with its rank if a rank
+                query is given, or None
+    '''
+    ids = list(ids)
+    if not ids:
+        return {}
+    source = _orderedSource(table, rankQuery)[0]
+    placeholders = ', '.join('?' * len(ids))
+    where, values = _whereClause(filter, f"{table}.{const.ID} IN ({placeholders})", table=table)
+    query = _prepared("SELECT {}.{}{} FROM {}{}".format(
+        table, const.ID, ', Rank' if rankQuery else '', source, where))
+    if rankQuery:
+        _bind(query, rankQuery)
+    _bind(query, *values, *ids)
+    matches = {}
+    if query.exec():
+        while query.next():
+            matches[query.value(0)] = query.value(1) if rankQuery else None
+    else:
+        print("Error executing query:", query.lastError().text())
+    query.finish()
+    return matches
+
+def getIDRange(table=const.TABLE, filter=''):
+    ''' Finds the lowest and highest IDs, which are read from the primary key
+        index without scanning the table
+        args:
+            table (str): the table to search
+            filter (Filter/str): the search filter, or additions to the query
+                specifying seach str or filters
+        returns:
+            tuple of (int, int): the lowest and highest ID, or (None, None) if empty
+    '''
+    where, values = _whereClause(filter, table=table)
+    query = _prepared("SELECT MIN({0}), MAX({0}) FROM {1}{2}".format(const.ID, table, where))
+    _bind(query, *values)
+    idRange = None, None
+    if query.exec() and query.first() and not query.isNull(0):
+        idRange = query.value(0), query.value(1)
+    query.finish()
+    return idRange
 
 def getDataFromRow(column, row, table=const.TABLE, filter=''):
     ''' Finds the data held in the database's specified row and column
@@ -155,15 +2414,269 @@ def getDataFromRow(column, row, table=const.TABLE, filter=''):
             column (int): the table column
             row (int): the table row
             table (str): the table to search
-            filter (str): additions to the query specifying seach str or filters
+            filter (Filter/str): the search filter, or additions to the query
+                specifying seach str or filters
         returns:
             int/str: the data found
     '''
-    query = QSqlQuery()
-    queryString = 'SELECT {} FROM {} {}'.format(column, table, filter)
-    query.exec(queryString)
-    query.seek(row)
-    return query.value(0)
+    where, values = _whereClause(filter, table=table)
+    query = _prepared('SELECT {}, {} FROM {}{} ORDER BY {} LIMIT 1 OFFSET ?'.format(
+        column, _compressionFlag(table), table, where, const.ID))
+    _bind(query, *values, row)
+    value = None
+    if query.exec() and query.next():
+        value = query.value(0)
+        if column == const.TEXT:
+            value = _decompressBody(value, query.value(1))
+    query.finish()
+    return value
+
+def getRowBlock(columns, after=None, limit=const.BLOCKSIZE, table=const.TABLE, filter='',
+                rankQuery=None, sort=None):
+    ''' Fetches a block of whole rows in key order, starting after a given key.
+        Paging by the last seen key keeps each block an index range scan
+        rather than an OFFSET walk from the start of the table, however deep
+        the block is. Rows are ordered by ID, by full text relevance and then
+        ID if a rank query is given, or by a sort column and then ID. Ordered
+        by relevance or a column other than the ID, each row ends with its
+        rank or sort key
+        args:
+            columns (list of str): the columns to return for each row: table
+                columns, const.PREVIEW for the start of the text body, or a
+                tagColumn for an entry's tags
+            after (int/tuple): the key the block starts after, None for the first
+                block. An ID, or a (rank or sort key, ID) tuple
+            limit (int): the maximum number of rows to return
+            table (str): the table to search
+            filter (Filter/str): the search filter, or additions to the query
+                specifying seach str or filters
+            rankQuery (str): full text query to order the rows by relevance
+            sort (tuple of (str, bool)): a column of const.SORTCOLUMNS to order
+                the rows by instead, and whether in descending order
+        returns:
+            list of tuple: the row values, in the order of the given columns
+    '''
+    rows = _cachedRowBlock(columns, after, limit, table, filter, rankQuery, sort)
+    if rows is not None:
+        return rows
+    source, keyColumns, descending = _orderedSource(table, rankQuery, sort)
+    conditions = []
+    if after is not None:
+        conditions.append(_keysetCondition(keyColumns, descending))
+    selected, selectedValues, bodyColumns = _selectedColumns(columns, table, keyColumns[:-1], filter)
+    where, values = _whereClause(filter, *conditions, table=table)
+    query = _prepared("SELECT {} FROM {}{} ORDER BY {} LIMIT ?".format(
+        ', '.join(selected), source, where, _orderBy(keyColumns, descending)))
+    _bind(query, *selectedValues)
+    if rankQuery and not sort:
+        _bind(query, rankQuery)
+    _bind(query, *values)
+    if after is not None:
+        _bind(query, *_keysetValues(after))
+    _bind(query, limit)
+    return _readRows(query, columns, len(selected), bodyColumns, filter)
+
+def _selectedColumns(columns, table, extra=(), filter=''):
+    ''' Makes the select list for rows of the given columns
+        args:
+            columns (list of str): the columns, as getRowBlock takes them
+            table (str): the table read
+            extra (list of str): further expressions selected after them
+            filter (Filter/str): the search the rows are read for
+        returns:
+            tuple of (list of str, list, list of int): the select list, the
+                values for its placeholders, which come before any other,
+                and the positions of the text body columns, for which the
+                compression flag is selected last
+    '''
+    selected = []
+    values = []
+    for column in columns:
+        expression, expressionValues = _columnExpression(column, table, filter)
+        selected.append(expression)
+        values.extend(expressionValues)
+    selected += list(extra)
+    # compressed bodies are decompressed as they are read, by the flag selected after them
+    bodyColumns = []
+    if hasCompression() or _previewPattern(filter):
+        bodyColumns = [i for i, column in enumerate(columns) if column in (const.TEXT, const.PREVIEW)]
+    if bodyColumns:
+        selected.append(_compressionFlag(table))
+    return selected, values, bodyColumns
+
+def _readRows(query, columns, selectedCount, bodyColumns, filter=''):
+    ''' Runs a bound query on the columns from _selectedColumns and reads its
+        rows, decompressing the text bodies
+        returns:
+            list of tuple: the rows, without the compression flag
+    '''
+    terms, caseSensitive = _hitTerms(filter) if bodyColumns else ([], False)
+    pattern = _previewPattern(filter) if bodyColumns else None
+    if not query.exec():
+        print("Error executing query:", query.lastError().text())
+        query.finish()
+        return []
+    rows = []
+    while query.next():
+        row = [query.value(i) for i in range(selectedCount)]
+        if bodyColumns:
+            flag = row.pop()
+            for i in bodyColumns:
+                if flag:
+                    row[i] = _decompressBody(row[i], flag)
+                # a plain body's preview is made in SQL, unless it is a full text search's
+                if columns[i] == const.PREVIEW and (flag or pattern):
+                    row[i] = _preview(row[i], terms, caseSensitive, pattern)
+        rows.append(tuple(row))
+    query.finish()
+    return rows
+
+def getKeyAtOffset(offset, table=const.TABLE, filter='', rankQuery=None, sort=None):
+    ''' Finds the paging key of the entry at a given position, used to find
+        the starting point of a block that has not been reached by paging
+        args:
+            offset (int): the row position
+            table (str): the table to search
+            filter (Filter/str): the search filter, or additions to the query
+                specifying seach str or filters
+            rankQuery (str): full text query to order the rows by relevance
+            sort (tuple of (str, bool)): the sort column and whether descending,
+                as getRowBlock takes it
+        returns:
+            int/tuple: the ID found, or a (rank or sort key, ID) tuple if ordered
+                by either. None if there are not enough rows
+    '''
+    result = _orderedResult(table, filter, rankQuery, sort)
+    if result is not None:
+        ids, keys = result
+        if offset >= len(ids):
+            return None
+        return ids[offset] if keys is None else (keys[offset], ids[offset])
+    source, keyColumns, descending = _orderedSource(table, rankQuery, sort)
+    where, values = _whereClause(filter, table=table)
+    orderBy = _orderBy(keyColumns, descending)
+    query = _prepared("SELECT {} FROM {}{} ORDER BY {} LIMIT 1 OFFSET ?".format(
+        ', '.join(keyColumns), source, where, orderBy))
+    if rankQuery and not sort:
+        _bind(query, rankQuery)
+    _bind(query, *values, offset)
+    key = None
+    if query.exec() and query.next():
+        key = query.value(0) if len(keyColumns) == 1 else (query.value(0), query.value(1))
+    query.finish()
+    return key
+
+def isSortable(column):
+    ''' returns whether getRowBlock can sort by a column in the open database,
+        which has an index for each sort column '''
+    return column in const.SORTCOLUMNS and (column in (const.ID, const.TITLE)
+                                            or _hasEntryColumn(column))
+
+def _orderedSource(table, rankQuery=None, sort=None):
+    ''' Makes the FROM clause and the ordering columns for paging through a
+        table, joining the full text relevance if a rank query is given and
+        there is no sort column
+        args:
+            table (str): the table to read
+            rankQuery (str): full text query to order the rows by relevance, bound
+                as the first parameter
+            sort (tuple of (str, bool)): the sort column and whether descending
+        returns:
+            tuple of (str, list of str, bool): the FROM clause, the key
+                columns, and whether they are in descending order
+    '''
+    idColumn = f"{table}.{const.ID}"
+    if sort:
+        column, descending = sort
+        if column == const.ID:
+            return table, [idColumn], bool(descending)
+        if column == const.TITLE:
+            # the expression the title index is made on, which is never NULL
+            return table, [f"ifnull({table}.{const.TITLE}, '')", idColumn], bool(descending)
+        return table, [f"{table}.{column}", idColumn], bool(descending)
+    if not rankQuery:
+        return table, [idColumn], False
+    # title matches weigh more than matches in the body
+    source = (f"{table} JOIN (SELECT rowid AS RankID, bm25({const.FTSTABLE}, 10.0, 1.0) AS Rank"
+              f" FROM {const.FTSTABLE} WHERE {const.FTSTABLE} MATCH ?) ON RankID = {idColumn}")
+    return source, ['Rank', idColumn], False
+
+def _orderBy(keyColumns, descending=False):
+    ''' returns the ORDER BY list for the key columns '''
+    return ', '.join(f"{column} DESC" if descending else column for column in keyColumns)
+
+def _keysetCondition(keyColumns, descending=False):
+    ''' Makes the condition for rows after a key, in which ties on the first
+        column are broken by the ID. It is spelt out rather than comparing row
+        values, as SQLite cannot seek an index on an expression by a row value
+        args:
+            keyColumns (list of str): the ordering columns
+            descending (bool): whether they are in descending order
+        returns:
+            str: the condition, with placeholders for _keysetValues
+    '''
+    after = '<' if descending else '>'
+    if len(keyColumns) == 1:
+        return f"{keyColumns[0]} {after} ?"
+    key, idColumn = keyColumns
+    return f"{key} {after}= ? AND ({key} {after} ? OR {idColumn} {after} ?)"
+
+def _keysetValues(after):
+    ''' returns the values to bind to _keysetCondition for a key '''
+    if isinstance(after, tuple):
+        return after[0], after[0], after[1]
+    return (after,)
+
+def _whereClause(filter='', *conditions, table=const.TABLE):
+    ''' Combines a filter with extra conditions into one WHERE clause
+        args:
+            filter (Filter/str): the filter, or a filter string that is either
+                empty or starts with WHERE
+            conditions (str): further conditions that must all hold
+            table (str): the table being filtered
+        returns:
+            tuple of (str, list): the combined clause, with a leading space, or
+                an empty string, and the filter's values for its placeholders,
+                which come before any the further conditions have
+    '''
+    clauses = []
+    values = []
+    if isinstance(filter, Filter):
+        filter, values = filter.compile(table)
+    filter = (filter or '').strip()
+    if filter.upper().startswith('WHERE'):
+        filter = filter[len('WHERE'):].strip()
+    if filter:
+        clauses.append(f"({filter})")
+    clauses.extend(conditions)
+    if not clauses:
+        return '', values
+    return ' WHERE ' + ' AND '.join(clauses), values
+
+def getScanChunks(filter, chunkSize=const.SCANCHUNKSIZE, table=const.TABLE):
+    ''' Splits the entries a filter's scan reads into runs of IDs, for
+        ParallelSearch to scan on other connections. Each chunk's query reads
+        the ID, title, stored text body and compression flag of the entries
+        in its run that meet the rest of the filter
+        args:
+            filter (Filter): the filter
+            chunkSize (int): the number of IDs in each chunk
+            table (str): the table to scan
+        returns:
+            list of tuple of (str, str, list, int): the database file, query,
+                query values and the number to add to each ID read, for each
+                chunk in ID order
+    '''
+    firstID, lastID = getIDRange(table, filter)
+    if firstID is None:
+        return []
+    idColumn = f"{table}.{const.ID}"
+    where, values = _whereClause(filter, f"{idColumn} BETWEEN ? AND ?", table=table)
+    sql = "SELECT {}, {}.{}, {}.{}, {} FROM {}{}".format(
+        idColumn, table, const.TITLE, table, const.TEXT, _compressionFlag(table), table, where)
+    databaseFile = _databaseKey()
+    return [(databaseFile, sql, values + [start, min(start + chunkSize - 1, lastID)], 0)
+            for start in range(firstID, lastID + 1, chunkSize)]
 
 def checkTableExists(table=const.TABLE):
     ''' Checks if a table exists
@@ -172,8 +2685,11 @@ def checkTableExists(table=const.TABLE):
         returns:
             bool: whether the table exists
     '''
-    query = QSqlQuery("IF EXISTS(SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = '{}')".format(table))
-    return query == "found"
+    query = _prepared("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?")
+    _bind(query, table)
+    exists = query.exec() and query.next()
+    query.finish()
+    return exists
 
 def checkDatabase(database=None):
     ''' Checks if a database exists/ can be opened
@@ -186,7 +2702,8 @@ def checkDatabase(database=None):
         config = Utils.Config()
         database = config.DATABASE
 
-    if not database.open():
-        ErrorMessage("Error: Could not open database.")
+    # opening again would reconnect without the connection profile
+    if not database.isOpen() and not database.open():
+        Utils.ErrorMessage("Error: Could not open database.")
         return False
     return True
@@ -1,8 +1,14 @@
-from PyQt5 import QtWidgets, QtCore
+import time
+from PyQt5 import QtWidgets, QtCore, QtGui
 
 import Utils
 import TableModel
 import DatabaseInterface
+import Federation
+import Instrumentation
+import ParallelSearch
+import QueryWorker
+import const
 
 
 class TagWidget(QtWidgets.QWidget):
@@ -33,6 +39,13 @@ class TagWidget(QtWidgets.QWidget):
         self.mainLayout.setContentsMargins(0,0,0,0)
         self.setLayout(self.mainLayout)
 
+    def setCount(self, count):
+        ''' Shows the number of entries with the tag next to it
+            args:
+                count (int): the number of entries, or None to show no count
+        '''
+        self.label.setText(self.text if count is None else f"{self.text} ({count})")
+
 class TextInput(QtWidgets.QWidget):
     ''' Widget for a line edit, and name label '''
     def __init__(self, name):
@@ -49,6 +62,7 @@ class TextInput(QtWidgets.QWidget):
         self.setLayout(layout)
 
         self.editingFinished = self.textField.editingFinished
+        self.textChanged = self.textField.textChanged
 
     def text(self):
         return self.textField.text()
@@ -58,10 +72,25 @@ class TextInput(QtWidgets.QWidget):
 
 
 class TagCategoryWidget(QtWidgets.QWidget):
-    ''' widget to allow tag input '''
+    ''' widget to allow tag input. Given tag counts, each tag is shown with
+        the number of entries that have it, and the completions are ordered
+        by them. Given a worker, the tags are read from the database on it,
+        and the completions are only made once the input is first focused '''
     # TODO: add the option to read tags and categories directly from the database
     tagsEdited = QtCore.pyqtSignal()
-    def __init__(self, categoryName=None, labelName=None, potentialTags=[]):
+    # emitted once the potential tags have been read
+    tagsFound = QtCore.pyqtSignal()
+    # completer model roles for the tag a completion enters, and its count
+    TagRole = QtCore.Qt.UserRole + 1
+    CountRole = QtCore.Qt.UserRole + 2
+    def __init__(self, categoryName=None, labelName=None, potentialTags=[], worker=None):
+        '''
+        categoryName (str): the category the tags are entered in, None for every category
+        labelName (str): the label shown, defaults to the category name
+        potentialTags (list of str): tags to complete until the tags are read
+        worker (QueryWorker.QueryWorker): worker to read the tags on, None to
+            read them straight away
+        '''
         super(TagCategoryWidget, self).__init__()
 
         # get filepath
@@ -73,11 +102,16 @@ class TagCategoryWidget(QtWidgets.QWidget):
 
         self.name = categoryName
         self.labelName = labelName or categoryName
-        self.potentialTags = potentialTags
+        self.potentialTags = list(potentialTags)
         self.appliedTags = []
         self.tagWidgets = []
-        self.findTags()
+        # tag: number of entries, None until counts are given
+        self.tagCounts = None
+        self.worker = worker
+        # whether the completions have been made for the potential tags
+        self._completerFilled = False
         self._buildUI()
+        self.refreshTags()
 
 
     def _buildUI(self):
@@ -102,9 +136,16 @@ class TagCategoryWidget(QtWidgets.QWidget):
         self.tagInput = QtWidgets.QLineEdit()
         self.mainLayout.addWidget(self.tagInput)
         self.tagInput.editingFinished.connect(self.tagEntered)
-        self.completer = QtWidgets.QCompleter(self.potentialTags, self)
+        # completions show their counts, but match and enter the bare tag
+        self.completerModel = QtGui.QStandardItemModel(self)
+        self.completerModel.setSortRole(self.CountRole)
+        self.completer = QtWidgets.QCompleter(self.completerModel, self)
+        self.completer.setCompletionRole(self.TagRole)
         self.completer.setCaseSensitivity(QtCore.Qt.CaseInsensitive)
         self.tagInput.setCompleter(self.completer)
+        # a large vocabulary takes a while to make completions for, so they
+        # are made when the input is first used
+        self.tagInput.installEventFilter(self)
 
         # Set the central widget of the main window
         self.mainLayout.setContentsMargins(0,0,0,0)
@@ -126,6 +167,7 @@ class TagCategoryWidget(QtWidgets.QWidget):
             return
         self.appliedTags.append(text)
         widget = TagWidget(text)
+        widget.setCount(self._countFor(text))
         self.tagLayout.addWidget(widget)
         self.tagWidgets.append(widget)
 
@@ -137,10 +179,27 @@ class TagCategoryWidget(QtWidgets.QWidget):
 
         self.tagsEdited.emit()
 
+    def eventFilter(self, watched, event):
+        if watched is self.tagInput and event.type() == QtCore.QEvent.FocusIn and not self._completerFilled:
+            self._fillCompleter()
+        return super(TagCategoryWidget, self).eventFilter(watched, event)
+
+    def clearTags(self):
+        ''' Removes every entered tag '''
+        if not self.tagWidgets:
+            return
+        for tagWidget in self.tagWidgets:
+            self.tagLayout.removeWidget(tagWidget)
+            tagWidget.setParent(None)
+            tagWidget.deleteLater()
+        self.appliedTags = []
+        self.tagWidgets = []
+        self.tagsEdited.emit()
 
     def deleteTag(self, tagWidget):
         ''' Handles tag deletion '''
         self.appliedTags.remove(tagWidget.text)
+        self.tagWidgets.remove(tagWidget)
         self.tagLayout.removeWidget(tagWidget)
         tagWidget.setParent(None)
         tagWidget.deleteLater()
@@ -149,21 +208,116 @@ class TagCategoryWidget(QtWidgets.QWidget):
         self.tagsEdited.emit()
 
     def findTags(self):
-        ''' reads the json file and gathers the relevant potential tags, either
-        those in the named category or all tags '''
+        ''' gathers the relevant potential tags from the json file and the
+        database's tag dictionaries, either those in the named category or all
+        tags '''
+        self._tagsFound(self.readTags(self.name))
+
+    @staticmethod
+    def readTags(categoryName=None):
+        ''' Reads the potential tags of a category, or of every category if
+            it is None, from the json file and the database, on any thread
+            returns:
+                list of str: the tags, without repeats
+        '''
         categories = Utils.getCategories()
-        # if no category name is given, get the tags from all categories
-        if self.name:
-            self.potentialTags = categories.get(self.name)
+        names = [categoryName] if categoryName else list(categories)
+        tags = []
+        for category in names:
+            tags += categories.get(category) or []
+            tags += DatabaseInterface.getTagNames(category)
+        return list(dict.fromkeys(tags))
+
+    def refreshTags(self):
+        ''' Updates the completer with any tags added since it was made,
+            reading them on the worker if there is one '''
+        if self.worker is None:
+            self.findTags()
+            return
+        # tags for an earlier refresh are no longer wanted
+        group = (self, 'tags')
+        self.worker.cancel(group)
+        self.worker.submit(self.readTags, self.name, callback=self._tagsFound, group=group)
+
+    def _tagsFound(self, tags):
+        ''' Takes the potential tags read, making the completions again if
+            they have been made or the input is in use '''
+        self.potentialTags = tags
+        self.tagsFound.emit()
+        if self._completerFilled or self.tagInput.hasFocus():
+            self._fillCompleter()
         else:
-            for tags in categories.values():
-                self.potentialTags += tags
+            self._showCounts()
+
+    def _fillCompleter(self):
+        ''' Makes a completion for each potential tag '''
+        self._completerFilled = True
+        self.completerModel.clear()
+        for tag in self.potentialTags:
+            item = QtGui.QStandardItem(tag)
+            item.setData(tag, self.TagRole)
+            self.completerModel.appendRow(item)
+        self._showCounts()
+
+    def setTagCounts(self, counts):
+        ''' Shows how many entries have each tag, by the completions and the
+            entered tags, with the most common tags completed first
+            args:
+                counts (dict of {str: dict of {str: int}}): category to tag name
+                    to number of entries dictionary, as read by
+                    DatabaseInterface.getTagCounts. Tags in several of this
+                    widget's categories are counted in each. None to show no counts
+        '''
+        if counts is None:
+            self.tagCounts = None
+            self._showCounts()
+            return
+        names = [self.name] if self.name else list(counts)
+        self.tagCounts = {}
+        for category in names:
+            for tag, count in counts.get(category, {}).items():
+                self.tagCounts[tag] = self.tagCounts.get(tag, 0) + count
+        self._showCounts()
+
+    def _countFor(self, tag):
+        ''' returns the number of entries with a tag, 0 for a known tag no
+            entry has, or None if it is not known '''
+        if self.tagCounts is None:
+            return None
+        if tag in self.tagCounts:
+            return self.tagCounts[tag]
+        return 0 if tag in self.potentialTags else None
+
+    def _showCounts(self):
+        ''' Updates the counts shown, in place. Completions not yet made are
+            given the counts when they are '''
+        if self._completerFilled:
+            for row in range(self.completerModel.rowCount()):
+                item = self.completerModel.item(row)
+                tag = item.data(self.TagRole)
+                count = self._countFor(tag)
+                item.setText(tag if count is None else f"{tag} ({count})")
+                item.setData(count or 0, self.CountRole)
+            if self.tagCounts is not None:
+                self.completerModel.sort(0, QtCore.Qt.DescendingOrder)
+        for widget in self.tagWidgets:
+            widget.setCount(self._countFor(widget.text))
 
 
 class NewEntryWidget(QtWidgets.QDialog):
-    ''' Widget to create a new database entry, including adding tags '''
-    def __init__(self, parent=None):
+    ''' Widget to create a new database entry, including adding tags. The
+        tag inputs are made when the dialog is first shown, so that it can be
+        made with the main window and kept to be opened again '''
+    # emitted with the new entry's ID once it and its tags are saved
+    entryAdded = QtCore.pyqtSignal(int)
+
+    def __init__(self, parent=None, worker=None):
+        '''
+        worker (QueryWorker.QueryWorker): worker to read the tags and their
+            counts on, None to read them straight away
+        '''
         super(NewEntryWidget, self).__init__(parent)
+        self.worker = worker
         self._buildUI()
 
     def _buildUI(self):
@@ -176,13 +330,11 @@ class NewEntryWidget(QtWidgets.QDialog):
         self.bodyText = TextInput('Text Body')
         self.layout.addWidget(self.bodyText)
 
-        # Add TagCategoryWidgets
+        # TagCategoryWidgets are added here when the dialog is first shown
         self.tagInputs = {}
-        self.categories = Utils.getCategories()
-        for category, tags in self.categories.items():
-            self.tagInputs[category] = TagCategoryWidget(categoryName=category,
-                                                         potentialTags=tags)
-            self.layout.addWidget(self.tagInputs[category])
+        self.categories = {}
+        self.tagLayout = QtWidgets.QVBoxLayout()
+        self.layout.addLayout(self.tagLayout)
 
         # Add Save button
         self.saveBtn = QtWidgets.QPushButton('Save')
@@ -191,6 +343,46 @@ class NewEntryWidget(QtWidgets.QDialog):
         self.saveBtn.setAutoDefault(False)
         self.layout.addWidget(self.saveBtn)
 
+    def showEvent(self, event):
+        ''' Makes the tag inputs the first time the dialog is shown, and
+            shows the latest tags and counts each time '''
+        if not self.tagInputs:
+            self._buildTagInputs()
+        else:
+            for tagInput in self.tagInputs.values():
+                tagInput.refreshTags()
+        self.refreshCounts()
+        super(NewEntryWidget, self).showEvent(event)
+
+    def _buildTagInputs(self):
+        ''' Adds a TagCategoryWidget for each category '''
+        self.categories = Utils.getCategories()
+        for category, tags in self.categories.items():
+            self.tagInputs[category] = TagCategoryWidget(categoryName=category,
+                                                         potentialTags=tags, worker=self.worker)
+            self.tagLayout.addWidget(self.tagInputs[category])
+
+    def refreshCounts(self):
+        ''' Shows how many entries have each tag by the tag inputs '''
+        categories = list(self.categories)
+        if self.worker is None:
+            self._countsRead(DatabaseInterface.getTagCounts(categories))
+            return
+        self.worker.cancel((self, 'tagCounts'))
+        self.worker.submit(DatabaseInterface.getTagCounts, categories,
+                           callback=self._countsRead, group=(self, 'tagCounts'))
+
+    def _countsRead(self, tagCounts):
+        ''' Passes the tag counts read to every tag input '''
+        for tagInput in self.tagInputs.values():
+            tagInput.setTagCounts(tagCounts)
+
+    def clear(self):
+        ''' Empties the inputs, for the dialog to be used again '''
+        self.titleText.setText('')
+        self.bodyText.setText('')
+        for tagInput in self.tagInputs.values():
+            tagInput.clearTags()
 
     def saveEntry(self):
         ''' Save the entered data as a new database entry '''
@@ -203,12 +395,15 @@ class NewEntryWidget(QtWidgets.QDialog):
         # Make the new entry to the main table and get its ID
         entryID = DatabaseInterface.addEntry(title=titleText, textBody=bodyText)
         if not entryID:
-            Utils.ErrorMessage("Error executing query:" + query.lastError().text())
+            # addEntry has printed the query's error
+            Utils.ErrorMessage("Error adding entry")
             self.reject()
+            return
 
         # Add the relevant tags to the various tables to keep track of them
         tagDict = self.getTagDict()
         DatabaseInterface.addTags(entryID, tagDict)
+        self.entryAdded.emit(entryID)
         self.accept()
 
     def getTagDict(self):
@@ -232,84 +427,440 @@ class SearchWidget(QtWidgets.QWidget):
         super(SearchWidget, self).__init__()
         self.model = model
         self._buildUI()
-        self.filterString = ''
+        self.filter = DatabaseInterface.Filter()
 
     def _buildUI(self):
         searchBox = QtWidgets.QGroupBox('Search and Filter')
         searchLayout = QtWidgets.QVBoxLayout()
         searchBox.setLayout(searchLayout)
 
+        # live searches wait for a pause in typing
+        self.searchTimer = QtCore.QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(const.SEARCHDELAYMS)
+        self.searchTimer.timeout.connect(self.search)
+
         self.titleSearchText = TextInput("Search Title")
         searchLayout.addWidget(self.titleSearchText)
         self.titleSearchText.editingFinished.connect(self.search)
+        self.titleSearchText.textChanged.connect(self.searchLater)
 
         self.bodySearchText = TextInput("Search Text")
         searchLayout.addWidget(self.bodySearchText)
         self.bodySearchText.editingFinished.connect(self.search)
+        self.bodySearchText.textChanged.connect(self.searchLater)
+
+        # regular expressions and exact text are found by scanning the entries, see ParallelSearch
+        self.textMode = QtWidgets.QComboBox()
+        self.textMode.addItems(['Match words', 'Regular expression', 'Exact text'])
+        self.textMode.currentIndexChanged.connect(self.search)
+        searchLayout.addWidget(self.textMode)
+
+        self.liveSearch = QtWidgets.QCheckBox('Search as you type')
+        self.liveSearch.setChecked(Utils.Config().LIVE_SEARCH)
+        searchLayout.addWidget(self.liveSearch)
 
-        self.tagSearch = TagCategoryWidget(labelName="Filter by tags")
+        # the tags are read on the count worker, so the first rows are not held up
+        self.tagSearch = TagCategoryWidget(labelName="Filter by tags", worker=self.model.countWorker)
         self.tagSearch.tagsEdited.connect(self.search)
+        self.tagSearch.tagInput.setToolTip("Start a tag with - to exclude it")
         searchLayout.addWidget(self.tagSearch)
 
+        self.tagMatchMode = QtWidgets.QComboBox()
+        self.tagMatchMode.addItems(['Match any tag', 'Match all tags'])
+        self.tagMatchMode.currentIndexChanged.connect(self.search)
+        searchLayout.addWidget(self.tagMatchMode)
+
         layout = QtWidgets.QVBoxLayout()
         layout.addWidget(searchBox)
         self.setLayout(layout)
 
+    def searchLater(self):
+        ''' Searches once typing pauses, if searching as you type '''
+        if self.liveSearch.isChecked():
+            self.searchTimer.start()
+
     def search(self):
-        ''' Update the search results '''
-        self.refreshFilterString()
-        self.model.setFilterString(self.filterString)
-        self.model.refreshData()
+        ''' Update the search results. A search that narrows the last one is
+            checked against the entries already found, if they are all loaded,
+            rather than searching the whole table again '''
+        self.searchTimer.stop()
+        DatabaseInterface.checkTagDictionaries()
+        previous = self.filter
+        self.refreshFilter()
+        # entering text that was already searched as it was typed
+        if self.filter == previous and self.liveSearch.isChecked():
+            return
+        # a regular expression still being typed is searched once it is valid
+        error = ParallelSearch.patternError(self.filter) if self.filter.needsScan() else None
+        self.textMode.setToolTip(error or '')
+        if error:
+            self.filter = previous
+            return
 
-    def refreshFilterString(self):
-        ''' Makes a filter query string out of the given filters '''
-        # Get the current search paramenters
-        titleString = self.titleSearchText.text()
-        bodyString = self.bodySearchText.text()
-        tags = self.tagSearch.getAppliedTags()
+        if self.filter.narrows(previous) and self.model.canRefine():
+            self.model.refine(self.filter, self.filter.rankQuery())
+        else:
+            self.model.setFilter(self.filter)
+            self.model.setRankQuery(self.filter.rankQuery())
+            self.model.refreshData()
+        self.countTags()
+
+    def countTags(self):
+        ''' Counts how many of the entries found have each tag, on the model's
+            count worker if it has one, and shows the counts by the tags '''
+        if not Utils.Config().TAG_COUNTS:
+            return
+        categories = list(Utils.getCategories())
+        worker = self.model.countWorker
+        if self.filter.needsScan():
+            # the entries a scan finds are not known to SQL, so their tags are not counted
+            if worker is not None:
+                worker.cancel('tagCounts')
+            self.tagSearch.setTagCounts(None)
+            return
+        if worker is None:
+            self.tagSearch.setTagCounts(self.model.source.getTagCounts(categories, self.filter))
+            return
+        # counts for an earlier search are no longer wanted
+        worker.cancel('tagCounts')
+        worker.submit(self.model.source.getTagCounts, categories, self.filter,
+                      callback=self.tagSearch.setTagCounts, group='tagCounts')
+
+    def refreshFilter(self):
+        ''' Makes a filter out of the given search text and tags, which searches
+            the text through the full text index if the database has one '''
+        # Filter by tags, with tags starting with '-' excluded
+        included = {}
+        excluded = {}
+        for searchTag in self.tagSearch.getAppliedTags():
+            tagSet = included
+            if searchTag.startswith('-'):
+                searchTag = searchTag[1:]
+                tagSet = excluded
+            # tags added with an entry are in the database's tag dictionaries
+            # only, and each shard has its own
+            tagCategories = list(Utils.getTagCategories(searchTag))
+            tagCategories += [category for category in self.model.source.getTagCategories(
+                searchTag, list(Utils.getCategories())) if category not in tagCategories]
+            if tagCategories:
+                tagSet[searchTag] = tagCategories
+
+        self.filter = DatabaseInterface.Filter(
+            self.titleSearchText.text(), self.bodySearchText.text(), included, excluded,
+            matchAll=self.tagMatchMode.currentIndex() == 1,
+            fullText=DatabaseInterface.hasFullTextSearch(),
+            scan=([None] + list(const.SCANMODES))[self.textMode.currentIndex()])
+
+
+
+class EntryViewer(QtWidgets.QTextBrowser):
+    ''' Shows an entry's title and text body, scrolled to the first hit of the
+        search it was found by. Bodies too long to show at once are read a
+        piece at a time, as the view scrolls to either end of the text shown
+        so far, starting from the piece with the hit shown '''
+    # the hit shown, from 0, the number of hits found so far, and whether
+    # every hit has been found. The hit is -1 if none is shown, and the
+    # number -1 if the search has no text to find in the text body
+    hitsChanged = QtCore.pyqtSignal(int, int, bool)
+
+    def __init__(self, worker, source=None, parent=None):
+        '''
+        worker (QueryWorker.QueryWorker): worker to read the pieces of text on
+        source (module): where the text is read from, DatabaseInterface or
+            Federation. Defaults to DatabaseInterface
+        '''
+        super(EntryViewer, self).__init__(parent)
+        self.worker = worker
+        self.source = source or DatabaseInterface
+        # the entry being read a piece at a time, if any
+        self.entryID = None
+        self.textLength = 0
+        # the position in the text body of the text shown, and its length
+        self.windowStart = 0
+        self.loadedLength = 0
+        self._reading = False
+        # the length of the title shown before the text body
+        self.headerLength = 0
+        # the search the entry was found by, and the (position, length) of its
+        # hits in the text body found so far
+        self.filter = None
+        self.hits = []
+        self.hitIndex = -1
+        self.hitsComplete = True
+        # the hit to show once the text around it is read
+        self._pendingHit = None
+        self._findingHit = False
+        self._hitGroup = (self, 'hits')
+        self.verticalScrollBar().valueChanged.connect(self._scrolled)
+
+    def showMessage(self, message):
+        ''' Shows a message in place of an entry '''
+        self._stopReading()
+        self._setHits(None, [], True)
+        self.setPlainText(message)
+
+    def showText(self, title, textBody, filter=None, spans=None):
+        ''' Shows a whole entry
+            args:
+                title (str): the entry title
+                textBody (str): the text body
+                filter (DatabaseInterface.Filter): the search the entry was
+                    found by, whose first hit is shown
+                spans (list of tuple of (int, int)): the start and end of the
+                    hits a scan found, if it was found by one
+        '''
+        self._stopReading()
+        header = f"Title: {title}\n\n"
+        self.headerLength = len(header)
+        self.setPlainText(header + (textBody or ''))
+        if spans:
+            hits = [(start, end - start) for start, end in spans]
+        else:
+            hits = DatabaseInterface.findTextHits(textBody, filter) if isinstance(filter, DatabaseInterface.Filter) else []
+        self._setHits(filter, hits, True)
+        self.nextHit()
+
+    def showLargeText(self, entryID, title, length, filter=None, spans=None):
+        ''' Shows an entry whose text body is read a piece at a time, from its
+            first hit, which is found in the database
+            args:
+                entryID (int): the entry ID
+                title (str): the entry title
+                length (int): the length of the text body
+                filter (DatabaseInterface.Filter): the search the entry was
+                    found by
+                spans (list of tuple of (int, int)): the start and end of the
+                    hits a scan found, if it was found by one
+        '''
+        self._stopReading()
+        self.entryID = entryID
+        self.textLength = length
+        header = f"Title: {title}\nLength: {length} characters\n\n"
+        self.headerLength = len(header)
+        self.setPlainText(header)
+        hits = [(start, end - start) for start, end in spans or []]
+        self._setHits(filter, hits, bool(spans) or not self._hasBodyText(filter))
+        if self.hits or self.hitsComplete:
+            self.nextHit()
+            if not self.hits:
+                self._readNextChunk()
+        else:
+            self._findNextHit()
+
+    def nextHit(self):
+        ''' Shows the next hit in the text body, finding it first if it is not yet found '''
+        if self.hitIndex + 1 < len(self.hits):
+            self._showHit(self.hitIndex + 1)
+        elif not self.hitsComplete:
+            self._findNextHit()
+
+    def previousHit(self):
+        ''' Shows the hit before the one shown '''
+        if self.hitIndex > 0:
+            self._showHit(self.hitIndex - 1)
+
+    @staticmethod
+    def _hasBodyText(filter):
+        ''' returns whether a search has text to find in the text bodies '''
+        return isinstance(filter, DatabaseInterface.Filter) and bool(filter.bodyText)
+
+    def _setHits(self, filter, hits, complete):
+        ''' Starts the hits of a newly shown entry '''
+        self.filter = filter
+        self.hits = hits
+        self.hitIndex = -1
+        self.hitsComplete = complete
+        self._pendingHit = None
+        self._findingHit = False
+        self._emitHits()
+
+    def _emitHits(self):
+        ''' Tells the hit navigation which hit is shown, or that there are none
+            to navigate if the search has no text to find in the text body '''
+        if not self._hasBodyText(self.filter):
+            self.hitsChanged.emit(-1, -1, True)
+        else:
+            self.hitsChanged.emit(self.hitIndex, len(self.hits), self.hitsComplete)
 
-        if not titleString and not bodyString and not tags:
-            self.filterString =  ''
+    def _findNextHit(self):
+        ''' Finds the hit after the last one found, in the database '''
+        if self.entryID is None or self._findingHit:
+            return
+        self._findingHit = True
+        start = self.hits[-1][0] + self.hits[-1][1] if self.hits else 0
+        entryID = self.entryID
+        self.worker.submit(self.source.findHit, entryID, self.filter, start,
+                           callback=lambda hit: self._hitFound(entryID, hit), group=self._hitGroup)
+
+    def _hitFound(self, entryID, hit):
+        ''' Shows a hit found in the database, or notes there are no more '''
+        if entryID != self.entryID:
+            return
+        self._findingHit = False
+        if hit is None:
+            self.hitsComplete = True
+            self._emitHits()
+            # with no hits at all, the body is read from its start
+            if not self.hits and not self.loadedLength:
+                self._readNextChunk()
+            return
+        self.hits.append(hit)
+        self._showHit(len(self.hits) - 1)
+
+    def _showHit(self, hitIndex):
+        ''' Selects a hit, scrolling to it, first reading the text around it
+            if it is not shown '''
+        self.hitIndex = hitIndex
+        self._emitHits()
+        position, length = self.hits[hitIndex]
+        if self.entryID is not None and not self.windowStart <= position < self.windowStart + self.loadedLength:
+            self._pendingHit = hitIndex
+            self._readWindow(max(0, position - const.TEXTCHUNKLENGTH // 4))
+            return
+        self._pendingHit = None
+        # a hit longer than the text read is selected as far as it is read
+        if self.entryID is not None:
+            length = min(length, self.windowStart + self.loadedLength - position)
+        cursor = QtGui.QTextCursor(self.document())
+        cursor.setPosition(self.headerLength + position - self.windowStart)
+        cursor.setPosition(self.headerLength + position - self.windowStart + length,
+                           QtGui.QTextCursor.KeepAnchor)
+        self.setTextCursor(cursor)
+        self.ensureCursorVisible()
+
+    def _readWindow(self, start):
+        ''' Drops the text shown and reads the text body from a position on '''
+        self.worker.cancel(self)
+        self._reading = False
+        self.windowStart = start
+        self.loadedLength = 0
+        cursor = QtGui.QTextCursor(self.document())
+        cursor.setPosition(self.headerLength)
+        cursor.movePosition(QtGui.QTextCursor.End, QtGui.QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        self._readNextChunk()
+
+    def _stopReading(self):
+        ''' Drops any entry being read a piece at a time '''
+        self.worker.cancel(self)
+        self.worker.cancel(self._hitGroup)
+        self.entryID = None
+        self.textLength = 0
+        self.windowStart = 0
+        self.loadedLength = 0
+        self._reading = False
+
+    def _scrolled(self, value):
+        ''' Reads more text when the view nears either end of the text shown '''
+        self._fillView()
+
+    def _readNextChunk(self):
+        ''' Reads the next piece of the text body, if there is more to read '''
+        end = self.windowStart + self.loadedLength
+        if self.entryID is None or self._reading or end >= self.textLength:
             return
+        self._reading = True
+        entryID = self.entryID
+        self.worker.submit(self.source.getTextSlice, entryID, end, const.TEXTCHUNKLENGTH,
+                           callback=lambda text: self._chunkRead(entryID, text), group=self)
+
+    def _readPreviousChunk(self):
+        ''' Reads the piece of the text body before the text shown, if it does
+            not start from the beginning '''
+        if self.entryID is None or self._reading or self.windowStart <= 0:
+            return
+        self._reading = True
+        entryID = self.entryID
+        start = max(0, self.windowStart - const.TEXTCHUNKLENGTH)
+        self.worker.submit(self.source.getTextSlice, entryID, start, self.windowStart - start,
+                           callback=lambda text: self._previousChunkRead(entryID, start, text),
+                           group=self)
+
+    def _chunkRead(self, entryID, text):
+        ''' Adds a piece of text to the end of the view '''
+        if entryID != self.entryID:
+            return
+        self._reading = False
+        self.loadedLength += len(text)
+        if not text:
+            self.loadedLength = self.textLength - self.windowStart
+        cursor = QtGui.QTextCursor(self.document())
+        cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.insertText(text)
+        if self._pendingHit is not None:
+            self._showHit(self._pendingHit)
+
+        self._fillView()
+
+    def _fillView(self):
+        ''' Keeps reading until the view is filled, and there is text to scroll
+            to on either side of it '''
+        scrollBar = self.verticalScrollBar()
+        if scrollBar.maximum() - scrollBar.value() <= scrollBar.pageStep():
+            self._readNextChunk()
+        if scrollBar.value() <= scrollBar.minimum():
+            self._readPreviousChunk()
+
+    def _previousChunkRead(self, entryID, start, text):
+        ''' Adds a piece of text before the text shown, keeping the view where it is '''
+        if entryID != self.entryID:
+            return
+        self._reading = False
+        scrollBar = self.verticalScrollBar()
+        value, maximum = scrollBar.value(), scrollBar.maximum()
+        cursor = QtGui.QTextCursor(self.document())
+        cursor.setPosition(self.headerLength)
+        cursor.insertText(text)
+        self.windowStart = start
+        self.loadedLength += len(text)
+        scrollBar.setValue(value + scrollBar.maximum() - maximum)
+        self._fillView()
+
+
+class DebugPanel(QtWidgets.QDockWidget):
+    ''' Shows the query statistics and cache counters, refreshed while visible '''
+    def __init__(self, parent=None):
+        super(DebugPanel, self).__init__('Query Statistics', parent)
+        self._buildUI()
 
-        # Handle text search for title and body text
-        string = ' WHERE '
-        if titleString:
-            string += 'Title LIKE ' + '"%' + titleString + '%"'
-        if bodyString:
-            if string.endswith('"'):
-                string += ' AND'
-            if string[-1] != ' ':
-                string += ' '
-            string += 'TextBody LIKE ' + '"%' + bodyString + '%"'
-
-        # Find the IDs of the tags to filter by
-        indexes = set()
-        categoryDict = Utils.getCategories()
-        for category, valueTags in categoryDict.items():
-            for searchTag in tags:
-                if searchTag in valueTags:
-                    index = DatabaseInterface.getEntryIDsWithTag(category, searchTag)
-                    if not index:
-                        continue
-                    indexes.update(index)
-
-        # Make a string of the tag IDs
-        indexString = ''
-        for index in indexes:
-            indexString += ' ID={} OR'.format(index)
-
-        # Add strings together for tag IDs and cleanup
-        if indexString:
-            if string.endswith('"'):
-                string += ' AND'
-            if indexString.endswith(' OR'):
-                indexString = indexString[:-3]
-            string += '(' + indexString + ')'
-
-        self.filterString = string
+    def _buildUI(self):
+        widget = QtWidgets.QWidget()
+        layout = QtWidgets.QVBoxLayout()
+        widget.setLayout(layout)
+
+        self.reportText = QtWidgets.QPlainTextEdit()
+        self.reportText.setReadOnly(True)
+        self.reportText.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self.reportText.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        layout.addWidget(self.reportText)
+
+        self.resetBtn = QtWidgets.QPushButton('Reset')
+        self.resetBtn.released.connect(self.reset)
+        layout.addWidget(self.resetBtn)
+        self.setWidget(widget)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+        self.visibilityChanged.connect(self.setRefreshing)
+
+    def setRefreshing(self, visible):
+        ''' Refreshes the statistics every second while the panel is visible '''
+        if visible:
+            self.refresh()
+            self.timer.start()
+        else:
+            self.timer.stop()
 
+    def refresh(self):
+        ''' Shows the latest statistics '''
+        self.reportText.setPlainText(Instrumentation.report())
 
+    def reset(self):
+        ''' Clears the statistics '''
+        Instrumentation.reset()
+        self.refresh()
 
 class ReaderWidget(QtWidgets.QMainWindow):
     ''' Displays the search and filter options and shows the resulting entries '''
@@ -323,61 +874,344 @@ class ReaderWidget(QtWidgets.QMainWindow):
             return
         config = Utils.Config()
         self.database = config.DATABASE
-        self._buildUI()
+
+        # run queries on worker threads, with counts on their own so they do
+        # not hold up rows and text bodies
+        self.queryWorker = QueryWorker.QueryWorker(self.database.databaseName(), self)
+        self.countWorker = QueryWorker.QueryWorker(self.database.databaseName(), self)
+        QtWidgets.QApplication.instance().aboutToQuit.connect(self.stopWorkers)
+        # several shards are read through Federation, which counts each shard
+        # exactly and keeps the counts, so estimates are not needed
+        self.source = DatabaseInterface
+        if Federation.isFederated():
+            self.source = Federation
+        self.bodyCache = Utils.BodyCache()
+        self.loadingEntryID = None
+        # the selected row, while its block is still being read
+        self.pendingRow = None
+        # made when first opened, and kept for the next time
+        self.newEntryDialog = None
+        # the window is shown before the first rows, counts and tags are
+        # read, and the time each takes from here is kept as a startup phase
+        self.startTime = time.perf_counter()
+        with Instrumentation.timed('build window'):
+            self._buildUI()
+        self._timeUntil(self.model.rowsInserted, 'first rows')
+        self._timeUntil(self.model.entryCountChanged, 'entry count')
+        self._timeUntil(self.searchWidget.tagSearch.tagsFound, 'tags read')
+        QtCore.QTimer.singleShot(0, self._loadData)
 
 
     def _buildUI(self):
 
         mainLayout = QtWidgets.QHBoxLayout()
 
-        # Set the model for the entries
-        self.model = TableModel.TableModel()
+        # Set the model for the entries, reading only the columns shown
+        tableView = Utils.Config().TABLE_VIEW
+        self.model = TableModel.TableModel(
+            worker=self.queryWorker, countWorker=self.countWorker, source=self.source,
+            estimateCounts=False if Federation.isFederated() else None,
+            columns=self.tableColumns() if tableView else None,
+            blockSize=const.TABLEBLOCKSIZE if tableView else const.BLOCKSIZE)
 
         # Create the new entry button
         leftMenuLayout = QtWidgets.QVBoxLayout()
         mainLayout.addLayout(leftMenuLayout)
         self.addEntryBtn = QtWidgets.QPushButton('New Entry')
         self.addEntryBtn.released.connect(self.openNewEntryDialog)
+        self.addEntryBtn.setEnabled(not Utils.Config().READ_ONLY)
         leftMenuLayout.addWidget(self.addEntryBtn)
 
         # create the search and filter widget
-        searchWidget = SearchWidget(self.model)
-        leftMenuLayout.addWidget(searchWidget)
+        self.searchWidget = SearchWidget(self.model)
+        leftMenuLayout.addWidget(self.searchWidget)
 
-        # create the list view to display the search results
-        # TODO: show more information by upgrading to a table view
+        # create the list view to display the search results, and the table
+        # view showing more of each entry, only one of which is shown at a time
         self.titleListWidget = QtWidgets.QListView()
         self.titleListWidget.setModel(self.model)
-        self.titleListWidget.setModelColumn(1)
-
-        mainLayout.addWidget(self.titleListWidget)
-        self.titleListWidget.clicked.connect(self.showEntry)
-
-        # Create text browser to show the entry
-        self.textDisplay = QtWidgets.QTextBrowser()
-        mainLayout.addWidget(self.textDisplay)
+        self.titleListWidget.setModelColumn(self.model.columns().index(const.TITLE))
+        # rows are all the same height, so only the visible ones are read
+        self.titleListWidget.setUniformItemSizes(True)
+
+        self.tableView = QtWidgets.QTableView()
+        self.tableView.setModel(self.model)
+        self.tableView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.tableView.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.tableView.setWordWrap(False)
+        # rows are never measured, so only the visible ones are read
+        self.tableView.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.tableView.verticalHeader().hide()
+        self.tableView.horizontalHeader().setStretchLastSection(True)
+        # clicking a heading sorts in the database, see TableModel.sort, starting unsorted
+        self.tableView.horizontalHeader().setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+        self.tableView.setSortingEnabled(True)
+        self.tableView.horizontalHeader().sortIndicatorChanged.connect(self.showSortIndicator)
+
+        self.resultsViews = QtWidgets.QStackedWidget()
+        for view in (self.titleListWidget, self.tableView):
+            view.selectionModel().currentChanged.connect(self.showEntry)
+            # count the views' paints, for the queries per paint statistic
+            view.viewport().installEventFilter(self)
+            self.resultsViews.addWidget(view)
+        self.resultsViews.setCurrentWidget(self.tableView if tableView else self.titleListWidget)
+
+        # show the number of entries found below the list
+        self.countLabel = QtWidgets.QLabel()
+        self.model.entryCountChanged.connect(self.showEntryCount)
+        self.model.loadingChanged.connect(self.showLoading)
+        # the results of a scan are never sorted, so the indicator follows each search
+        self.model.modelReset.connect(self.showSortIndicator)
+        self.model.dataChanged.connect(self._rowsArrived)
+        self.model.modelReset.connect(self._dropPendingRow)
+        resultsLayout = QtWidgets.QVBoxLayout()
+        resultsLayout.addWidget(self.resultsViews)
+        resultsLayout.addWidget(self.countLabel)
+        mainLayout.addLayout(resultsLayout)
+
+        # Create text browser to show the entry, with buttons to move between
+        # the hits of the search in its text
+        self.textDisplay = EntryViewer(self.queryWorker, self.source)
+        self.textDisplay.hitsChanged.connect(self.showHits)
+        self.previousHitBtn = QtWidgets.QPushButton('Previous Hit')
+        self.previousHitBtn.setShortcut(QtGui.QKeySequence('Shift+F3'))
+        self.previousHitBtn.released.connect(self.textDisplay.previousHit)
+        self.nextHitBtn = QtWidgets.QPushButton('Next Hit')
+        self.nextHitBtn.setShortcut(QtGui.QKeySequence('F3'))
+        self.nextHitBtn.released.connect(self.textDisplay.nextHit)
+        self.hitLabel = QtWidgets.QLabel()
+        hitLayout = QtWidgets.QHBoxLayout()
+        hitLayout.addWidget(self.previousHitBtn)
+        hitLayout.addWidget(self.hitLabel)
+        hitLayout.addStretch()
+        hitLayout.addWidget(self.nextHitBtn)
+        entryLayout = QtWidgets.QVBoxLayout()
+        entryLayout.addLayout(hitLayout)
+        entryLayout.addWidget(self.textDisplay)
+        mainLayout.addLayout(entryLayout)
+        self.showHits(-1, -1, True)
 
         # Set the central widget of the main window
         centralWidget = QtWidgets.QWidget()
         centralWidget.setLayout(mainLayout)
         self.setCentralWidget(centralWidget)
 
+        # query statistics, hidden until opened from the View menu
+        self.debugPanel = DebugPanel(self)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.debugPanel)
+        self.debugPanel.hide()
+        debugAction = self.debugPanel.toggleViewAction()
+        debugAction.setShortcut(QtGui.QKeySequence('F12'))
+        tableAction = QtWidgets.QAction('Table view', self)
+        tableAction.setCheckable(True)
+        tableAction.setChecked(tableView)
+        tableAction.setShortcut(QtGui.QKeySequence('Ctrl+T'))
+        tableAction.toggled.connect(self.setTableView)
+        viewMenu = self.menuBar().addMenu('View')
+        viewMenu.addAction(tableAction)
+        viewMenu.addAction(debugAction)
+
+    def _loadData(self):
+        ''' Reads the first rows and the tag counts, once the window is shown '''
+        self._recordPhase('window shown')
+        self.model.refreshData()
+        self.searchWidget.countTags()
+
+    def _recordPhase(self, name):
+        ''' Records the time since the window started being made as a startup phase '''
+        Instrumentation.recordPhase(name, time.perf_counter() - self.startTime)
+
+    def _timeUntil(self, signal, name):
+        ''' Records the time until a signal is first emitted as a startup phase '''
+        def emitted(*args):
+            signal.disconnect(emitted)
+            self._recordPhase(name)
+        signal.connect(emitted)
+
+    def tableColumns(self):
+        ''' returns the columns the table view shows: the ID, title, when the
+            entry was added and its number of tags, the start of the text
+            body, and the tags in each category '''
+        categories = [category for category in Utils.getCategories()
+                      if DatabaseInterface.checkTableExists(category + const.MAPSUFFIX)]
+        sortKeys = [column for column in (const.ADDED, const.TAGCOUNT)
+                    if DatabaseInterface.isSortable(column)]
+        return ([const.ID, const.TITLE] + sortKeys + [const.PREVIEW] +
+                [DatabaseInterface.tagColumn(category) for category in categories])
+
+    def setTableView(self, tableView):
+        ''' Switches between the list of titles and the table, reading only
+            the columns the view shown needs, in smaller blocks for the table
+            as its rows are larger
+            args:
+                tableView (bool): whether to show the table
+        '''
+        Utils.Config().TABLE_VIEW = tableView
+        if tableView:
+            self.model.setColumns(self.tableColumns(), const.TABLEBLOCKSIZE)
+        else:
+            self.model.setColumns(None, const.BLOCKSIZE)
+        self.titleListWidget.setModelColumn(self.model.columns().index(const.TITLE))
+        self.resultsViews.setCurrentWidget(self.tableView if tableView else self.titleListWidget)
+        self.showSortIndicator()
+
+    def showSortIndicator(self, *args):
+        ''' Shows the column the entries are sorted by in the table's header,
+            where a click on a column that cannot be sorted by, or a change of
+            columns, would leave the indicator on the wrong column '''
+        header = self.tableView.horizontalHeader()
+        column = self.model.sortColumn()
+        descending = self.model.sortBy is not None and self.model.sortBy[1]
+        order = QtCore.Qt.DescendingOrder if descending else QtCore.Qt.AscendingOrder
+        if (header.sortIndicatorSection(), header.sortIndicatorOrder()) != (column, order):
+            header.blockSignals(True)
+            header.setSortIndicator(column, order)
+            header.blockSignals(False)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QtCore.QEvent.Paint:
+            Instrumentation.count('paints')
+        return super(ReaderWidget, self).eventFilter(watched, event)
+
     def openNewEntryDialog(self):
-        ''' Show the dialog for creating a new entry '''
-        dialog = NewEntryWidget(self)
-        dialog.exec_()
+        ''' Show the dialog for creating a new entry, which is made the first
+            time and emptied each time after '''
+        if self.newEntryDialog is None:
+            self.newEntryDialog = NewEntryWidget(self, self.countWorker)
+            self.newEntryDialog.entryAdded.connect(lambda entryID: self.model.entriesAdded([entryID]))
+            self.newEntryDialog.entryAdded.connect(self.searchWidget.tagSearch.refreshTags)
+            self.newEntryDialog.entryAdded.connect(self.searchWidget.countTags)
+        self.newEntryDialog.clear()
+        self.newEntryDialog.exec_()
+
+    def showEntryCount(self, count, exact):
+        ''' Shows the number of entries matching the search
+            args:
+                count (int): the number of entries
+                exact (bool): whether the count is exact or an estimate
+        '''
+        prefix = '' if exact else 'About '
+        self.countLabel.setText(f"{prefix}{count} entries")
+
+    def showHits(self, hitIndex, count, complete):
+        ''' Shows which hit of the search is selected in the entry shown
+            args:
+                hitIndex (int): the hit shown, from 0, or -1 for none
+                count (int): the number of hits found so far, -1 if the search
+                    has no text to find
+                complete (bool): whether every hit has been found
+        '''
+        if count < 0:
+            self.hitLabel.setText('')
+        elif not count:
+            self.hitLabel.setText("No hits" if complete else "Finding hits...")
+        else:
+            more = '' if complete else '+'
+            self.hitLabel.setText(f"Hit {hitIndex + 1} of {count}{more}")
+        self.previousHitBtn.setEnabled(hitIndex > 0)
+        self.nextHitBtn.setEnabled(hitIndex + 1 < count or not complete)
+
+    def showLoading(self, loading):
+        ''' Shows that a search is running until its first results are in
+            args:
+                loading (bool): whether the search is running
+        '''
+        if loading:
+            self.countLabel.setText("Searching...")
+        else:
+            self.countLabel.setText("Counting...")
 
     def showEntry(self):
         ''' Shows the text body in the right hand pane '''
         # get the selected index
-        titleItem = self.titleListWidget.selectionModel().selectedIndexes()
-        if not titleItem:
+        index = self.resultsViews.currentWidget().currentIndex()
+        if not index.isValid():
             return None
 
-        # get the associated text
-        title = titleItem[0].data(QtCore.Qt.DisplayRole)
-        text = DatabaseInterface.getTextBodyFromTitle(title)
-        self.textDisplay.setPlainText(text)
+        # show the associated text, reading it by ID if it is not cached and
+        # dropping any earlier request still waiting
+        entryID = index.data(TableModel.TableModel.IDRole)
+        if entryID is None:
+            # the row's block is still being read, and the entry is shown once it arrives
+            self.pendingRow = index.row()
+            self.queryWorker.cancel('showEntry')
+            self.loadingEntryID = None
+            self.textDisplay.showMessage("Loading...")
+            return None
+        self.pendingRow = None
+        self.queryWorker.cancel('showEntry')
+        self.loadingEntryID = None
+        entry = self.bodyCache.get(entryID)
+        Instrumentation.countCacheLookup('body', entry is not None)
+        if entry:
+            self.textDisplay.showText(*entry, self.model.filter, self.model.matchSpans(entryID))
+        else:
+            self.loadingEntryID = entryID
+            self.textDisplay.showMessage("Loading...")
+            self.queryWorker.submit(self.source.getEntries, [entryID],
+                                    Utils.Config().LARGE_TEXT_LENGTH,
+                                    callback=self._entriesRead, group='showEntry')
+        self.prefetchNeighbours(index.row())
+
+    def _rowsArrived(self, topLeft, bottomRight):
+        ''' Shows the selected entry once the block its row is in has been read '''
+        if self.pendingRow is not None and topLeft.row() <= self.pendingRow <= bottomRight.row():
+            self.showEntry()
+
+    def _dropPendingRow(self):
+        ''' Forgets the row waiting for its block when the results change '''
+        self.pendingRow = None
+
+    def prefetchNeighbours(self, row):
+        ''' Reads the text bodies of the entries around a row into the cache,
+            so moving through the results with the arrow keys is instant
+            args:
+                row (int): the row of the shown entry
+        '''
+        ids = []
+        for neighbour in range(row - const.PREFETCHROWS, row + const.PREFETCHROWS + 1):
+            if neighbour < 0 or neighbour >= self.model.rowCount():
+                continue
+            entryID = self.model.index(neighbour, 0).data(TableModel.TableModel.IDRole)
+            if entryID is not None and entryID not in self.bodyCache:
+                ids.append(entryID)
+        self.queryWorker.cancel('prefetch')
+        if ids:
+            self.queryWorker.submit(self.source.getEntries, ids,
+                                    Utils.Config().LARGE_TEXT_LENGTH,
+                                    callback=self._entriesRead, group='prefetch')
+
+    def _entriesRead(self, entries):
+        ''' Caches entries that have been read, and shows the selected one if
+            it was waiting for them
+            args:
+                entries (dict of {int: tuple of (str, str, int)}): ID to title,
+                    text body and text body length dictionary, as read by
+                    DatabaseInterface.getEntries
+        '''
+        for entryID, (title, textBody, length) in entries.items():
+            # large bodies are not read whole, so are never cached
+            if textBody is not None:
+                self.bodyCache.put(entryID, title, textBody)
+        if self.loadingEntryID in entries:
+            title, textBody, length = entries[self.loadingEntryID]
+            spans = self.model.matchSpans(self.loadingEntryID)
+            if textBody is None:
+                self.textDisplay.showLargeText(self.loadingEntryID, title, length, self.model.filter, spans)
+            else:
+                self.textDisplay.showText(title, textBody, self.model.filter, spans)
+            self.loadingEntryID = None
+
+    def stopWorkers(self):
+        ''' Stops the query worker threads and the scan processes, keeping the
+            cached search results for the next session if set to '''
+        self.queryWorker.stop()
+        self.countWorker.stop()
+        config = Utils.Config()
+        if config.PERSIST_RESULTS and not config.READ_ONLY:
+            DatabaseInterface.saveResultCache()
+        Federation.closeShards()
+        ParallelSearch.shutdown()
 
 class Setup(QtWidgets.QDialog):
     ''' Dialog to allow the user to specify database and metainfo files '''
@@ -390,10 +1224,74 @@ class Setup(QtWidgets.QDialog):
         self.setLayout(self.layout)
 
         self.databaseText = TextInput('Database filepath')
+        self.databaseText.textField.setToolTip(
+            "Separate several files with ; to browse them as one. New entries are added to the first")
         self.layout.addWidget(self.databaseText)
         self.metaText = TextInput('Database Metainfo filepath')
         self.layout.addWidget(self.metaText)
 
+        # connection profile, filled in from the config
+        config = Utils.Config()
+        connectionBox = QtWidgets.QGroupBox('Connection')
+        connectionLayout = QtWidgets.QFormLayout()
+        connectionBox.setLayout(connectionLayout)
+
+        self.journalMode = QtWidgets.QComboBox()
+        self.journalMode.addItems(const.JOURNALMODES)
+        self.journalMode.setCurrentText(config.JOURNAL_MODE.upper())
+        self.journalMode.setToolTip("WAL lets searches read while entries are written")
+        connectionLayout.addRow('Journal mode', self.journalMode)
+
+        self.synchronous = QtWidgets.QComboBox()
+        self.synchronous.addItems(const.SYNCHRONOUSLEVELS)
+        self.synchronous.setCurrentText(config.SYNCHRONOUS.upper())
+        connectionLayout.addRow('Synchronous', self.synchronous)
+
+        self.tempStore = QtWidgets.QComboBox()
+        self.tempStore.addItems(const.TEMPSTORES)
+        self.tempStore.setCurrentText(config.TEMP_STORE.upper())
+        connectionLayout.addRow('Temporary storage', self.tempStore)
+
+        self.cacheSize = QtWidgets.QSpinBox()
+        self.cacheSize.setRange(1, 64 * 1024)
+        self.cacheSize.setSuffix(' MB')
+        self.cacheSize.setValue(config.CACHE_SIZE_KB // 1024)
+        connectionLayout.addRow('Page cache', self.cacheSize)
+
+        self.mmapSize = QtWidgets.QSpinBox()
+        self.mmapSize.setRange(0, 64 * 1024)
+        self.mmapSize.setSuffix(' MB')
+        self.mmapSize.setValue(config.MMAP_SIZE // (1024 * 1024))
+        connectionLayout.addRow('Memory map', self.mmapSize)
+
+        self.busyTimeout = QtWidgets.QSpinBox()
+        self.busyTimeout.setRange(0, 600000)
+        self.busyTimeout.setSuffix(' ms')
+        self.busyTimeout.setValue(config.BUSY_TIMEOUT_MS)
+        connectionLayout.addRow('Busy timeout', self.busyTimeout)
+
+        self.readOnly = QtWidgets.QCheckBox('Read only')
+        self.readOnly.setChecked(config.READ_ONLY)
+        self.readOnly.setToolTip("Browse while another process adds entries")
+        connectionLayout.addRow(self.readOnly)
+        self.layout.addWidget(connectionBox)
+
+        storageBox = QtWidgets.QGroupBox('Storage')
+        storageLayout = QtWidgets.QFormLayout()
+        storageBox.setLayout(storageLayout)
+        self.compression = QtWidgets.QComboBox()
+        self.compression.addItems(const.CODECS)
+        self.compression.setCurrentText((config.COMPRESSION or 'none').lower())
+        self.compression.setToolTip("Compress the text bodies of new entries. Existing entries "
+                                    "are recompressed with Recompress.py")
+        storageLayout.addRow('Compression', self.compression)
+        self.persistResults = QtWidgets.QCheckBox('Keep search results between sessions')
+        self.persistResults.setChecked(config.PERSIST_RESULTS)
+        self.persistResults.setToolTip("Repeated searches are read from the database's result cache "
+                                       "until an entry or tag is added")
+        storageLayout.addRow(self.persistResults)
+        self.layout.addWidget(storageBox)
+
         self.okBtn = QtWidgets.QPushButton('OK')
         self.okBtn.released.connect(self.save)
         self.layout.addWidget(self.okBtn)
@@ -404,17 +1302,55 @@ class Setup(QtWidgets.QDialog):
     def save(self):
         ''' Save the specified filepaths using the Config singleton '''
         config = Utils.Config()
-        config.DATABASE_FILEPATH = self.databaseText.text()
+        files = [file.strip() for file in self.databaseText.text().split(';') if file.strip()]
+        if not files:
+            self.reject()
+            return
+        config.DATABASE_FILEPATH = files[0]
+        config.SHARD_FILEPATHS = files
         config.META_FILEPATH = self.metaText.text()
-        config.DATABASE =  DatabaseInterface.initDatabase(self.databaseText.text())
+        config.JOURNAL_MODE = self.journalMode.currentText()
+        config.SYNCHRONOUS = self.synchronous.currentText()
+        config.TEMP_STORE = self.tempStore.currentText()
+        config.CACHE_SIZE_KB = self.cacheSize.value() * 1024
+        config.MMAP_SIZE = self.mmapSize.value() * 1024 * 1024
+        config.BUSY_TIMEOUT_MS = self.busyTimeout.value()
+        config.READ_ONLY = self.readOnly.isChecked()
+        config.COMPRESSION = self.compression.currentText()
+        config.PERSIST_RESULTS = self.persistResults.isChecked()
+        with Instrumentation.timed('open database'):
+            opened = self._openDatabase(files)
+        if opened:
+            self.accept()
+        else:
+            self.reject()
+
+    def _openDatabase(self, files):
+        ''' Opens the database files, bringing them up to date
+            args:
+                files (list of str): the database filepaths
+            returns:
+                bool: whether they were opened
+        '''
+        config = Utils.Config()
+        config.DATABASE =  DatabaseInterface.initDatabase(files[0])
 
         if not Utils.validateMetaJson(self.metaText.text()):
-            self.reject()
+            return False
 
         if not DatabaseInterface.checkDatabase(config.DATABASE):
-            self.reject()
+            return False
+
+        # creates the tables of a new database, and brings older files up to
+        # date. Searches fall back to LIKE scans if FTS5 is not available
+        if not config.READ_ONLY:
+            DatabaseInterface.migrateDatabase(list(Utils.getCategories()))
+            if config.COMPRESSION != 'none' and not DatabaseInterface.enableCompression():
+                Utils.ErrorMessage("Error: This database cannot hold compressed text bodies, "
+                                   "so new entries will be stored plain.")
 
         if not DatabaseInterface.checkTableExists():
-            self.reject()
+            return False
 
-        self.accept()
+        Federation.openShards(files, list(Utils.getCategories()), config.READ_ONLY)
+        return True
@@ -0,0 +1,385 @@
+import heapq
+import itertools
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from PyQt5.QtSql import QSqlDatabase
+
+import DatabaseInterface
+import const
+
+# Browses several database files, or shards, as one. Each shard is read on
+# its own thread and connection, so a search runs on every shard at once.
+# The functions here take the same arguments as their DatabaseInterface
+# namesakes, with entry IDs made unique across shards by globalID, so that
+# the model and widgets can use either module as their source of entries.
+# Entries are ordered by shard and then ID, by rank when searching text, or
+# by a sort column. Ranks are scored by each shard's own index, so rank order
+# across shards is approximate
+
+# the shard readers, in shard order. Empty unless several shards are open
+_readers = []
+# guards _counts, which every shard reader updates
+_countLock = threading.Lock()
+# (shard, table, filter): (the shard's data version, number of matching entries),
+# in least to most recently used order
+_counts = OrderedDict()
+
+class ShardReader:
+    ''' Runs DatabaseInterface functions against one shard, on a thread with
+        its own read only connection '''
+    _names = itertools.count(1)
+
+    def __init__(self, shard, databaseFile):
+        '''
+        shard (int): the shard's position in the federation
+        databaseFile (str): filepath for the shard
+        '''
+        self.shard = shard
+        self.databaseFile = databaseFile
+        self.connectionName = f"ShardReader{next(self._names)}"
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=self.connectionName, daemon=True)
+        self._thread.start()
+
+    def submit(self, function, *args):
+        ''' Queues a function to run against the shard
+            args:
+                function (callable): the function to run
+                args: the function's arguments
+            returns:
+                concurrent.futures.Future: the function's result
+        '''
+        future = Future()
+        self._jobs.put((future, function, args))
+        return future
+
+    def stop(self):
+        ''' Closes the shard's connection and thread, once queued jobs have run '''
+        self._jobs.put(None)
+        self._thread.join()
+
+    def _run(self):
+        ''' Opens the shard's connection, then runs jobs until stopped '''
+        database = DatabaseInterface.openConnection(self.databaseFile, self.connectionName,
+                                                    readOnly=True)
+        if not database.isOpen():
+            print("Error: Could not open shard.", self.databaseFile, database.lastError().text())
+        del database
+        DatabaseInterface.useConnection(self.connectionName)
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, function, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args))
+            except Exception as error:
+                future.set_exception(error)
+        DatabaseInterface.useConnection(None)
+        QSqlDatabase.database(self.connectionName, open=False).close()
+        QSqlDatabase.removeDatabase(self.connectionName)
+
+def openShards(files, categories=None, readOnly=False):
+    ''' Starts reading a list of shards, closing any open before. Nothing is
+        federated unless there are at least two, and new entries are only
+        ever added to the first, through the default connection
+        args:
+            files (list of str): filepaths for the shards
+            categories (list of str): the tag categories, to bring each shard up
+                to date with migrateDatabase. None to leave the shards as they are
+            readOnly (bool): whether the shards are read only, so cannot be migrated
+    '''
+    closeShards()
+    if len(files) < 2:
+        return
+    for shard, file in enumerate(files):
+        if not file.endswith('.sqlite'):
+            file = file + '.sqlite'
+        if categories is not None and not readOnly:
+            _migrateShard(file, categories)
+        _readers.append(ShardReader(shard, file))
+
+def _migrateShard(file, categories):
+    ''' Brings a shard up to the current schema through a temporary connection '''
+    name = 'ShardMigration'
+    database = DatabaseInterface.openConnection(file, name)
+    DatabaseInterface.useConnection(name)
+    try:
+        DatabaseInterface.migrateDatabase(categories)
+    finally:
+        DatabaseInterface.useConnection(None)
+        database.close()
+        del database
+        QSqlDatabase.removeDatabase(name)
+
+def closeShards():
+    ''' Stops reading the open shards '''
+    for reader in _readers:
+        reader.stop()
+    _readers.clear()
+    with _countLock:
+        _counts.clear()
+
+def isFederated():
+    ''' returns whether several shards are open '''
+    return bool(_readers)
+
+def globalID(shard, entryID):
+    ''' returns the ID of a shard's entry that is unique across the shards.
+        The first shard's IDs are unchanged '''
+    return shard * const.SHARDIDSTRIDE + entryID
+
+def splitID(entryID):
+    ''' returns the shard and the shard's own ID for an ID made by globalID '''
+    return divmod(entryID, const.SHARDIDSTRIDE)
+
+def _fanOut(function, argsForShard, shards=None):
+    ''' Runs a function on several shards at once and waits for the results
+        args:
+            function (callable): the function to run on each shard
+            argsForShard (callable): given a shard, returns its arguments
+            shards (list of int): the shards to run on, defaults to all
+        returns:
+            list: the results, in the order of the shards
+    '''
+    readers = _readers if shards is None else [_readers[shard] for shard in shards]
+    futures = [reader.submit(function, *argsForShard(reader.shard)) for reader in readers]
+    return [future.result() for future in futures]
+
+def _groupIDs(ids):
+    ''' returns a shard to shard IDs dictionary for a list of global IDs '''
+    shardIDs = {}
+    for entryID in ids:
+        shard, localID = splitID(entryID)
+        shardIDs.setdefault(shard, []).append(localID)
+    return shardIDs
+
+def _globalRows(rows, shard, idColumn):
+    ''' returns a shard's rows with their IDs made global '''
+    return [row[:idColumn] + (globalID(shard, row[idColumn]),) + row[idColumn + 1:]
+            for row in rows]
+
+def getHeaderNames(table=const.TABLE):
+    ''' Finds the table's headings, which every shard shares '''
+    return DatabaseInterface.getHeaderNames(table)
+
+def getRowBlock(columns, after=None, limit=const.BLOCKSIZE, table=const.TABLE, filter='',
+                rankQuery=None, sort=None):
+    ''' Fetches a block of rows across the shards, as DatabaseInterface.getRowBlock.
+        In ID order the shards are read in turn, as a block only reaches into
+        the next shard once the one before runs out. In rank or sort key order
+        every shard is read at once, and their rows are merged. The merged rank
+        order is only approximate, as each shard's full text index scores its
+        rows by its own number and length of entries
+        args:
+            columns (list of str): the columns to return, which must include the ID
+            after (int/tuple): the global key the block starts after
+            limit (int): the maximum number of rows to return
+            table (str): the table to search
+            filter (Filter/str): the search filter
+            rankQuery (str): full text query to order the rows by relevance
+            sort (tuple of (str, bool)): the sort column and whether descending
+        returns:
+            list of tuple: the row values, with global IDs
+    '''
+    idColumn = list(columns).index(const.ID)
+    descending = bool(sort and sort[1])
+    if not _keyed(rankQuery, sort):
+        # global IDs follow the shard order, which is read backwards for descending IDs
+        readers = _readers[::-1] if descending else _readers
+        firstShard, localAfter = (None, None) if after is None else splitID(after)
+        rows = []
+        for reader in readers:
+            if firstShard is not None and (reader.shard > firstShard if descending
+                                           else reader.shard < firstShard):
+                continue
+            shardAfter = localAfter if reader.shard == firstShard else None
+            shardRows = reader.submit(DatabaseInterface.getRowBlock, columns, shardAfter,
+                                      limit - len(rows), table, filter, None, sort).result()
+            rows.extend(_globalRows(shardRows, reader.shard, idColumn))
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def shardAfter(shard):
+        # the key in a shard's own IDs that its rows after the global key follow.
+        # Ties on the key in an earlier shard sort before the global key, and in
+        # a later shard after it, the other way round in descending order,
+        # which the same local keys give as they are compared the other way
+        if after is None:
+            return None
+        key, afterID = after
+        afterShard, localID = splitID(afterID)
+        if shard < afterShard:
+            return (key, const.SHARDIDSTRIDE)
+        if shard > afterShard:
+            return (key, -1)
+        return (key, localID)
+    results = _fanOut(DatabaseInterface.getRowBlock,
+                      lambda shard: (columns, shardAfter(shard), limit, table, filter, rankQuery, sort))
+    merged = heapq.merge(*(_globalRows(rows, shard, idColumn) for shard, rows in enumerate(results)),
+                         key=lambda row: (row[-1], row[idColumn]), reverse=descending)
+    return list(itertools.islice(merged, limit))
+
+def getRowsByID(columns, ids, table=const.TABLE, filter=''):
+    ''' Reads the rows of entries by their global IDs, as
+        DatabaseInterface.getRowsByID, asking only the shards they are in
+        returns:
+            list of tuple: the row values, with global IDs, in the order of the IDs
+    '''
+    idColumn = list(columns).index(const.ID)
+    shardIDs = _groupIDs(ids)
+    shards = sorted(shardIDs)
+    results = _fanOut(DatabaseInterface.getRowsByID,
+                      lambda shard: (columns, shardIDs[shard], table, filter), shards)
+    rows = {}
+    for shard, shardRows in zip(shards, results):
+        for row in _globalRows(shardRows, shard, idColumn):
+            rows[row[idColumn]] = row
+    return [rows[entryID] for entryID in ids if entryID in rows]
+
+def getScanChunks(filter, chunkSize=const.SCANCHUNKSIZE, table=const.TABLE):
+    ''' Splits the entries a filter's scan reads into chunks on every shard,
+        as DatabaseInterface.getScanChunks, in global ID order '''
+    results = _fanOut(DatabaseInterface.getScanChunks, lambda shard: (filter, chunkSize, table))
+    return [(databaseFile, sql, values, globalID(shard, idBase))
+            for shard, chunks in enumerate(results)
+            for databaseFile, sql, values, idBase in chunks]
+
+def _keyed(rankQuery, sort):
+    ''' returns whether rows are ordered by a rank or sort key rather than by ID '''
+    if sort:
+        return sort[0] != const.ID
+    return bool(rankQuery)
+
+def getKeyAtOffset(offset, table=const.TABLE, filter='', rankQuery=None, sort=None):
+    ''' Finds the global paging key of the entry at a position across the shards,
+        as DatabaseInterface.getKeyAtOffset. In ID order the shards' cached
+        counts find the shard holding the position
+        returns:
+            int/tuple: the key, or None if there are not enough rows
+    '''
+    if _keyed(rankQuery, sort):
+        rows = getRowBlock([const.ID], None, offset + 1, table, filter, rankQuery, sort)
+        if len(rows) <= offset:
+            return None
+        return (rows[offset][-1], rows[offset][0])
+    shardCounts = list(enumerate(_shardCounts(table, filter)))
+    if sort and sort[1]:
+        shardCounts.reverse()
+    for shard, count in shardCounts:
+        if offset < count:
+            key = _readers[shard].submit(DatabaseInterface.getKeyAtOffset, offset, table,
+                                         filter, None, sort).result()
+            return None if key is None else globalID(shard, key)
+        offset -= count
+    return None
+
+def getEntryCount(table=const.TABLE, filter=''):
+    ''' Counts the entries matching a filter on every shard at once. Each
+        shard's count is kept until the shard is written to, so shards that
+        do not change are not counted again
+        returns:
+            int: the number of rows found
+    '''
+    return sum(_shardCounts(table, filter))
+
+def _shardCounts(table, filter):
+    ''' returns the number of entries matching a filter on each shard '''
+    return _fanOut(_countShard, lambda shard: (shard, table, filter))
+
+def _countShard(shard, table, filter):
+    ''' Counts the entries matching a filter on a shard, unless the count is
+        cached and the shard has not changed since. Runs on the shard's reader '''
+    key = (shard, table, filter)
+    version = DatabaseInterface.getDataVersion()
+    with _countLock:
+        cached = _counts.get(key)
+        if cached is not None and cached[0] == version:
+            _counts.move_to_end(key)
+            return cached[1]
+    count = DatabaseInterface.getEntryCount(table, filter)
+    with _countLock:
+        _counts[key] = (version, count)
+        while len(_counts) > const.SHARDCOUNTCACHESIZE:
+            _counts.popitem(last=False)
+    return count
+
+def countMatchingIDs(ids, table=const.TABLE, filter=''):
+    ''' Counts how many of the given global IDs match a filter, asking only
+        the shards they are in '''
+    shardIDs = _groupIDs(ids)
+    shards = sorted(shardIDs)
+    return sum(_fanOut(DatabaseInterface.countMatchingIDs,
+                       lambda shard: (shardIDs[shard], table, filter), shards))
+
+def getMatchingIDs(ids, table=const.TABLE, filter='', rankQuery=None):
+    ''' Finds which of the given global IDs match a filter, as
+        DatabaseInterface.getMatchingIDs, asking only the shards they are in '''
+    shardIDs = _groupIDs(ids)
+    shards = sorted(shardIDs)
+    results = _fanOut(DatabaseInterface.getMatchingIDs,
+                      lambda shard: (shardIDs[shard], table, filter, rankQuery), shards)
+    matches = {}
+    for shard, shardMatches in zip(shards, results):
+        for entryID, rank in shardMatches.items():
+            matches[globalID(shard, entryID)] = rank
+    return matches
+
+def getTagCounts(categories, filter=None, table=const.TABLE):
+    ''' Counts the entries having each tag on every shard at once, and adds
+        up the counts by tag name, as tag IDs differ between shards '''
+    counts = {category: {} for category in categories}
+    for shardCounts in _fanOut(DatabaseInterface.getTagCounts, lambda shard: (categories, filter, table)):
+        for category, tagCounts in shardCounts.items():
+            for tag, count in tagCounts.items():
+                counts[category][tag] = counts[category].get(tag, 0) + count
+    return counts
+
+def getTagCategories(tag, categories):
+    ''' Finds which of some categories have a tag in any shard, as
+        DatabaseInterface.getTagCategories, as each shard has its own tags '''
+    found = set()
+    for shardCategories in _fanOut(DatabaseInterface.getTagCategories, lambda shard: (tag, categories)):
+        found.update(shardCategories)
+    return [category for category in categories if category in found]
+
+def getIDRange(table=const.TABLE, filter=''):
+    ''' Finds the lowest and highest global IDs across the shards '''
+    ranges = _fanOut(DatabaseInterface.getIDRange, lambda shard: (table, filter))
+    ids = [globalID(shard, entryID) for shard, idRange in enumerate(ranges)
+           for entryID in idRange if entryID is not None]
+    if not ids:
+        return None, None
+    return min(ids), max(ids)
+
+def getEntries(ids, maxLength=None, table=const.TABLE):
+    ''' Reads entries by their global IDs, as DatabaseInterface.getEntries,
+        asking only the shards they are in '''
+    shardIDs = _groupIDs(ids)
+    shards = sorted(shardIDs)
+    results = _fanOut(DatabaseInterface.getEntries,
+                      lambda shard: (shardIDs[shard], maxLength, table), shards)
+    entries = {}
+    for shard, shardEntries in zip(shards, results):
+        for entryID, entry in shardEntries.items():
+            entries[globalID(shard, entryID)] = entry
+    return entries
+
+def getTextSlice(entryID, start, length, table=const.TABLE):
+    ''' Reads part of an entry's text body by its global ID, as
+        DatabaseInterface.getTextSlice '''
+    shard, localID = splitID(entryID)
+    return _readers[shard].submit(DatabaseInterface.getTextSlice, localID, start, length,
+                                  table).result()
+
+def findHit(entryID, filter, start=0, table=const.TABLE):
+    ''' Finds the next hit in an entry's text body by its global ID, as
+        DatabaseInterface.findHit '''
+    shard, localID = splitID(entryID)
+    return _readers[shard].submit(DatabaseInterface.findHit, localID, filter, start,
+                                  table).result()
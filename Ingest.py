@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import sys
+import time
+from PyQt5 import QtCore
+
+import DatabaseInterface
+import Utils
+import const
+
+
+def readJsonLines(file):
+    ''' Streams entries from a JSON Lines file
+        args:
+            file (str): filepath for the file, with one entry object per line
+        yields:
+            dict: entries with "title", "textBody" and optionally "tags"
+    '''
+    with open(file) as lines:
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+def readTextFiles(directory):
+    ''' Streams entries from the .txt files in a directory, using each file
+        name as the entry title
+        args:
+            directory (str): the directory to read
+        yields:
+            dict: entries with "title" and "textBody"
+    '''
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.txt'):
+            continue
+        with open(os.path.join(directory, name)) as textFile:
+            yield {'title': os.path.splitext(name)[0], 'textBody': textFile.read()}
+
+def ingest(databaseFile, source, batchSize=const.BATCHSIZE, metaFile=None, compression=None):
+    ''' Adds the entries from a JSON Lines file or a directory of text files
+        to a database, reporting progress as it goes. The database is created
+        or brought up to date first, with tag tables for the meta file's
+        categories
+        args:
+            databaseFile (str): filepath for the database
+            source (str): the JSON Lines file or directory of .txt files
+            batchSize (int): the number of entries to insert per transaction
+            metaFile (str): filepath for the meta info, whose categories the
+                entries' tags are in
+            compression (str): the codec to compress the text bodies with, one
+                of const.CODECS. Defaults to Utils.Config().COMPRESSION
+        returns:
+            int: the number of entries added
+    '''
+    database = DatabaseInterface.openDatabase(databaseFile)
+    if not database.isOpen():
+        print("Error: Could not open database.", database.lastError().text())
+        return 0
+    categories = list(Utils.getCategories(metaFile)) if metaFile else []
+    DatabaseInterface.migrateDatabase(categories)
+    if compression is not None:
+        Utils.Config().COMPRESSION = compression
+    if Utils.Config().COMPRESSION != 'none' and not DatabaseInterface.enableCompression():
+        database.close()
+        return 0
+
+    entries = readTextFiles(source) if os.path.isdir(source) else readJsonLines(source)
+    start = time.perf_counter()
+
+    def report(added):
+        elapsed = time.perf_counter() - start
+        print(f"{added} entries, {added / elapsed:.0f} docs/sec")
+
+    added = DatabaseInterface.bulkAddEntries(entries, batchSize, report)
+    # the planner's statistics are out of date after a large load
+    DatabaseInterface.analyzeDatabase()
+    database.close()
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add documents to a database without opening the browser")
+    parser.add_argument('database', help="database filepath")
+    parser.add_argument('source', help="JSON Lines file of entries, or a directory of .txt files")
+    parser.add_argument('--batch-size', type=int, default=const.BATCHSIZE,
+                        help="entries to insert per transaction")
+    parser.add_argument('--meta', help="meta info JSON file, to create tag tables for its categories")
+    parser.add_argument('--compress', choices=const.CODECS, help="compress the text bodies")
+    args = parser.parse_args()
+
+    app = QtCore.QCoreApplication(sys.argv)
+    sys.exit(0 if ingest(args.database, args.source, args.batch_size, args.meta, args.compress) else 1)
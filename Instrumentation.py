@@ -0,0 +1,211 @@
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import Utils
+import const
+
+# guards the statistics, which the query workers record into as well
+_lock = threading.Lock()
+# normalised SQL: StatementStats
+_statements = {}
+# counter name: value
+_counters = {}
+# startup phase name: seconds taken, in the order they finished
+_phases = {}
+
+class StatementStats:
+    ''' Running totals and a rolling window of timings for one statement '''
+    def __init__(self, sql, window=const.HISTOGRAMWINDOW):
+        '''
+        sql (str): the normalised statement
+        window (int): the number of recent timings kept for the percentiles
+        '''
+        self.sql = sql
+        self.count = 0
+        self.totalSeconds = 0.0
+        self.maxSeconds = 0.0
+        self.rows = 0
+        self.callers = set()
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds, rows, caller):
+        ''' Records one run of the statement
+            args:
+                seconds (float): the wall time taken
+                rows (int): the rows returned
+                caller (str): the DatabaseInterface function that ran it
+        '''
+        self.count += 1
+        self.totalSeconds += seconds
+        self.maxSeconds = max(self.maxSeconds, seconds)
+        self.rows += rows
+        self.callers.add(caller)
+        self.recent.append(seconds)
+
+    def percentile(self, fraction):
+        ''' returns the recent timing below which the given fraction fall '''
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def normalizeSQL(sql):
+    ''' Replaces the literals in a statement with placeholders and tidies its
+        whitespace, so that runs differing only in their values are grouped
+        args:
+            sql (str): the statement
+        returns:
+            str: the normalised statement
+    '''
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?, ...)', sql)
+    return ' '.join(sql.split())
+
+def recordQuery(sql, seconds, rows, caller, plan=None):
+    ''' Records a finished statement, and logs it if it was slow
+        args:
+            sql (str): the statement as run
+            seconds (float): the wall time taken, including reading its rows
+            rows (int): the rows returned
+            caller (str): the DatabaseInterface function that ran it
+            plan (list of str): the statement's query plan, if it was slow
+    '''
+    normalised = normalizeSQL(sql)
+    with _lock:
+        stats = _statements.get(normalised)
+        if stats is None:
+            stats = _statements[normalised] = StatementStats(normalised)
+        stats.add(seconds, rows, caller)
+        _counters['queries'] = _counters.get('queries', 0) + 1
+    if isSlow(seconds):
+        logSlowQuery(normalised, seconds, rows, caller, plan)
+
+def isSlow(seconds):
+    ''' returns whether a statement took long enough for the slow query log '''
+    threshold = Utils.Config().SLOW_QUERY_MS
+    return threshold is not None and seconds * 1000 >= threshold
+
+def logSlowQuery(sql, seconds, rows, caller, plan=None):
+    ''' Appends a statement to the slow query log
+        args:
+            sql (str): the normalised statement
+            seconds (float): the wall time taken
+            rows (int): the rows returned
+            caller (str): the DatabaseInterface function that ran it
+            plan (list of str): the statement's query plan
+    '''
+    file = Utils.Config().SLOW_QUERY_LOG
+    if not file:
+        return
+    lines = [f"{time.strftime('%Y-%m-%d %H:%M:%S')} {seconds * 1000:.1f} ms, {rows} rows, {caller}",
+             f"  {sql}"]
+    lines.extend(f"  | {step}" for step in plan or [])
+    with _lock:
+        try:
+            with open(file, 'a') as log:
+                log.write('\n'.join(lines) + '\n')
+        except OSError as error:
+            print("Error writing slow query log:", error)
+
+def count(name, amount=1):
+    ''' Adds to a named counter
+        args:
+            name (str): the counter
+            amount (int): the amount to add
+    '''
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def countCacheLookup(cache, hit):
+    ''' Counts a cache lookup as a hit or a miss
+        args:
+            cache (str): the cache's name
+            hit (bool): whether the lookup was found in the cache
+    '''
+    count(cache + ('Hits' if hit else 'Misses'))
+
+def getCounter(name):
+    ''' returns a counter's value '''
+    return _counters.get(name, 0)
+
+def hitRate(cache):
+    ''' returns the fraction of a cache's lookups that were hits, or None if
+        there have been none '''
+    hits, misses = getCounter(cache + 'Hits'), getCounter(cache + 'Misses')
+    if not hits + misses:
+        return None
+    return hits / (hits + misses)
+
+def recordPhase(name, seconds):
+    ''' Records how long a phase of startup took. Each phase is kept from
+        its first run only, so later runs of the same code do not replace it
+        args:
+            name (str): the phase
+            seconds (float): the wall time taken
+    '''
+    with _lock:
+        _phases.setdefault(name, seconds)
+
+@contextmanager
+def timed(name):
+    ''' Times the code run in a with block as a phase of startup
+        args:
+            name (str): the phase
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recordPhase(name, time.perf_counter() - start)
+
+def getPhases():
+    ''' returns a copy of the startup phases and their times, in the order they finished '''
+    with _lock:
+        return dict(_phases)
+
+def getStatements():
+    ''' returns a copy of the statement statistics, slowest in total first '''
+    with _lock:
+        statements = list(_statements.values())
+    return sorted(statements, key=lambda stats: stats.totalSeconds, reverse=True)
+
+def reset():
+    ''' Clears the statistics and counters. The startup phases are kept, as
+        they are not run again '''
+    with _lock:
+        _statements.clear()
+        _counters.clear()
+
+def report(limit=20):
+    ''' Summarises the counters and the statements taking the most time
+        args:
+            limit (int): the most statements to include
+        returns:
+            str: the summary, one line per counter or statement
+    '''
+    paints = getCounter('paints')
+    lines = [f"Queries: {getCounter('queries')}",
+             f"Paints: {paints}"]
+    if paints:
+        lines.append(f"Queries per paint: {getCounter('queries') / paints:.2f}")
+    for cache in ('block', 'body', 'tag', 'result'):
+        rate = hitRate(cache)
+        if rate is not None:
+            lines.append(f"{cache.capitalize()} cache hit rate: {rate:.1%}")
+    phases = getPhases()
+    if phases:
+        lines.append('')
+        lines.append("Startup:")
+        lines.extend(f"  {name}: {seconds * 1000:.1f} ms" for name, seconds in phases.items())
+    lines.append('')
+    lines.append("  count   total ms  p50 ms  p95 ms  max ms     rows  statement")
+    for stats in getStatements()[:limit]:
+        lines.append("{:7d} {:10.1f} {:7.2f} {:7.2f} {:7.1f} {:8d}  {} [{}]".format(
+            stats.count, stats.totalSeconds * 1000, stats.percentile(0.5) * 1000,
+            stats.percentile(0.95) * 1000, stats.maxSeconds * 1000, stats.rows,
+            stats.sql, ', '.join(sorted(stats.callers))))
+    return '\n'.join(lines)
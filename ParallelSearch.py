@@ -0,0 +1,200 @@
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+import Compression
+import const
+
+# Searches the entries for a regular expression or exact, case sensitive
+# text, which neither the full text index nor LIKE can find. The entries are
+# split into chunks of IDs by DatabaseInterface.getScanChunks, and the chunks
+# are scanned at once in a pool of processes, so a search uses every core.
+# Each process reads through its own read only connection, made with Python's
+# sqlite3 rather than Qt, which the processes do not start. The matches of
+# each chunk are passed back in ID order as soon as it and every chunk before
+# it are scanned
+
+# the process pool, started by the first scan and kept for the next
+_pool = None
+_poolLock = threading.Lock()
+
+# in each process, database file: read only connection
+_connections = {}
+# in each process, (database file, checksum): compression dictionary
+_dictionaries = {}
+
+class Search:
+    ''' A scan running in the process pool '''
+    def __init__(self, chunks, filter, callback=None, processes=None):
+        '''
+        chunks (list of tuple): the chunks to scan, from getScanChunks
+        filter (DatabaseInterface.Filter): the filter with the text to find
+        callback (callable): called with the matches of each chunk, in ID order,
+            and whether they are the last, on a thread of the pool. None to
+            collect the matches for wait() instead
+        processes (int): the number of processes to start the pool with, if it
+            is not running. None for one per core
+        '''
+        self.callback = callback
+        self.cancelled = False
+        self._matches = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._next = 0
+        self._futures = []
+        titlePattern, bodyPattern = _patterns(filter)
+        if not chunks:
+            self._finish([])
+            return
+        pool = _getPool(processes)
+        self._futures = [pool.submit(_scanChunk, databaseFile, sql, values, idBase,
+                                     titlePattern, bodyPattern, const.SCANSPANS)
+                         for databaseFile, sql, values, idBase in chunks]
+        for future in self._futures:
+            future.add_done_callback(self._chunkDone)
+
+    def _chunkDone(self, future):
+        ''' Passes on the matches of every chunk now scanned that has no chunk
+            before it still being scanned '''
+        with self._lock:
+            while (self._next < len(self._futures) and self._futures[self._next].done()
+                   and not self.cancelled):
+                chunk = self._futures[self._next]
+                self._next += 1
+                matches = []
+                if not chunk.cancelled():
+                    try:
+                        matches = chunk.result()
+                    except Exception as error:
+                        print("Error scanning entries:", error)
+                self._finish(matches, self._next == len(self._futures))
+
+    def _finish(self, matches, last=True):
+        ''' Passes on a chunk's matches, or collects them if there is no callback '''
+        if self.callback is None:
+            self._matches.extend(matches)
+        elif matches or last:
+            self.callback(matches, last)
+        if last:
+            self._done.set()
+
+    def cancel(self):
+        ''' Stops the scan. Chunks still waiting are not scanned, and the
+            matches of those being scanned are dropped '''
+        with self._lock:
+            self.cancelled = True
+        for future in self._futures:
+            future.cancel()
+        self._done.set()
+
+    def wait(self):
+        ''' Waits for the scan to finish
+            returns:
+                list of tuple of (int, list): the matches collected, as the
+                    callback would be given them
+        '''
+        self._done.wait()
+        return self._matches
+
+def patternError(filter):
+    ''' Checks a filter's text can be scanned for
+        args:
+            filter (DatabaseInterface.Filter): the filter
+        returns:
+            str: why its regular expression is not valid, or None if it is
+    '''
+    try:
+        for pattern in _patterns(filter):
+            if pattern is not None:
+                re.compile(pattern)
+    except re.error as error:
+        return str(error)
+    return None
+
+def _patterns(filter):
+    ''' returns the regular expressions for a filter's title and body text,
+        None for either that is empty '''
+    def pattern(text):
+        if not text:
+            return None
+        return text if filter.scan == 'regex' else re.escape(text)
+    return pattern(filter.titleText), pattern(filter.bodyText)
+
+def _getPool(processes=None):
+    ''' returns the process pool, starting it with a number of processes if
+        it is not running. Processes are spawned rather than forked, as
+        forking copies the state of Qt's threads '''
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            processes = processes or os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(processes, multiprocessing.get_context('spawn'))
+        return _pool
+
+def shutdown():
+    ''' Stops the process pool, dropping any chunks still waiting '''
+    global _pool
+    with _poolLock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _scanChunk(databaseFile, sql, values, idBase, titlePattern, bodyPattern, maxSpans):
+    ''' Scans a chunk of entries, in a process of the pool
+        args:
+            databaseFile (str): filepath for the database
+            sql (str): the chunk's query, from getScanChunks
+            values (list): the query's values
+            idBase (int): the number to add to each ID read
+            titlePattern (str): regular expression the titles must match, or None
+            bodyPattern (str): regular expression the text bodies must match, or None
+            maxSpans (int): the most match positions to return for each entry
+        returns:
+            list of tuple of (int, list of tuple of (int, int)): the ID of each
+                matching entry, with the start and end of the first matches in
+                its text body
+    '''
+    connection = _connections.get(databaseFile)
+    if connection is None:
+        connection = sqlite3.connect(f"file:{quote(databaseFile)}?mode=ro", uri=True)
+        _connections[databaseFile] = connection
+    title = re.compile(titlePattern) if titlePattern is not None else None
+    body = re.compile(bodyPattern) if bodyPattern is not None else None
+    matches = []
+    for entryID, entryTitle, textBody, flag in connection.execute(sql, values):
+        if title is not None and (entryTitle is None or not title.search(entryTitle)):
+            continue
+        spans = []
+        if body is not None:
+            textBody = _decompressBody(connection, databaseFile, textBody, flag)
+            if textBody is None:
+                continue
+            for match in body.finditer(textBody):
+                spans.append(match.span())
+                if len(spans) >= maxSpans:
+                    break
+            if not spans:
+                continue
+        matches.append((idBase + entryID, spans))
+    return matches
+
+def _decompressBody(connection, databaseFile, value, flag):
+    ''' Reads back a stored text body, as DatabaseInterface._decompressBody
+        does through the process's connection '''
+    if not flag or value is None:
+        return value
+    dictionary = None
+    if flag == Compression.ZLIB:
+        checksum = Compression.dictionaryChecksum(value)
+        if checksum is not None:
+            key = (databaseFile, checksum)
+            if key not in _dictionaries:
+                row = connection.execute(f"SELECT Data FROM {const.DICTIONARYTABLE} WHERE Checksum = ?",
+                                         (checksum,)).fetchone()
+                _dictionaries[key] = row[0] if row else None
+            dictionary = _dictionaries[key]
+    return Compression.decompress(value, flag, dictionary)
@@ -0,0 +1,142 @@
+import itertools
+from PyQt5 import QtCore
+from PyQt5.QtSql import QSqlDatabase
+
+import DatabaseInterface
+
+
+class QueryJob:
+    ''' A database function waiting to be run by a QueryWorker '''
+    def __init__(self, function, args, callback=None, group=None, failed=None):
+        '''
+        function (callable): the function to run on the worker thread
+        args (tuple): the function's arguments
+        callback (callable): called on the GUI thread with the function's result
+        group (object): jobs in the same group can be cancelled together
+        failed (callable): called on the GUI thread with the error instead, if
+            the function raises one
+        '''
+        self.function = function
+        self.args = args
+        self.callback = callback
+        self.group = group
+        self.failed = failed
+        self.cancelled = False
+        # the error the function raised, if any
+        self.error = None
+
+
+class _QueryRunner(QtCore.QObject):
+    ''' Runs jobs on the worker thread, through the thread's own connection '''
+    done = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, databaseFile, connectionName):
+        super(_QueryRunner, self).__init__()
+        self.databaseFile = databaseFile
+        self.connectionName = connectionName
+
+    @QtCore.pyqtSlot()
+    def open(self):
+        ''' Opens the thread's connection, which has to be made on the thread '''
+        # the worker only reads, so it does not wait for or block writers
+        database = DatabaseInterface.openConnection(self.databaseFile, self.connectionName,
+                                                    readOnly=True)
+        if not database.isOpen():
+            print("Error: Could not open database for queries.", database.lastError().text())
+        DatabaseInterface.useConnection(self.connectionName)
+
+    @QtCore.pyqtSlot(object)
+    def run(self, job):
+        ''' Runs a job, unless it was cancelled while it waited '''
+        result = None
+        if not job.cancelled:
+            try:
+                result = job.function(*job.args)
+            except Exception as error:
+                print("Error running query:", error)
+                job.error = str(error)
+        self.done.emit(job, result)
+
+    @QtCore.pyqtSlot()
+    def close(self):
+        ''' Closes the thread's connection '''
+        DatabaseInterface.useConnection(None)
+        QSqlDatabase.database(self.connectionName, open=False).close()
+        QSqlDatabase.removeDatabase(self.connectionName)
+
+
+class QueryWorker(QtCore.QObject):
+    ''' Runs DatabaseInterface functions on a dedicated thread with its own
+        connection, so that slow queries do not block the GUI. Jobs run in the
+        order they are submitted, and their results are passed back to their
+        callbacks on the GUI thread '''
+    _submitted = QtCore.pyqtSignal(object)
+    _closeRequested = QtCore.pyqtSignal()
+    _names = itertools.count(1)
+
+    def __init__(self, databaseFile, parent=None):
+        '''
+        databaseFile (str): filepath for the database
+        '''
+        super(QueryWorker, self).__init__(parent)
+        self._pending = set()
+        self._thread = QtCore.QThread()
+        self._runner = _QueryRunner(databaseFile, f"QueryWorker{next(self._names)}")
+        self._runner.moveToThread(self._thread)
+        self._thread.started.connect(self._runner.open)
+        self._submitted.connect(self._runner.run)
+        self._closeRequested.connect(self._runner.close, QtCore.Qt.BlockingQueuedConnection)
+        self._runner.done.connect(self._deliver)
+        self._thread.start()
+
+    def submit(self, function, *args, callback=None, group=None, failed=None):
+        ''' Queues a function to run on the worker thread
+            args:
+                function (callable): the function to run
+                args: the function's arguments
+                callback (callable): called with the function's result
+                group (object): jobs in the same group can be cancelled together
+                failed (callable): called with the error instead if the function
+                    raises one, so the caller can stop waiting for the result
+            returns:
+                QueryJob: the queued job
+        '''
+        job = QueryJob(function, args, callback, group, failed)
+        self._pending.add(job)
+        self._submitted.emit(job)
+        return job
+
+    def cancel(self, group):
+        ''' Cancels the jobs in a group, so that those still waiting are not
+            run and the results of any running are dropped
+            args:
+                group (object): the group to cancel
+        '''
+        for job in self._pending:
+            if job.group == group:
+                job.cancelled = True
+
+    def isBusy(self):
+        ''' returns whether any jobs are waiting or running '''
+        return bool(self._pending)
+
+    def _deliver(self, job, result):
+        ''' Passes a finished job's result to its callback, or its error to its
+            failure callback '''
+        self._pending.discard(job)
+        if job.cancelled:
+            return
+        if job.error is not None:
+            if job.failed:
+                job.failed(job.error)
+        elif job.callback:
+            job.callback(result)
+
+    def stop(self):
+        ''' Cancels every job and closes the worker's connection and thread '''
+        for job in self._pending:
+            job.cancelled = True
+        if self._thread.isRunning():
+            self._closeRequested.emit()
+            self._thread.quit()
+            self._thread.wait()
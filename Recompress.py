@@ -0,0 +1,84 @@
+import argparse
+import os
+import sys
+import time
+from PyQt5 import QtCore
+
+import DatabaseInterface
+import Utils
+import const
+
+
+def fileSize(databaseFile):
+    ''' returns the size in bytes of a database file and its write-ahead log '''
+    return sum(os.path.getsize(file) for file in (databaseFile, databaseFile + '-wal')
+               if os.path.exists(file))
+
+def recompressDatabase(databaseFile, codec, level=None, dictionary=False,
+                     batchSize=const.BATCHSIZE, vacuum=True, metaFile=None):
+    ''' Stores the text bodies of an existing database again with another
+        codec, reporting progress as it goes. The database is brought up to
+        date first, and its full text index made contentless if the bodies
+        are to be compressed, so that searches keep working
+        args:
+            databaseFile (str): filepath for the database
+            codec (str): one of const.CODECS, 'none' to decompress every body
+            level (int): the compression level, None for the codec's default
+            dictionary (bool): whether to train a shared zlib dictionary from
+                the bodies first
+            batchSize (int): the number of entries to rewrite per transaction
+            vacuum (bool): whether to rebuild the file afterwards, so it shrinks
+            metaFile (str): filepath for the meta info, whose tag categories are
+                brought up to date as well
+        returns:
+            bool: whether every body was stored again
+    '''
+    if not databaseFile.endswith('.sqlite'):
+        databaseFile += '.sqlite'
+    database = DatabaseInterface.openDatabase(databaseFile)
+    if not database.isOpen():
+        print("Error: Could not open database.", database.lastError().text())
+        return False
+    categories = list(Utils.getCategories(metaFile)) if metaFile else []
+    DatabaseInterface.migrateDatabase(categories)
+    sizeBefore = fileSize(databaseFile)
+    start = time.perf_counter()
+
+    if dictionary and codec == 'zlib':
+        checksum = DatabaseInterface.trainCompressionDictionary()
+        print("Trained dictionary", checksum if checksum is not None else "skipped, too little shared text")
+
+    def report(read):
+        elapsed = time.perf_counter() - start
+        print(f"{read} entries, {read / elapsed:.0f} docs/sec")
+
+    rewritten = DatabaseInterface.recompressEntries(codec, level, batchSize, report)
+    if rewritten is None:
+        database.close()
+        return False
+    print(f"{rewritten} text bodies stored again")
+    if vacuum:
+        DatabaseInterface.vacuumDatabase()
+    DatabaseInterface.analyzeDatabase()
+    database.close()
+    print(f"{sizeBefore / 1024 / 1024:.1f} MB -> {fileSize(databaseFile) / 1024 / 1024:.1f} MB")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompress the text bodies of an existing database")
+    parser.add_argument('database', help="database filepath")
+    parser.add_argument('--codec', choices=const.CODECS, default='zlib',
+                        help="codec to store the text bodies with, none to decompress them")
+    parser.add_argument('--level', type=int, help="compression level, or lzma preset")
+    parser.add_argument('--dictionary', action='store_true',
+                        help="train a shared zlib dictionary from the text bodies first")
+    parser.add_argument('--batch-size', type=int, default=const.BATCHSIZE,
+                        help="entries to rewrite per transaction")
+    parser.add_argument('--no-vacuum', action='store_true', help="leave the file its current size")
+    parser.add_argument('--meta', help="meta info JSON file, to bring its tag tables up to date")
+    args = parser.parse_args()
+
+    app = QtCore.QCoreApplication(sys.argv)
+    sys.exit(0 if recompressDatabase(args.database, args.codec, args.level, args.dictionary,
+                                   args.batch_size, not args.no_vacuum, args.meta) else 1)
@@ -1,47 +1,664 @@
 import sys
+from collections import OrderedDict
 from PyQt5 import QtCore
 
 import DatabaseInterface
+import Instrumentation
+import ParallelSearch
+import Utils
 import const
 
 
 class TableModel(QtCore.QAbstractTableModel):
     ''' Model to gather data from an SQL database, expecting a title, body of
-        text, and categorised tags '''
-    def __init__(self, table=None, parent=None):
+        text, and categorised tags. Only the model's columns are read, in
+        blocks of rows kept in a least recently used cache, and rows are added
+        to the model in blocks as the view scrolls towards the end. Given a QueryWorker, the
+        blocks and counts are read on its thread and filled in as they arrive,
+        otherwise they are read straight away. A filter that needs a scan is
+        run by ParallelSearch, and its matches are added as they are found '''
+    # emitted with the total number of matching entries, and whether it is exact
+    entryCountChanged = QtCore.pyqtSignal(int, bool)
+    # emitted with True when a search starts, and False once its first rows are in
+    loadingChanged = QtCore.pyqtSignal(bool)
+    # role for the entry ID of any index in a row
+    IDRole = QtCore.Qt.UserRole + 1
+    # a scan's matches, passed from the process pool's thread with the model's generation
+    _scanned = QtCore.pyqtSignal(int, object, bool)
+
+    def __init__(self, table=None, parent=None, blockSize=const.BLOCKSIZE,
+                 cacheSize=const.BLOCKCACHESIZE, estimateCounts=None, worker=None,
+                 countWorker=None, source=None, columns=None):
+        '''
+        worker (QueryWorker.QueryWorker): worker to read rows on
+        countWorker (QueryWorker.QueryWorker): worker to count entries on, so
+            that slow counts do not hold up rows. Defaults to the row worker
+        source (module): where the entries are read from, DatabaseInterface or
+            Federation. Defaults to DatabaseInterface
+        columns (list of str): the columns to read and show, as
+            DatabaseInterface.getRowBlock takes them. Defaults to the ID and
+            title, which the list of titles shows
+        '''
         super().__init__(parent)
         self.table = table or const.TABLE
-        self._headers = DatabaseInterface.getHeaderNames(self.table)
-        self.filterString = ''
+        self.source = source or DatabaseInterface
+        self._columns = self._projected(columns)
+        self.filter = None
+        self.rankQuery = None
+        # (column, whether descending) the entries are sorted by, None for ID or relevance order
+        self.sortBy = None
+        self.blockSize = blockSize
+        self.cacheSize = cacheSize
+        if estimateCounts is None:
+            estimateCounts = Utils.Config().ESTIMATE_COUNTS
+        self.estimateCounts = estimateCounts
+        self.worker = worker
+        self.countWorker = countWorker or worker
+        # filter: exact number of matching entries
+        self._counts = {}
+        self._estimate = None
+        # increased on every reset, so results for an earlier search are dropped
+        self._generation = 0
+        # the running scan, if any
+        self._scan = None
+        self._scanned.connect(self._chunkScanned)
+        self._clearCache()
+
+    def _projected(self, columns):
+        ''' returns the columns to read, which always include the ID '''
+        if columns is None:
+            columns = [const.ID, const.TITLE]
+        columns = list(columns)
+        if columns and const.ID not in columns:
+            columns.insert(0, const.ID)
+        return columns
+
+    def columns(self):
+        ''' returns the columns the model reads and shows '''
+        return list(self._columns)
+
+    def setColumns(self, columns, blockSize=None):
+        ''' Changes the columns read and shows the results again
+            args:
+                columns (list of str): the columns, see __init__
+                blockSize (int): the rows to read at a time, None to keep it
+        '''
+        # the cached rows have the old columns, so go before the views see the new ones
+        self._cancelPending()
+        self.beginResetModel()
+        self._columns = self._projected(columns)
+        if blockSize:
+            self.blockSize = blockSize
+        self._clearCache()
+        self.endResetModel()
+        self._reload()
+
+    def _clearCache(self):
+        ''' Forgets all cached blocks and loaded rows '''
+        # block number: list of row tuples, in least to most recently used order
+        self._blocks = OrderedDict()
+        # block number: the paging key the block starts after
+        self._anchors = {0: None}
+        # block number: callbacks waiting for the block to be read
+        self._requested = {}
+        self._rowsLoaded = 0
+        self._exhausted = False
+        self._fetching = False
+        # the IDs a scan has found so far in order, None if not scanning
+        self._scanIDs = None
+        # entry ID: the (start, end) of the scan's matches in its text body
+        self._spans = {}
+
+    def _run(self, function, args, callback, worker=None, current=True, failed=None):
+        ''' Runs a database function on a worker if the model has one, or
+            straight away if not, and passes the result to a callback
+            args:
+                function (callable): the function to run
+                args (tuple): the function's arguments
+                callback (callable): called with the function's result
+                worker (QueryWorker.QueryWorker): the worker, defaults to the row worker
+                current (bool): whether to drop the result if the model is reset
+                    before it arrives
+                failed (callable): called with the error if the function raises
+                    one on the worker, instead of the callback
+        '''
+        worker = worker or self.worker
+        generation = self._generation
+        def deliver(result):
+            if not current or generation == self._generation:
+                callback(result)
+        def deliverError(error):
+            if failed and (not current or generation == self._generation):
+                failed(error)
+        if worker is None:
+            deliver(function(*args))
+        else:
+            worker.submit(function, *args, callback=deliver, group=self, failed=deliverError)
 
     def refreshData(self):
         ''' Refreshes the model data '''
+        self._counts.pop(self.filter, None)
+        self._estimate = None
+        self._reload()
+
+    def _cancelPending(self):
+        ''' Drops every read and count still waiting or running for the model '''
+        for worker in {self.worker, self.countWorker} - {None}:
+            worker.cancel(self)
+        if self._scan is not None:
+            self._scan.cancel()
+            self._scan = None
+        self._generation += 1
+
+    def _reload(self):
+        ''' Resets the model, reading the first block again '''
+        self._cancelPending()
         self.beginResetModel()
+        self._clearCache()
         self.endResetModel()
 
+        self.loadingChanged.emit(True)
+        self._fetching = True
+        if self._needsScan():
+            self._scanIDs = []
+            # a scan that cannot be split into chunks finds nothing, rather than never finishing
+            self._run(self.source.getScanChunks, (self.filter, const.SCANCHUNKSIZE, self.table),
+                      self._startScan, failed=lambda error: self._startScan([]))
+        else:
+            self._requestBlock(0, self._firstBlockRead)
+
+    def _firstBlockRead(self, rows):
+        ''' Shows the first block of a search, and finds its count '''
+        self._appendRows(rows, 0)
+        self.loadingChanged.emit(False)
+        self._updateCount()
+
+    def _needsScan(self, filter=None):
+        ''' returns whether a filter, by default the model's, is run by scanning '''
+        filter = self.filter if filter is None else filter
+        return isinstance(filter, DatabaseInterface.Filter) and filter.needsScan()
+
+    def _startScan(self, chunks):
+        ''' Scans the chunks of entries for the filter's text in the process
+            pool, adding each chunk's matches in ID order as they arrive, or
+            all at once without a worker
+            args:
+                chunks (list of tuple): the chunks, from getScanChunks
+        '''
+        generation = self._generation
+        processes = Utils.Config().SCAN_PROCESSES or None
+        if self.worker is None:
+            matches = ParallelSearch.Search(chunks, self.filter, processes=processes).wait()
+            self._chunkScanned(generation, matches, True)
+            return
+        self._scan = ParallelSearch.Search(
+            chunks, self.filter, lambda matches, last: self._scanned.emit(generation, matches, last),
+            processes)
+
+    def _chunkScanned(self, generation, matches, last):
+        ''' Adds the matches of a chunk of a scan to the model, unless the model
+            has been reset since the scan started. Their rows are read by ID
+            when they are shown
+            args:
+                generation (int): the model's generation when the scan started
+                matches (list of tuple of (int, list)): the matching IDs in
+                    order, each with its match positions
+                last (bool): whether the scan is finished
+        '''
+        if generation != self._generation:
+            return
+        first = len(self._scanIDs)
+        for entryID, spans in matches:
+            self._scanIDs.append(entryID)
+            if spans:
+                self._spans[entryID] = spans
+        if matches:
+            # the last block read may end before the new rows
+            self._blocks.pop(first // self.blockSize, None)
+            self.beginInsertRows(QtCore.QModelIndex(), first, len(self._scanIDs) - 1)
+            self._rowsLoaded = len(self._scanIDs)
+            self.endInsertRows()
+        if first == 0 and (matches or last):
+            self.loadingChanged.emit(False)
+        if last:
+            self._scan = None
+            self._exhausted = True
+            self._fetching = False
+            self._counts[self.filter] = self._rowsLoaded
+        self.entryCountChanged.emit(self._rowsLoaded, last)
+
+    def matchSpans(self, entryID):
+        ''' returns the (start, end) positions in an entry's text body that the
+            current scan matched, up to const.SCANSPANS of them, or an empty list '''
+        return self._spans.get(entryID, [])
+
+    def canRefine(self):
+        ''' returns whether every matching row is loaded and cached, and few
+            enough to be checked against a narrower search by refine '''
+        if not self._exhausted or self._requested or self._rowsLoaded > const.REFINELIMIT:
+            return False
+        blockCount = -(-self._rowsLoaded // self.blockSize)
+        return all(blockNumber in self._blocks for blockNumber in range(blockCount))
+
+    def refine(self, filter, rankQuery=None):
+        ''' Changes to a filter that narrows the current one by checking only
+            the rows already found, and removing those that no longer match
+            rather than resetting the model. Only possible if canRefine()
+            args:
+                filter (DatabaseInterface.Filter): the narrower filter
+                rankQuery (str): full text query to order the entries by relevance
+        '''
+        self._cancelPending()
+        rows = self._loadedRows()
+        ids = [row[self._idColumn()] for row in rows]
+        self.loadingChanged.emit(True)
+        self._run(self.source.getMatchingIDs, (ids, self.table, filter, rankQuery),
+                  lambda matches: self._refined(filter, rankQuery, matches))
+
+    def _loadedRows(self):
+        ''' returns every loaded row in order, which must all be cached '''
+        blockCount = -(-self._rowsLoaded // self.blockSize)
+        return [row for blockNumber in range(blockCount) for row in self._blocks[blockNumber]]
+
+    def _refined(self, filter, rankQuery, matches):
+        ''' Removes the rows that a narrower filter does not match, a run of
+            neighbouring rows at a time, then reorders the rest by their new rank
+            args:
+                filter (DatabaseInterface.Filter): the narrower filter
+                rankQuery (str): full text query to order the entries by relevance
+                matches (dict of {int: float}): the matching IDs and their ranks
+        '''
+        idColumn = self._idColumn()
+        rows = self._loadedRows()
+        removed = [row for row, values in enumerate(rows) if values[idColumn] not in matches]
+        # remove from the end, so the positions of the runs still to go hold
+        runs = []
+        for row in removed:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        for first, last in reversed(runs):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del rows[first:last + 1]
+            self._setRows(rows)
+            self.endRemoveRows()
+
+        ranked = bool(rows) and len(rows[0]) > len(self._columns)
+        self.filter = filter
+        self.rankQuery = rankQuery or None
+        # sorted rows keep their order, as a narrower filter leaves their sort keys as they are
+        if not self.sortBy and (self.rankQuery or ranked):
+            self._rerank(rows, matches)
+        self._counts[filter] = len(rows)
+        self._estimate = None
+        self.loadingChanged.emit(False)
+        self.entryCountChanged.emit(len(rows), True)
+
+    def _rerank(self, rows, matches):
+        ''' Gives the rows their ranks for the current rank query, or drops the
+            ranks if there is none, and moves the rows into their new order '''
+        idColumn = self._idColumn()
+        base = len(self._columns)
+        if self.rankQuery:
+            ranked = [row[:base] + (matches[row[idColumn]],) for row in rows]
+        else:
+            ranked = [row[:base] for row in rows]
+        ordered = sorted(ranked, key=self._rowKey)
+        if [row[idColumn] for row in ordered] == [row[idColumn] for row in rows]:
+            self._setRows(ordered)
+            return
+
+        self.layoutAboutToBeChanged.emit()
+        oldIndexes = self.persistentIndexList()
+        newRows = {row[idColumn]: number for number, row in enumerate(ordered)}
+        newIndexes = []
+        for index in oldIndexes:
+            newRow = newRows.get(rows[index.row()][idColumn]) if index.row() < len(rows) else None
+            newIndexes.append(QtCore.QModelIndex() if newRow is None
+                              else self.index(newRow, index.column()))
+        self._setRows(ordered)
+        self.changePersistentIndexList(oldIndexes, newIndexes)
+        self.layoutChanged.emit()
+
+    def _setRows(self, rows):
+        ''' Replaces the cached blocks with every row of the results, which are
+            all loaded '''
+        self._blocks = OrderedDict()
+        self._anchors = {0: None}
+        for blockNumber, start in enumerate(range(0, len(rows), self.blockSize)):
+            block = rows[start:start + self.blockSize]
+            self._blocks[blockNumber] = block
+            self._anchors[blockNumber + 1] = self._rowKey(block[-1])
+        self._rowsLoaded = len(rows)
+
+    def entryCount(self):
+        ''' returns the total number of entries matching the filter, which is an
+            estimate while the exact count is still to be made, or None if
+            neither is known yet '''
+        return self._counts.get(self.filter, self._estimate)
+
+    def isCountExact(self):
+        ''' returns whether entryCount() is exact rather than an estimate '''
+        return self.filter in self._counts or self._estimate is None
+
+    def _updateCount(self):
+        ''' Makes the count for the current filter available, estimating it
+            first and counting later if estimates are turned on '''
+        if self.filter in self._counts:
+            self.entryCountChanged.emit(self._counts[self.filter], True)
+        elif self._exhausted:
+            # every matching row is already loaded, so the count is free
+            self._counts[self.filter] = self._rowsLoaded
+            self.entryCountChanged.emit(self._rowsLoaded, True)
+        elif self.estimateCounts and self._inIDOrder():
+            self._estimate = self._estimateCount()
+            self.entryCountChanged.emit(self._estimate, False)
+            if self.countWorker:
+                self._countExactly()
+            else:
+                # count after the first paint
+                generation = self._generation
+                QtCore.QTimer.singleShot(0, lambda: self._countLater(generation))
+        else:
+            self._countExactly()
+
+    def _estimateCount(self):
+        ''' Estimates the count from the density of matches in the first block
+            across the ID range, which needs no further scan of the table
+            returns:
+                int: the estimated count
+        '''
+        rows = self._blocks.get(0)
+        if not rows:
+            return self._rowsLoaded
+        firstID = rows[0][self._idColumn()]
+        lastID = rows[-1][self._idColumn()]
+        highestID = self.source.getIDRange(self.table)[1] or lastID
+        density = len(rows) / (lastID - firstID + 1)
+        return max(len(rows), round(density * (highestID - firstID + 1)))
+
+    def _countLater(self, generation):
+        ''' Counts the entries if the model has not been reset since the count
+            was deferred '''
+        if generation == self._generation:
+            self._countExactly()
+
+    def _countExactly(self):
+        ''' Counts the entries matching the current filter and caches the result '''
+        filter = self.filter
+        def counted(count):
+            self._counts[filter] = count
+            self._estimate = None
+            self.entryCountChanged.emit(count, True)
+        self._run(self.source.getEntryCount, (self.table, filter), counted,
+                  self.countWorker)
+
+    def entriesAdded(self, ids):
+        ''' Updates the cached counts and loaded rows after new entries are
+            added, without resetting the model
+            args:
+                ids (list of int): the IDs of the new entries
+        '''
+        for filter in list(self._counts):
+            if self._needsScan(filter):
+                # new entries can only be matched by scanning them
+                del self._counts[filter]
+                continue
+            self._run(self.source.countMatchingIDs, (ids, self.table, filter),
+                      lambda added, filter=filter: self._countAdded(filter, added),
+                      self.countWorker, current=False)
+        if self._estimate is not None:
+            self._run(self.source.countMatchingIDs, (ids, self.table, self.filter),
+                      self._estimateAdded, self.countWorker)
+
+        if self._needsScan() or not self._inIDOrder():
+            # new entries may be ranked or sorted anywhere in the results
+            self._reload()
+        elif not self._sortsAfterLoaded(ids):
+            # a federated ID leads with its shard, so a new entry in an earlier
+            # shard sorts among the rows already loaded
+            self._reload()
+        elif self._exhausted:
+            # the new IDs sort after every loaded row, so only the last block changes
+            self._blocks.pop(self._rowsLoaded // self.blockSize, None)
+            self._exhausted = False
+            self.fetchMore()
+
+    def _sortsAfterLoaded(self, ids):
+        ''' returns whether every one of some IDs sorts after the last loaded
+            row, False if that row's block is no longer cached '''
+        if not self._rowsLoaded:
+            return True
+        blockNumber, offset = divmod(self._rowsLoaded - 1, self.blockSize)
+        block = self._blocks.get(blockNumber)
+        if not block or len(block) <= offset:
+            return False
+        return min(ids) > block[offset][self._idColumn()]
+
+    def _countAdded(self, filter, added):
+        ''' Adds new matching entries to a cached count '''
+        if filter not in self._counts:
+            return
+        self._counts[filter] += added
+        if filter == self.filter:
+            self.entryCountChanged.emit(self._counts[filter], True)
+
+    def _estimateAdded(self, added):
+        ''' Adds new matching entries to the estimated count '''
+        if self._estimate is not None:
+            self._estimate += added
+            self.entryCountChanged.emit(self._estimate, False)
+
+    def _requestBlock(self, blockNumber, callback):
+        ''' Reads a block of rows if it is not cached, and passes it to a
+            callback once it is available
+            args:
+                blockNumber (int): the index of the block
+                callback (callable): called with the list of rows in the block
+        '''
+        if blockNumber in self._blocks:
+            self._blocks.move_to_end(blockNumber)
+            callback(self._blocks[blockNumber])
+            return
+        if blockNumber in self._requested:
+            self._requested[blockNumber].append(callback)
+            return
+
+        self._requested[blockNumber] = [callback]
+        if self._scanIDs is not None:
+            start = blockNumber * self.blockSize
+            ids = self._scanIDs[start:start + self.blockSize]
+            self._run(self.source.getRowsByID, (self._columns, ids, self.table, self.filter),
+                      lambda rows: self._blockRead(blockNumber, None, rows,
+                                                   self._isCurrent(blockNumber, ids)),
+                      failed=lambda error: self._blockFailed(blockNumber))
+            return
+        args = (self.source, blockNumber, self._anchors.get(blockNumber), blockNumber in self._anchors,
+                self._columns, self.blockSize, self.table, self.filter, self.rankQuery, self.sortBy)
+        self._run(self._readBlock, args, lambda result: self._blockRead(blockNumber, *result),
+                  failed=lambda error: self._blockFailed(blockNumber))
+
+    @staticmethod
+    def _readBlock(source, blockNumber, anchor, hasAnchor, columns, blockSize, table, filter,
+                   rankQuery, sortBy):
+        ''' Reads a block of rows, finding where it starts if that is not known.
+            Only uses its arguments, so that it can run on a worker thread
+            returns:
+                tuple of (int/tuple, list of tuple): the paging key the block
+                    starts after, and the rows in the block
+        '''
+        if not hasAnchor:
+            anchor = source.getKeyAtOffset(blockNumber * blockSize - 1, table, filter, rankQuery,
+                                           sortBy)
+            if anchor is None:
+                return anchor, []
+        return anchor, source.getRowBlock(columns, anchor, blockSize, table, filter, rankQuery,
+                                          sortBy)
+
+    def _blockRead(self, blockNumber, anchor, rows, cache=True):
+        ''' Caches a block that has been read, unless told not to, and passes
+            it to the callbacks waiting for it '''
+        if cache:
+            self._anchors[blockNumber] = anchor
+            if len(rows) == self.blockSize:
+                self._anchors[blockNumber + 1] = self._rowKey(rows[-1])
+            self._blocks[blockNumber] = rows
+            while len(self._blocks) > self.cacheSize:
+                self._blocks.popitem(last=False)
+        for callback in self._requested.pop(blockNumber, []):
+            callback(rows)
+
+    def _blockFailed(self, blockNumber):
+        ''' Passes an empty block to the callbacks waiting for a block that
+            could not be read, so nothing is left loading. The empty block is
+            cached, without a paging key, so it is only read again once it
+            leaves the cache '''
+        self._blocks[blockNumber] = []
+        while len(self._blocks) > self.cacheSize:
+            self._blocks.popitem(last=False)
+        for callback in self._requested.pop(blockNumber, []):
+            callback([])
+
+    def _isCurrent(self, blockNumber, ids):
+        ''' returns whether a block read by a scan's IDs still has every row
+            of the block, which more matches may have been added to since '''
+        start = blockNumber * self.blockSize
+        return self._scanIDs is not None and len(ids) == min(self.blockSize, self._rowsLoaded - start)
+
+    def _blockArrived(self, blockNumber):
+        ''' Tells the views about rows that were waiting for their block '''
+        first = blockNumber * self.blockSize
+        last = min(first + self.blockSize, self._rowsLoaded) - 1
+        if last >= first:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, self.columnCount() - 1))
+
+    def _idColumn(self):
+        ''' returns the index of the ID column in the headers '''
+        return self._columns.index(const.ID)
+
+    def _rowKey(self, row):
+        ''' returns the paging key of a row read by _readBlock '''
+        keyed = self.sortBy[0] != const.ID if self.sortBy else self.rankQuery
+        if keyed:
+            return (row[-1], row[self._idColumn()])
+        return row[self._idColumn()]
+
+    def _inIDOrder(self):
+        ''' returns whether the rows are in ascending ID order, so that new
+            entries come after every row and IDs spread evenly over the rows '''
+        if self.sortBy:
+            return self.sortBy == (const.ID, False)
+        return not self.rankQuery
+
     def rowCount(self, parent=QtCore.QModelIndex()):
-        return DatabaseInterface.getEntryCount(self.table, self.filterString)
+        if parent.isValid():
+            return 0
+        return self._rowsLoaded
 
     def columnCount(self, parent=QtCore.QModelIndex()):
-        return len(self._headers)
+        return len(self._columns)
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or not self._columns:
+            return False
+        return not self._exhausted
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if not self.canFetchMore(parent) or self._fetching:
+            return
+        self._fetching = True
+        blockNumber, offset = divmod(self._rowsLoaded, self.blockSize)
+        self._requestBlock(blockNumber, lambda rows: self._appendRows(rows[offset:], offset))
+
+    def _appendRows(self, rows, offset):
+        ''' Adds the rows read for fetchMore to the model
+            args:
+                rows (list of tuple): the new rows
+                offset (int): the position of the first new row in its block
+        '''
+        self._fetching = False
+        if offset + len(rows) < self.blockSize:
+            self._exhausted = True
+        if not rows:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self._rowsLoaded,
+                             self._rowsLoaded + len(rows) - 1)
+        self._rowsLoaded += len(rows)
+        self.endInsertRows()
 
     def data(self, index, role=QtCore.Qt.DisplayRole):
         if not index.isValid():
             return None
         row = index.row()
         col = index.column()
-        if role == QtCore.Qt.DisplayRole:
-            if col > len(self._headers) -1:
+        if role == QtCore.Qt.DisplayRole or role == self.IDRole:
+            if col > len(self._columns) -1 or row >= self._rowsLoaded:
+                return None
+            if role == self.IDRole:
+                col = self._idColumn()
+            blockNumber, offset = divmod(row, self.blockSize)
+            Instrumentation.countCacheLookup('block', blockNumber in self._blocks)
+            if blockNumber in self._blocks:
+                self._blocks.move_to_end(blockNumber)
+            elif self.worker:
+                self._requestBlock(blockNumber, lambda rows: self._blockArrived(blockNumber))
+                return "Loading..." if role == QtCore.Qt.DisplayRole else None
+            else:
+                self._requestBlock(blockNumber, lambda rows: None)
+            rows = self._blocks[blockNumber]
+            if offset >= len(rows):
                 return None
-            column = self._headers[col]
-            return DatabaseInterface.getDataFromRow(column, row, self.table, self.filterString)
+            if role == self.IDRole:
+                return rows[offset][col]
+            return DatabaseInterface.displayValue(self._columns[col], rows[offset][col])
         return None
 
     def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
         if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
-            return str(self._headers[section])
+            if section >= len(self._columns):
+                return None
+            return DatabaseInterface.columnTitle(self._columns[section])
         return None
 
-    def setFilterString(self, string):
-        ''' Sets the filter string '''
-        self.filterString = string
+    def setFilter(self, filter):
+        ''' Sets the filter
+            args:
+                filter (DatabaseInterface.Filter): the filter, or None for every entry
+        '''
+        self.filter = filter
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        ''' Sorts the entries by one of the model's columns, reading them again
+            in the new order. The database pages through each sort column by
+            an index, so a sorted block is read as quickly however deep it is.
+            Columns it cannot sort by leave the order as it is, as does any
+            column while the results are a scan's, which are in ID order
+            args:
+                column (int): the column's position, or -1 to go back to ID or
+                    relevance order
+                order (Qt.SortOrder): the direction to sort in
+        '''
+        if self._needsScan():
+            return
+        sortBy = None
+        if 0 <= column < len(self._columns):
+            name = self._columns[column]
+            if not DatabaseInterface.isSortable(name):
+                return
+            sortBy = (name, order == QtCore.Qt.DescendingOrder)
+        if sortBy != self.sortBy:
+            self.sortBy = sortBy
+            self._reload()
+
+    def sortColumn(self):
+        ''' returns the position of the column the entries are sorted by, or
+            -1 if they are in ID or relevance order '''
+        if self.sortBy and not self._needsScan() and self.sortBy[0] in self._columns:
+            return self._columns.index(self.sortBy[0])
+        return -1
+
+    def setRankQuery(self, rankQuery):
+        ''' Sets a full text query to order the entries by relevance, unless
+            they are sorted by a column, or None to order them by ID '''
+        self.rankQuery = rankQuery or None
@@ -1,4 +1,6 @@
+import os
 import sys
+from collections import OrderedDict
 from PyQt5 import QtWidgets
 
 import json
@@ -8,14 +10,140 @@ class Config:
     ''' Singleton to store data set at the beginning of the application '''
     _instance = None
     DATABASE_FILEPATH = ''
+    # every database file being browsed, the first being DATABASE_FILEPATH
+    SHARD_FILEPATHS = []
     META_FILEPATH = ''
     DATABASE = ''
+    # report an estimated entry count straight away, and the exact count later
+    ESTIMATE_COUNTS = False
+    # text bodies longer than this are shown a piece at a time as they scroll
+    LARGE_TEXT_LENGTH = const.LARGETEXTLENGTH
+    # statements taking at least this many milliseconds are logged, None for none
+    SLOW_QUERY_MS = const.SLOWQUERYMS
+    # the file slow statements are appended to, with their query plans
+    SLOW_QUERY_LOG = const.SLOWQUERYLOG
+    # connection profile, applied to every connection opened
+    JOURNAL_MODE = 'WAL'
+    SYNCHRONOUS = 'NORMAL'
+    TEMP_STORE = 'MEMORY'
+    CACHE_SIZE_KB = const.CACHESIZEKB
+    MMAP_SIZE = const.MMAPSIZE
+    BUSY_TIMEOUT_MS = const.BUSYTIMEOUTMS
+    # search as the search text is typed, rather than when it is entered
+    LIVE_SEARCH = True
+    # open the browser's connection read only, to browse while another process writes
+    READ_ONLY = False
+    # how the text bodies of new entries are compressed, one of const.CODECS
+    COMPRESSION = 'none'
+    # count the entries found with each tag after every search, to show by the tags
+    TAG_COUNTS = True
+    # show the results in a table of titles, text previews and tags, rather than a list of titles
+    TABLE_VIEW = False
+    # keep the counts and ordered IDs of recent searches until an entry or tag is added
+    RESULT_CACHE = True
+    # keep them in the database between sessions too
+    PERSIST_RESULTS = False
+    # processes regular expression and exact text searches scan the entries in, 0 for one per core
+    SCAN_PROCESSES = 0
+    # meta filepath: MetaData parsed from it
+    _metaData = {}
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
             cls._instance = super(Config, cls).__new__(cls, *args, **kwargs)
         return cls._instance
 
+    def getMetaData(self, file=None):
+        ''' returns the parsed meta file, which is only read again if the
+            file's modification time or size have changed
+            args:
+                file (str): the filepath for the meta info
+            returns:
+                MetaData: the meta file contents
+        '''
+        file = getMetaFile(file)
+        if not file.endswith('.json'):
+            file += '.json'
+        status = os.stat(file)
+        signature = (status.st_mtime_ns, status.st_size)
+        metaData = self._metaData.get(file)
+        if metaData is None or metaData.signature != signature:
+            metaData = MetaData(file, signature)
+            self._metaData[file] = metaData
+        return metaData
+
+class MetaData:
+    ''' The contents of a meta file, with a reverse index of each tag's
+        categories '''
+    def __init__(self, file, signature=None):
+        '''
+        file (str): the filepath for the meta info
+        signature (tuple): the file's modification time and size when read
+        '''
+        self.signature = signature
+        with open(file) as jsonFile:
+            self.data = json.load(jsonFile)
+        self.categories = self.data.get(const.CATEGORIES)
+        self.tagCategories = {}
+        if isinstance(self.categories, dict):
+            for category, tags in self.categories.items():
+                for tag in tags or []:
+                    self.tagCategories.setdefault(tag, []).append(category)
+
+class BodyCache:
+    ''' Least recently used cache of entry titles and text bodies, limited by
+        the memory the bodies take up rather than the number of entries '''
+    def __init__(self, maxBytes=const.BODYCACHEBYTES):
+        '''
+        maxBytes (int): the most memory the cached bodies may use
+        '''
+        self.maxBytes = maxBytes
+        self.bytes = 0
+        # entry ID: (title, text body, size), in least to most recently used order
+        self._entries = OrderedDict()
+
+    def __contains__(self, entryID):
+        return entryID in self._entries
+
+    def get(self, entryID):
+        ''' gets a cached entry
+            args:
+                entryID (int): the entry ID
+            returns:
+                tuple of (str, str): the title and text body, or None if not cached
+        '''
+        if entryID not in self._entries:
+            return None
+        self._entries.move_to_end(entryID)
+        title, textBody, size = self._entries[entryID]
+        return title, textBody
+
+    def put(self, entryID, title, textBody):
+        ''' caches an entry, dropping the least recently used to make room. A
+            body larger than the whole cache is not kept
+            args:
+                entryID (int): the entry ID
+                title (str): the title
+                textBody (str): the text body
+        '''
+        self.remove(entryID)
+        size = sys.getsizeof(textBody) + sys.getsizeof(title)
+        if size > self.maxBytes:
+            return
+        self._entries[entryID] = (title, textBody, size)
+        self.bytes += size
+        while self.bytes > self.maxBytes:
+            oldest, (_, _, oldestSize) = self._entries.popitem(last=False)
+            self.bytes -= oldestSize
+
+    def remove(self, entryID):
+        ''' drops an entry from the cache
+            args:
+                entryID (int): the entry ID
+        '''
+        if entryID in self._entries:
+            self.bytes -= self._entries.pop(entryID)[2]
+
 class ErrorMessage(QtWidgets.QMessageBox):
     ''' Simple error message '''
     def __init__(self, message, critical=False):
@@ -36,12 +164,7 @@ def getCategories(file=None):
         returns:
             dict of {str:[str]}: the dictionary of categories and tags
     '''
-    if file is None:
-        config = Config()
-        file = config.META_FILEPATH
-
-    dict = getJsonData(file)
-    return dict.get("categories")
+    return Config().getMetaData(file).categories
 
 def getCategoryTags(category, file=None):
     ''' gets the tags associated with a given category from the meta file
@@ -53,6 +176,16 @@ def getCategoryTags(category, file=None):
     '''
     return getCategories(file).get(category)
 
+def getTagCategories(tag, file=None):
+    ''' gets the categories a tag is listed under in the meta file
+        args:
+            tag (str): the tag name
+            file (str): the filepath for the meta info
+        returns:
+            list of str: the categories for the tag
+    '''
+    return Config().getMetaData(file).tagCategories.get(tag, [])
+
 def getJsonData(file=None):
     ''' returns the complete data from the meta file
         args:
@@ -60,13 +193,7 @@ def getJsonData(file=None):
         returns:
             dict: the dictionary from the full json file
     '''
-    file = getMetaFile(file)
-    if not file.endswith('.json'):
-        file+= '.json'
-    with open(file) as file:
-        data = file.read()
-        dict = json.loads(data)
-    return dict
+    return Config().getMetaData(file).data
 
 def validateMetaJson(file=None):
     ''' validates the meta file, checking its contents are as expected
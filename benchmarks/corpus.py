@@ -0,0 +1,86 @@
+import json
+import os
+import random
+
+import DatabaseInterface
+import Utils
+import const
+
+
+def makeWords(count, rng):
+    ''' Makes a vocabulary of random lower case words
+        args:
+            count (int): the number of words
+            rng (random.Random): the random number generator
+        returns:
+            list of str: the words
+    '''
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+def generateCorpus(databaseFile, metaFile, docCount=10000, medianBodyWords=200,
+                   bodySpread=1.0, categoryCount=3, tagsPerCategory=50, tagsPerDoc=2,
+                   vocabularySize=5000, seed=0):
+    ''' Creates a database of synthetic entries and a matching meta file.
+        Body lengths follow a log-normal distribution, so most bodies are near
+        the median and a few are much longer
+        args:
+            databaseFile (str): filepath for the new database, replaced if it exists
+            metaFile (str): filepath for the new meta JSON file
+            docCount (int): the number of entries
+            medianBodyWords (int): the median number of words in a text body
+            bodySpread (float): the spread of the body length distribution
+            categoryCount (int): the number of tag categories
+            tagsPerCategory (int): the number of tags in each category
+            tagsPerDoc (int): the number of tags each entry gets in each category
+            vocabularySize (int): the number of distinct words in titles and bodies
+            seed (int): seed for the random number generator
+        returns:
+            dict of {str: list of str}: the categories and their tags
+    '''
+    rng = random.Random(seed)
+    if not databaseFile.endswith('.sqlite'):
+        databaseFile += '.sqlite'
+    if os.path.exists(databaseFile):
+        os.remove(databaseFile)
+
+    vocabulary = makeWords(vocabularySize, rng)
+    categories = {f"Category{number}": [f"tag{number}_{tag}" for tag in range(tagsPerCategory)]
+                  for number in range(categoryCount)}
+    with open(metaFile, 'w') as jsonFile:
+        json.dump({const.CATEGORIES: categories}, jsonFile)
+
+    DatabaseInterface.openDatabase(databaseFile)
+    DatabaseInterface.migrateDatabase(list(categories))
+    if Utils.Config().COMPRESSION != 'none':
+        DatabaseInterface.enableCompression()
+    DatabaseInterface.bulkAddEntries(generateEntries(docCount, vocabulary, categories, rng,
+                                                     medianBodyWords, bodySpread, tagsPerDoc))
+    DatabaseInterface.analyzeDatabase()
+    return categories
+
+def generateEntries(count, vocabulary, categories, rng, medianBodyWords=200, bodySpread=1.0,
+                    tagsPerDoc=2):
+    ''' Generates synthetic entries for DatabaseInterface.bulkAddEntries
+        args:
+            count (int): the number of entries
+            vocabulary (list of str): the words to use
+            categories (dict of {str: list of str}): the categories and their tags
+            rng (random.Random): the random number generator
+            medianBodyWords (int): the median number of words in a text body
+            bodySpread (float): the spread of the body length distribution
+            tagsPerDoc (int): the number of tags each entry gets in each category
+        yields:
+            dict: entries with "title", "textBody" and "tags"
+    '''
+    for number in range(count):
+        bodyWords = max(1, int(rng.lognormvariate(0, bodySpread) * medianBodyWords))
+        yield {
+            'title': f"{number} " + ' '.join(rng.choices(vocabulary, k=rng.randint(2, 6))),
+            'textBody': ' '.join(rng.choices(vocabulary, k=bodyWords)),
+            'tags': {category: rng.sample(tags, min(tagsPerDoc, len(tags)))
+                     for category, tags in categories.items()},
+            }
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5 import QtWidgets
+from PyQt5.QtSql import QSqlDatabase
+
+import Utils
+import const
+from benchmarks import corpus, scenarios
+
+
+def percentile(durations, fraction):
+    ''' returns the nearest rank percentile of a sorted list of durations '''
+    index = min(len(durations) - 1, max(0, round(fraction * len(durations)) - 1))
+    return durations[index]
+
+def measure(function, context, repetitions):
+    ''' Runs a scenario a number of times and summarises how long it took
+        args:
+            function (callable): the scenario, returning the number of items it handled
+            context (scenarios.Context): the scenario context
+            repetitions (int): the number of runs
+        returns:
+            dict: latency percentiles in milliseconds, and items handled per second
+    '''
+    durations = []
+    items = 0
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        items += function(context)
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    total = sum(durations)
+    return {
+        'repetitions': repetitions,
+        'p50_ms': percentile(durations, 0.5) * 1000,
+        'p90_ms': percentile(durations, 0.9) * 1000,
+        'p99_ms': percentile(durations, 0.99) * 1000,
+        'mean_ms': total / repetitions * 1000,
+        'max_ms': durations[-1] * 1000,
+        'items_per_sec': items / total if total else 0,
+        }
+
+def runBenchmarks(arguments):
+    ''' Generates a corpus and runs every scenario over it
+        args:
+            arguments (argparse.Namespace): the command line arguments
+        returns:
+            dict: the parameters and each scenario's results
+    '''
+    directory = arguments.directory or tempfile.mkdtemp(prefix='textbrowser-bench-')
+    databaseFile = os.path.join(directory, 'BenchDB.sqlite')
+    metaFile = os.path.join(directory, 'BenchMeta.json')
+
+    Utils.Config().COMPRESSION = arguments.compression
+    start = time.perf_counter()
+    categories = corpus.generateCorpus(databaseFile, metaFile, arguments.docs, arguments.body_words,
+                                       arguments.body_spread, arguments.categories, arguments.tags,
+                                       arguments.tags_per_doc, arguments.vocabulary, arguments.seed)
+    generateSeconds = time.perf_counter() - start
+
+    config = Utils.Config()
+    config.DATABASE_FILEPATH = databaseFile
+    config.META_FILEPATH = metaFile
+    # generateCorpus leaves the new database open
+    config.DATABASE = QSqlDatabase.database()
+
+    vocabulary = corpus.makeWords(arguments.vocabulary, random.Random(arguments.seed))
+    context = scenarios.Context(vocabulary, categories, arguments.seed)
+    results = {}
+    for name, (function, writes) in scenarios.SCENARIOS.items():
+        if arguments.scenario and name not in arguments.scenario:
+            continue
+        repetitions = arguments.write_repetitions if writes else arguments.repetitions
+        results[name] = measure(function, context, repetitions)
+        print(f"{name:20} p50 {results[name]['p50_ms']:9.2f} ms  p90 {results[name]['p90_ms']:9.2f} ms  "
+              f"{results[name]['items_per_sec']:12.1f} items/s")
+
+    return {
+        'parameters': {key: value for key, value in vars(arguments).items()
+                       if key not in ('output', 'compare', 'directory')},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'corpusSeconds': generateSeconds,
+        'scenarios': results,
+        }
+
+def compare(previous, current):
+    ''' Prints how each scenario's median latency changed between two runs
+        args:
+            previous (dict): the earlier results
+            current (dict): the later results
+    '''
+    print(f"{'scenario':20} {'before':>12} {'after':>12} {'change':>8}")
+    for name, result in current['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        change = result['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+        print(f"{name:20} {before['p50_ms']:9.2f} ms {result['p50_ms']:9.2f} ms {change:7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the browser's queries over a synthetic corpus")
+    parser.add_argument('--docs', type=int, default=10000, help="number of entries to generate")
+    parser.add_argument('--body-words', type=int, default=200, help="median words per text body")
+    parser.add_argument('--body-spread', type=float, default=1.0, help="spread of the body length distribution")
+    parser.add_argument('--categories', type=int, default=3, help="number of tag categories")
+    parser.add_argument('--tags', type=int, default=50, help="tags per category")
+    parser.add_argument('--tags-per-doc', type=int, default=2, help="tags per entry in each category")
+    parser.add_argument('--vocabulary', type=int, default=5000, help="distinct words in the corpus")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--compression', choices=const.CODECS, default='none',
+                        help="codec to compress the generated text bodies with")
+    parser.add_argument('--repetitions', type=int, default=20, help="runs of each read scenario")
+    parser.add_argument('--write-repetitions', type=int, default=5, help="runs of each write scenario")
+    parser.add_argument('--scenario', action='append', help="only run the named scenarios")
+    parser.add_argument('--directory', help="where to generate the corpus, a temporary directory by default")
+    parser.add_argument('--output', default='benchmark_results.json', help="file to write the results to")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    arguments = parser.parse_args()
+
+    app = QtWidgets.QApplication(sys.argv)
+    results = runBenchmarks(arguments)
+    with open(arguments.output, 'w') as resultsFile:
+        json.dump(results, resultsFile, indent=2)
+    if arguments.compare:
+        with open(arguments.compare) as previousFile:
+            compare(json.load(previousFile), results)
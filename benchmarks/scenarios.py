@@ -0,0 +1,235 @@
+import itertools
+import random
+from PyQt5 import QtCore
+
+import DatabaseInterface
+import DocWidgets
+import TableModel
+import Utils
+import const
+from benchmarks import corpus
+
+
+class Context:
+    ''' What the scenarios share: the corpus description, a random number
+        generator for picking search terms, and a search widget over a model '''
+    def __init__(self, vocabulary, categories, seed=0, visibleRows=40):
+        '''
+        vocabulary (list of str): the words used in the corpus
+        categories (dict of {str: list of str}): the categories and their tags
+        seed (int): seed for the random number generator
+        visibleRows (int): the number of rows a first paint shows
+        '''
+        self.vocabulary = vocabulary
+        self.categories = categories
+        self.rng = random.Random(seed)
+        self.visibleRows = visibleRows
+        self.model = TableModel.TableModel()
+        # tag counts have their own scenarios, rather than adding to every search's
+        Utils.Config().TAG_COUNTS = False
+        self.searchWidget = DocWidgets.SearchWidget(self.model)
+        # every scenario search runs in full, even if it repeats the last one
+        self.searchWidget.liveSearch.setChecked(False)
+
+    def clearSearch(self):
+        ''' Empties the search inputs without running a search '''
+        self.searchWidget.titleSearchText.setText('')
+        self.searchWidget.bodySearchText.setText('')
+        self.searchWidget.tagSearch.appliedTags = []
+
+    def setTextMode(self, index):
+        ''' Chooses how the search text is matched without running a search '''
+        self.searchWidget.textMode.blockSignals(True)
+        self.searchWidget.textMode.setCurrentIndex(index)
+        self.searchWidget.textMode.blockSignals(False)
+
+
+def paint(model, rows):
+    ''' Reads the title of the first rows of a model, as a view would
+        args:
+            model (TableModel.TableModel): the model
+            rows (int): the number of rows to read
+        returns:
+            int: the number of rows read
+    '''
+    rows = min(rows, model.rowCount())
+    for row in range(rows):
+        model.data(model.index(row, 1))
+    return rows
+
+def firstPaint(context):
+    ''' Makes a new model and reads its first screen of rows '''
+    model = TableModel.TableModel()
+    model.refreshData()
+    return paint(model, context.visibleRows)
+
+def tablePaint(context, filter=None):
+    ''' Makes a model of the table view's columns, the title, start of the
+        text body and tags, and reads every cell of its first screen of rows '''
+    columns = ([const.ID, const.TITLE, const.PREVIEW] +
+               [DatabaseInterface.tagColumn(category) for category in context.categories])
+    model = TableModel.TableModel(columns=columns, blockSize=const.TABLEBLOCKSIZE)
+    model.setFilter(filter)
+    model.refreshData()
+    rows = min(context.visibleRows, model.rowCount())
+    for row in range(rows):
+        for column in range(model.columnCount()):
+            model.data(model.index(row, column))
+    return rows
+
+def snippetPaint(context):
+    ''' Paints the table as tablePaint does, for a text body search, so its
+        text column shows the text around each entry's first hit '''
+    filter = DatabaseInterface.Filter('', context.rng.choice(context.vocabulary),
+                                      fullText=DatabaseInterface.hasFullTextSearch())
+    return tablePaint(context, filter)
+
+def buildWidgets(context):
+    ''' Makes the search widget and the new entry dialog, as startup does,
+        without showing the dialog '''
+    DocWidgets.SearchWidget(context.model)
+    DocWidgets.NewEntryWidget()
+    return 2
+
+def scroll(context, rows=5000, sort=None):
+    ''' Makes a new model and reads every row down to the given row, fetching
+        more rows as a view would when it reaches the end, optionally sorted
+        by a (column, Qt.SortOrder) tuple '''
+    model = TableModel.TableModel()
+    if sort:
+        model.sort(model.columns().index(sort[0]), sort[1])
+    else:
+        model.refreshData()
+    row = 0
+    while row < rows:
+        if row >= model.rowCount():
+            if not model.canFetchMore():
+                break
+            model.fetchMore()
+            continue
+        model.data(model.index(row, 1))
+        row += 1
+    return row
+
+def sortedScroll(context):
+    ''' Scrolls as scroll does, with the entries sorted by title in descending order '''
+    return scroll(context, sort=(const.TITLE, QtCore.Qt.DescendingOrder))
+
+def titleSearch(context):
+    ''' Searches titles for a word from the corpus and paints the results '''
+    context.clearSearch()
+    context.searchWidget.titleSearchText.setText(context.rng.choice(context.vocabulary))
+    context.searchWidget.search()
+    return paint(context.model, context.visibleRows)
+
+def bodySearch(context):
+    ''' Searches text bodies for two words from the corpus and paints the results '''
+    context.clearSearch()
+    context.searchWidget.bodySearchText.setText(' '.join(context.rng.sample(context.vocabulary, 2)))
+    context.searchWidget.search()
+    return paint(context.model, context.visibleRows)
+
+def scanSearch(context):
+    ''' Searches text bodies for exact text from the corpus, which scans them
+        in the process pool, and paints the results '''
+    context.clearSearch()
+    context.setTextMode(const.SCANMODES.index('exact') + 1)
+    context.searchWidget.bodySearchText.setText(context.rng.choice(context.vocabulary))
+    context.searchWidget.search()
+    context.setTextMode(0)
+    return paint(context.model, context.visibleRows)
+
+def typeSearch(context):
+    ''' Types a title search a letter at a time, searching after each letter
+        as live search does when typing pauses, and paints the results '''
+    context.clearSearch()
+    context.searchWidget.search()
+    for text in itertools.accumulate(context.rng.choice(context.vocabulary)):
+        context.searchWidget.titleSearchText.setText(text)
+        context.searchWidget.search()
+    return paint(context.model, context.visibleRows)
+
+def repeatSearch(context):
+    ''' Runs the same tag search each time, as going back to an earlier
+        search does, and paints the results '''
+    context.clearSearch()
+    context.searchWidget.tagSearch.appliedTags = [next(iter(context.categories.values()))[0]]
+    context.searchWidget.search()
+    return paint(context.model, context.visibleRows)
+
+def refreshFilter(context):
+    ''' Builds the filter for a title, body and tag search without running it '''
+    context.clearSearch()
+    context.searchWidget.titleSearchText.setText(context.rng.choice(context.vocabulary))
+    context.searchWidget.bodySearchText.setText(context.rng.choice(context.vocabulary))
+    context.searchWidget.tagSearch.appliedTags = pickTags(context)
+    context.searchWidget.refreshFilter()
+    context.searchWidget.filter.compile()
+    return 1
+
+def tagFilter(context):
+    ''' Filters by a tag from each of two categories and paints the results '''
+    context.clearSearch()
+    context.searchWidget.tagSearch.appliedTags = pickTags(context)
+    context.searchWidget.search()
+    return paint(context.model, context.visibleRows)
+
+def pickTags(context, count=2):
+    ''' returns a tag from each of a number of randomly chosen categories '''
+    categories = context.rng.sample(list(context.categories), min(count, len(context.categories)))
+    return [context.rng.choice(context.categories[category]) for category in categories]
+
+def countEntries(context):
+    ''' Counts the entries matching a title search '''
+    context.clearSearch()
+    context.searchWidget.titleSearchText.setText(context.rng.choice(context.vocabulary))
+    context.searchWidget.refreshFilter()
+    DatabaseInterface.getEntryCount(filter=context.searchWidget.filter)
+    return 1
+
+def tagTotals(context):
+    ''' Reads how many entries have each tag, from the tag count tables '''
+    DatabaseInterface.getTagCounts(list(context.categories))
+    return 1
+
+def tagCounts(context):
+    ''' Counts how many of the entries matching a body search have each tag '''
+    context.clearSearch()
+    context.searchWidget.bodySearchText.setText(context.rng.choice(context.vocabulary))
+    context.searchWidget.refreshFilter()
+    DatabaseInterface.getTagCounts(list(context.categories), context.searchWidget.filter)
+    return 1
+
+def saveEntry(context):
+    ''' Adds one entry and its tags, as the new entry dialog does '''
+    entry = next(corpus.generateEntries(1, context.vocabulary, context.categories, context.rng))
+    entryID = DatabaseInterface.addEntry(title=entry['title'], textBody=entry['textBody'])
+    DatabaseInterface.addTags(entryID, entry['tags'])
+    return 1
+
+def bulkInsert(context, count=1000):
+    ''' Adds a batch of entries through the bulk ingest path '''
+    entries = corpus.generateEntries(count, context.vocabulary, context.categories, context.rng)
+    return DatabaseInterface.bulkAddEntries(entries)
+
+# name: (scenario function, whether it changes the database), in the order they run
+SCENARIOS = {
+    'buildWidgets': (buildWidgets, False),
+    'firstPaint': (firstPaint, False),
+    'tablePaint': (tablePaint, False),
+    'snippetPaint': (snippetPaint, False),
+    'scroll': (scroll, False),
+    'sortedScroll': (sortedScroll, False),
+    'refreshFilter': (refreshFilter, False),
+    'titleSearch': (titleSearch, False),
+    'bodySearch': (bodySearch, False),
+    'scanSearch': (scanSearch, False),
+    'typeSearch': (typeSearch, False),
+    'repeatSearch': (repeatSearch, False),
+    'tagFilter': (tagFilter, False),
+    'countEntries': (countEntries, False),
+    'tagTotals': (tagTotals, False),
+    'tagCounts': (tagCounts, False),
+    'saveEntry': (saveEntry, True),
+    'bulkInsert': (bulkInsert, True),
+    }
@@ -8,3 +8,50 @@ DOCID = 'DocID'
 TAGID = 'TagID'
 TAGNAME = 'TagName'
 MAIN = 'main'
+ID = 'ID'
+BLOCKSIZE = 256
+BLOCKCACHESIZE = 64
+FTSTABLE = 'DocsFTS'
+BATCHSIZE = 1000
+BODYCACHEBYTES = 64 * 1024 * 1024
+PREFETCHROWS = 2
+LARGETEXTLENGTH = 1000000
+TEXTCHUNKLENGTH = 65536
+HITOVERLAP = 1024
+HISTOGRAMWINDOW = 500
+SLOWQUERYMS = 100
+SLOWQUERYLOG = 'slow_queries.log'
+STATEMENTPOOLSIZE = 64
+JOURNALMODES = ('WAL', 'DELETE', 'TRUNCATE', 'PERSIST')
+SYNCHRONOUSLEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+TEMPSTORES = ('DEFAULT', 'FILE', 'MEMORY')
+CACHESIZEKB = 64 * 1024
+MMAPSIZE = 256 * 1024 * 1024
+BUSYTIMEOUTMS = 5000
+SHARDIDSTRIDE = 2 ** 40
+SHARDCOUNTCACHESIZE = 256
+REFINELIMIT = 2000
+SEARCHDELAYMS = 250
+COMPRESSION = 'Compression'
+DICTIONARYTABLE = 'CompressionDictionary'
+CODECS = ('none', 'zlib', 'lzma')
+MINCOMPRESSLENGTH = 128
+DICTIONARYSIZE = 32 * 1024
+DICTIONARYSAMPLES = 2000
+COUNTSUFFIX = 'TagCount'
+DOCCOUNT = 'DocCount'
+PREVIEW = 'Preview'
+PREVIEWLENGTH = 200
+TABLEBLOCKSIZE = 64
+ADDED = 'Added'
+TAGCOUNT = 'TagCount'
+SORTCOLUMNS = (ID, TITLE, ADDED, TAGCOUNT)
+GENERATIONTABLE = 'ResultGeneration'
+RESULTTABLE = 'ResultCache'
+RESULTCACHESIZE = 256
+RESULTCACHEROWS = 5000
+SCANMODES = ('regex', 'exact')
+SCANCHUNKSIZE = 2000
+SCANSPANS = 1000
+SNIPPETCONTEXT = 60
+SNIPPETTOKENS = 24